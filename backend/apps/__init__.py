@@ -9,12 +9,21 @@ import importlib
 import logging.config
 
 from sanic import Sanic, Blueprint
-from sanic.response import html, file as file_response
+from sanic.exceptions import NotFound
 from sanic_ext import Extend
 from sanic.log import logger
 
+from apps.utils.blob_store import blob_store
+from apps.utils.cache import cache
+from apps.utils.compression import ResponseCompressor
 from apps.utils.db_utils import DB
+from apps.utils.feishu_utils import feishu
+from apps.utils.counter_buffer import CounterBuffer
 from apps.utils.jwt_utils import JWTUtil
+from apps.utils.linux_do_oauth import LinuxDoOAuth
+from apps.utils.password_utils import PasswordUtil
+from apps.utils.static_files import StaticManifest
+from apps.utils.text_diff import DiffEngine
 from config.settings import Config
 
 def configure_extensions(sanic_app):
@@ -23,8 +32,24 @@ def configure_extensions(sanic_app):
     Extend(sanic_app)
     # mysql
     DB(sanic_app)
+    # 浏览/使用次数写缓冲（依赖数据库，须在DB之后注册）
+    CounterBuffer.init_app(sanic_app)
+    # 大文本存储 dir 后端的启动清理（依赖数据库）
+    blob_store.init_app(sanic_app)
+    # 版本对比差异计算（大输入使用进程池）
+    DiffEngine.init_app(sanic_app)
+    # 多级缓存（本地LRU + 可选Redis）
+    cache.init_app(sanic_app)
     # jwt
     JWTUtil.init_app(sanic_app)
+    # bcrypt 线程池
+    PasswordUtil.init_app(sanic_app)
+    # Linux.do OAuth 共享HTTP客户端
+    LinuxDoOAuth.init_app(sanic_app)
+    # 飞书通知发送队列（停止前发送完）
+    feishu.init_app(sanic_app)
+    # JSON响应压缩
+    ResponseCompressor.init_app(sanic_app)
 
 def configure_blueprints(sanic_app):
     """注册蓝图 - 自动发现机制"""
@@ -75,19 +100,21 @@ def configure_static_files(sanic_app):
     # 标记已配置
     _static_files_configured = True
     
-    # 注册静态文件目录（用于 js/css/images 等资源）
-    try:
-        sanic_app.static('/assets', os.path.join(static_path, 'assets'), name='assets')
-    except Exception as e:
-        logger.debug(f"静态资源目录可能已注册: {e}")
+    # 启动时生成内存清单（读取并预压缩所有文件，在线程中执行）
+    @sanic_app.listener('before_server_start')
+    async def scan_static_files(app, loop):
+        manifest = StaticManifest(static_path, app.config.get('STATIC_MAX_MEMORY_SIZE', 4 * 1024 * 1024))
+        app.ctx.static_manifest = await loop.run_in_executor(None, manifest.scan)
+        logger.info(f"✅ 静态文件清单: {len(manifest.assets)} 个文件，占用内存 {manifest.size / 1024:.0f} KB")
     
-    # 处理 favicon.ico
-    favicon_path = os.path.join(static_path, 'favicon.ico')
-    if os.path.exists(favicon_path):
-        try:
-            sanic_app.static('/favicon.ico', favicon_path, name='favicon')
-        except Exception as e:
-            logger.debug(f"favicon 可能已注册: {e}")
+    # 静态资源（js/css/images 等）
+    @sanic_app.route('/assets/<path:path>', methods=['GET'], name='assets')
+    async def serve_asset(request, path):
+        manifest = request.app.ctx.static_manifest
+        asset = manifest.get(f'assets/{path}')
+        if asset is None:
+            raise NotFound(f'静态资源不存在: {request.path}')
+        return await manifest.response(request, asset)
     
     # SPA 路由处理：只处理根路径和前端路由
     # 注意：不能使用 catch-all 路由，否则会拦截 API 请求
@@ -95,10 +122,10 @@ def configure_static_files(sanic_app):
     @sanic_app.route('/', methods=['GET'], name='spa_index')
     async def serve_spa_index(request):
         """处理根路径请求"""
-        return await file_response(index_file)
+        manifest = request.app.ctx.static_manifest
+        return await manifest.response(request, manifest.get('index.html'))
     
     # 使用 404 错误处理器来处理前端 SPA 路由
-    from sanic.exceptions import NotFound
     
     @sanic_app.exception(NotFound)
     async def handle_not_found(request, exception):
@@ -113,13 +140,20 @@ def configure_static_files(sanic_app):
                 'message': f'接口不存在: {path}'
             }, status=404)
         
-        # 检查是否是静态资源请求
-        full_path = os.path.join(static_path, path.lstrip('/'))
-        if os.path.isfile(full_path):
-            return await file_response(full_path)
+        manifest = request.app.ctx.static_manifest
+        
+        # 缺失的带哈希资源（旧版本页面引用的已删除文件）不能返回 index.html，否则会被当作脚本执行
+        if path.startswith('/assets/'):
+            from sanic.response import text
+            return text('Not Found', status=404)
+        
+        # 检查是否是静态资源请求（favicon.ico 等根目录文件）
+        asset = manifest.get(path)
+        if asset is not None:
+            return await manifest.response(request, asset)
         
         # 前端路由返回 index.html
-        return await file_response(index_file)
+        return await manifest.response(request, manifest.get('index.html'))
 
 
 def create_app(env=None,name=None):
@@ -4,8 +4,11 @@
 支持: Linux.do OAuth + 本地用户名密码认证
 """
 import datetime
+import time
 from sanic.log import logger
-from apps.utils.password_utils import PasswordUtil
+from apps.utils.cache import cache, revoked_token_tag, user_cache_tag
+from apps.utils.password_utils import PasswordHashBusy, PasswordUtil
+from config.settings import Config
 
 
 class AuthService:
@@ -64,6 +67,7 @@ class AuthService:
                 """
                 
                 await self.db.execute(update_sql)
+                await self.invalidate_principal(user['id'])
                 
                 # 重新查询用户信息
                 sql = "SELECT * FROM users WHERE linux_do_id = ?"
@@ -113,6 +117,93 @@ class AuthService:
             logger.error(f'❌ 查询用户失败: {e}')
             raise
     
+    async def get_principal(self, user_id):
+        """
+        获取当前用户（短TTL缓存，用户信息变更/禁用/激活/登出时失效）
+        鉴权只读取Token声明，需要最新用户状态的接口（用户信息、管理员操作）使用此方法
+        
+        Args:
+            user_id: 用户ID
+            
+        Returns:
+            dict: 用户信息(不含密码哈希),不存在返回None
+        """
+        return await cache.get_or_load(
+            f'principal:{user_id}',
+            lambda: self.get_user_by_id(user_id),
+            tags=[user_cache_tag(user_id)],
+            ttl=Config.PRINCIPAL_CACHE_TTL
+        )
+    
+    async def invalidate_principal(self, user_id):
+        """使用户缓存失效（用户信息变更、禁用、激活、登出）"""
+        await cache.invalidate(user_cache_tag(user_id))
+    
+    async def get_token_state(self, user_id):
+        """
+        鉴权用的用户状态（每个请求调用，缓存，用户缓存失效时一起失效）
+        
+        Returns:
+            dict: {'is_active': 0/1, 'token_version': int}，用户不存在返回None
+        """
+        return await cache.get_or_load(
+            f'token_state:{user_id}',
+            lambda: self.db.get(
+                "SELECT is_active, token_version FROM users WHERE id = ?", [user_id]
+            ),
+            tags=[user_cache_tag(user_id)],
+            ttl=Config.PRINCIPAL_CACHE_TTL
+        )
+    
+    async def revoke_token(self, payload):
+        """
+        吊销单个Token（登出）：jti 记录到 revoked_tokens，直到Token过期
+        
+        Args:
+            payload: 已验证的Token声明
+        """
+        jti = payload.get('jti')
+        if not jti:
+            # 旧版Token没有 jti，无法单独吊销，只能吊销该用户的全部Token
+            await self.revoke_tokens(payload['user_id'])
+            return
+        try:
+            now = int(time.time())
+            # 顺带清理已过期的记录（过期的Token本身已无法通过验证）
+            await self.db.execute("DELETE FROM revoked_tokens WHERE expires_at < ?", [now])
+            await self.db.execute(
+                "INSERT INTO revoked_tokens (jti, user_id, expires_at) VALUES (?, ?, ?)",
+                [jti, payload['user_id'], int(payload.get('exp') or now)]
+            )
+            await cache.invalidate(revoked_token_tag(jti))
+            
+        except Exception as e:
+            logger.error(f'❌ 吊销Token失败: {e}')
+            raise
+    
+    async def is_token_revoked(self, jti):
+        """Token是否已登出吊销（每个请求调用，缓存，吊销时失效）"""
+        return await cache.get_or_load(
+            f'revoked_token:{jti}',
+            lambda: self._load_token_revoked(jti),
+            tags=[revoked_token_tag(jti)],
+            ttl=Config.PRINCIPAL_CACHE_TTL
+        )
+    
+    async def _load_token_revoked(self, jti):
+        row = await self.db.get("SELECT 1 AS revoked FROM revoked_tokens WHERE jti = ?", [jti])
+        return row is not None
+    
+    async def revoke_tokens(self, user_id):
+        """吊销该用户已签发的所有Token（令牌版本 +1，管理员吊销、禁用、修改密码时使用）"""
+        try:
+            await self.db.execute("UPDATE users SET token_version = token_version + 1 WHERE id = ?", [user_id])
+            await self.invalidate_principal(user_id)
+            
+        except Exception as e:
+            logger.error(f'❌ 吊销Token失败: {e}')
+            raise
+    
     async def create_local_user(self, username, password, name=None):
         """
         创建本地用户(用户名密码认证)
@@ -134,7 +225,7 @@ class AuthService:
                 raise ValueError(f'用户名 {username} 已存在')
             
             # 2. 密码哈希
-            password_hash = PasswordUtil.hash_password(password)
+            password_hash = await PasswordUtil.hash_password_async(password)
             
             # 3. 创建用户
             current_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -167,6 +258,9 @@ class AuthService:
             
         Returns:
             dict: 用户信息(验证成功) 或 None(验证失败)
+            
+        Raises:
+            PasswordHashBusy: bcrypt 线程池排队已满
         """
         try:
             # 1. 查询用户
@@ -184,7 +278,7 @@ class AuthService:
             
             # 3. 验证密码
             password_hash = user.get('password_hash')
-            if not PasswordUtil.verify_password(password, password_hash):
+            if not await PasswordUtil.verify_password_async(password, password_hash):
                 logger.warning(f'⚠️  密码错误: username={username}')
                 return None
             
@@ -195,6 +289,8 @@ class AuthService:
             
             return user
             
+        except PasswordHashBusy:
+            raise
         except Exception as e:
             logger.error(f'❌ 验证本地用户失败: {e}')
             return None
@@ -250,6 +346,7 @@ class AuthService:
             current_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             sql = f"UPDATE users SET last_login_time = '{current_time}' WHERE id = {user_id}"
             await self.db.execute(sql)
+            await self.invalidate_principal(user_id)
             
         except Exception as e:
             logger.error(f'❌ 更新登录时间失败: {e}')
@@ -263,8 +360,10 @@ class AuthService:
             user_id: 用户ID
         """
         try:
-            sql = f"UPDATE users SET is_active = 0 WHERE id = {user_id}"
+            # 同时吊销已签发的Token
+            sql = f"UPDATE users SET is_active = 0, token_version = token_version + 1 WHERE id = {user_id}"
             await self.db.execute(sql)
+            await self.invalidate_principal(user_id)
             
         except Exception as e:
             logger.error(f'❌ 禁用用户失败: {e}')
@@ -280,6 +379,7 @@ class AuthService:
         try:
             sql = f"UPDATE users SET is_active = 1 WHERE id = {user_id}"
             await self.db.execute(sql)
+            await self.invalidate_principal(user_id)
             
         except Exception as e:
             logger.error(f'❌ 激活用户失败: {e}')
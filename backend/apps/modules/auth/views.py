@@ -4,6 +4,8 @@
 1. Linux.do OAuth 2.0 认证
 2. 本地用户名密码认证
 """
+import math
+
 from sanic import Blueprint
 from sanic.response import json
 from sanic_ext import openapi
@@ -11,8 +13,10 @@ from sanic.log import logger
 
 from apps.utils.linux_do_oauth import LinuxDoOAuth
 from apps.utils.jwt_utils import JWTUtil
+from apps.utils.login_throttle import login_throttle
 from apps.utils.auth_middleware import auth_required
-from apps.utils.password_utils import PasswordUtil, UsernameUtil
+from apps.utils.http_cache import CACHE_PUBLIC_SHORT, cache_headers, etag_matches, make_etag, not_modified
+from apps.utils.password_utils import PasswordHashBusy, PasswordUtil, UsernameUtil
 from .services import AuthService
 from .models import *
 
@@ -57,7 +61,7 @@ async def linux_do_login(request):
         # 2. 通过code获取用户信息
         try:
             oauth = LinuxDoOAuth()
-            user_info = oauth.get_user_by_code(code)
+            user_info = await oauth.get_user_by_code(code)
             
         except Exception as e:
             logger.error(f'❌ 获取Linux.do用户信息失败: {e}')
@@ -96,7 +100,10 @@ async def linux_do_login(request):
             token = JWTUtil.generate_token(
                 user['id'], 
                 user.get('linux_do_id', ''), 
-                expire_hours=24*7  # 7天有效期
+                expire_hours=24*7,  # 7天有效期
+                is_admin=user.get('is_admin', 0) == 1,
+                is_active=bool(user.get('is_active', 1)),
+                token_version=user.get('token_version', 0)
             )
             
         except Exception as e:
@@ -163,24 +170,53 @@ async def local_login(request):
                 'message': '用户名和密码不能为空'
             })
         
-        # 2. 验证用户名和密码
+        # 2. 失败次数限流（在密码校验之前，被限流的请求不消耗 bcrypt；允许的尝试先预留为一次失败）
+        client_ip = login_throttle.client_ip(request)
+        retry_after, attempt = await login_throttle.check(username, client_ip)
+        if retry_after > 0:
+            retry_after = math.ceil(retry_after)
+            logger.warning(f'⚠️  登录限流: username={username}, ip={client_ip}, {retry_after}s 后可重试')
+            return json({
+                'code': 429,
+                'message': f'登录失败次数过多，请 {retry_after} 秒后再试',
+                'data': {'retry_after': retry_after}
+            }, headers={'Retry-After': str(retry_after)})
+        
+        # 3. 验证用户名和密码
         auth_service = AuthService(request.app.ctx.db)
-        user = await auth_service.verify_local_user(username, password)
+        try:
+            user = await auth_service.verify_local_user(username, password)
+        except PasswordHashBusy as e:
+            await login_throttle.release(attempt)
+            return json({
+                'code': 429,
+                'message': str(e)
+            })
+        except Exception:
+            await login_throttle.release(attempt)
+            raise
         
         if not user:
+            # 预留的尝试即记为这次失败
             return json({
                 'code': 400,
                 'message': '用户名或密码错误'
             })
         
-        # 3. 生成JWT Token
+        await login_throttle.release(attempt)
+        await login_throttle.reset(username)
+        
+        # 4. 生成JWT Token
         token = JWTUtil.generate_token(
             user['id'],
             username,  # 使用username作为标识
-            expire_hours=24*7  # 7天有效期
+            expire_hours=24*7,  # 7天有效期
+            is_admin=user.get('is_admin', 0) == 1,
+            is_active=bool(user.get('is_active', 1)),
+            token_version=user.get('token_version', 0)
         )
         
-        # 4. 返回响应
+        # 5. 返回响应
         logger.info(f'✅ 本地用户登录成功: username={username}, id={user["id"]}')
         
         return json({
@@ -277,6 +313,11 @@ async def local_register(request):
                 'code': 400,
                 'message': str(e)
             })
+        except PasswordHashBusy as e:
+            return json({
+                'code': 429,
+                'message': str(e)
+            })
         
     except Exception as e:
         logger.error(f'❌ 本地注册接口异常: {e}', exc_info=True)
@@ -314,8 +355,32 @@ async def refresh_token(request):
         
         old_token = auth_header.split(' ')[1]
         
+        payload = JWTUtil.verify_token(old_token)
+        if not payload:
+            return json({
+                'code': 401,
+                'message': 'Token无效或已过期,请重新登录'
+            })
+        
+        # 按最新的用户信息签发（角色变更、账号禁用在刷新时生效）
+        auth_service = AuthService(request.app.ctx.db)
+        user = await auth_service.get_principal(payload['user_id'])
+        if not user or not user.get('is_active', 0):
+            return json({
+                'code': 401,
+                'message': '账号不存在或已被禁用,请重新登录'
+            })
+        
+        # 禁用、吊销或登出后的Token不能再刷新
+        if payload.get('tv', 0) != user.get('token_version', 0) or \
+                (payload.get('jti') and await auth_service.is_token_revoked(payload['jti'])):
+            return json({
+                'code': 401,
+                'message': '登录已失效,请重新登录'
+            })
+        
         # 刷新Token
-        new_token = JWTUtil.refresh_token(old_token, expire_hours=24*7)  # 7天有效期
+        new_token = JWTUtil.refresh_token(old_token, expire_hours=24*7, user=user)  # 7天有效期
         
         if not new_token:
             return json({
@@ -356,9 +421,9 @@ async def get_userinfo(request):
         # 从认证中间件获取user_id
         user_id = request.ctx.user_id
         
-        # 查询用户信息
+        # 查询用户信息（短TTL缓存）
         auth_service = AuthService(request.app.ctx.db)
-        user = await auth_service.get_user_by_id(user_id)
+        user = await auth_service.get_principal(user_id)
         
         if not user:
             return json({
@@ -393,18 +458,18 @@ async def get_userinfo(request):
 @auth.post('/logout')
 @auth_required
 @openapi.summary("用户登出")
-@openapi.description("用户登出(客户端需清除本地Token)")
+@openapi.description("用户登出(客户端需清除本地Token，服务端吊销当前Token，其他设备的登录不受影响)")
 @openapi.secured("BearerAuth")
 @openapi.response(200, {"application/json": {"code": int, "message": str}}, description="登出成功")
 async def logout(request):
     """
     用户登出接口
     
-    由于使用JWT,服务端无状态,实际登出由客户端清除Token实现
-    此接口仅用于记录日志
+    客户端清除Token；服务端吊销当前Token（按 jti 记录到过期），该用户在其他设备上的登录不受影响
     """
     try:
         user_id = request.ctx.user_id
+        await AuthService(request.app.ctx.db).revoke_token(request.ctx.token_payload)
         logger.info(f'📤 用户登出: user_id={user_id}')
         
         return json({
@@ -426,7 +491,7 @@ async def logout(request):
 
 @auth.get('/config')
 @openapi.summary("获取认证配置")
-@openapi.description("获取系统支持的认证方式")
+@openapi.description("获取系统支持的认证方式（可缓存 5 分钟，支持 If-None-Match 协商缓存）")
 @openapi.response(200, {"application/json": {
     "code": int,
     "data": {
@@ -437,6 +502,7 @@ async def logout(request):
         "registration_enabled": openapi.Boolean(description="是否允许注册")
     }
 }})
+@openapi.response(304, description="配置未变化")
 async def get_auth_config(request):
     """
     获取认证配置接口
@@ -449,16 +515,23 @@ async def get_auth_config(request):
         
         is_linux_do_enabled = LinuxDoOAuth.is_configured()
         
+        config_data = {
+            'linux_do_enabled': is_linux_do_enabled,
+            'linux_do_client_id': request.app.config.LINUX_DO_CLIENT_ID if is_linux_do_enabled else '',
+            'linux_do_redirect_uri': request.app.config.LINUX_DO_REDIRECT_URI if is_linux_do_enabled else '',
+            'local_auth_enabled': True,  # 本地认证始终可用
+            'registration_enabled': True  # 是否允许注册（可配置）
+        }
+        
+        # 配置只随部署变化：短时间内浏览器直接使用缓存，过期后按 ETag 协商
+        etag = make_etag(*sorted(config_data.items()))
+        if etag_matches(request, etag):
+            return not_modified(request, etag, CACHE_PUBLIC_SHORT)
+        
         return json({
             'code': 200,
-            'data': {
-                'linux_do_enabled': is_linux_do_enabled,
-                'linux_do_client_id': request.app.config.LINUX_DO_CLIENT_ID if is_linux_do_enabled else '',
-                'linux_do_redirect_uri': request.app.config.LINUX_DO_REDIRECT_URI if is_linux_do_enabled else '',
-                'local_auth_enabled': True,  # 本地认证始终可用
-                'registration_enabled': True  # 是否允许注册（可配置）
-            }
-        })
+            'data': config_data
+        }, headers=cache_headers(etag, CACHE_PUBLIC_SHORT))
         
     except Exception as e:
         logger.error(f'❌ 获取认证配置失败: {e}')
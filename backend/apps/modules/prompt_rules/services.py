@@ -1,5 +1,8 @@
 from sanic.log import logger
 
+from apps.utils.cache import cache, rules_cache_tag
+
+
 class PromptRulesService:
     """用户提示词规则服务"""
     
@@ -7,7 +10,20 @@ class PromptRulesService:
         self.db = db
     
     async def get_user_rules(self, user_id: int):
-        """获取用户的提示词规则"""
+        """获取用户的提示词规则（经缓存，保存/删除时失效；没有规则时同样缓存）"""
+        try:
+            return await cache.get_or_load(
+                f'rules:{user_id}',
+                lambda: self._load_user_rules(user_id),
+                tags=[rules_cache_tag(user_id)],
+                cache_none=True
+            )
+        except Exception as e:
+            logger.error(f'❌ 获取用户提示词规则失败: {e}')
+            raise
+    
+    async def _load_user_rules(self, user_id: int):
+        """从数据库读取用户的提示词规则"""
         try:
             sql = "SELECT * FROM user_prompt_rules WHERE user_id = ?"
             rules = await self.db.get(sql, [user_id])
@@ -20,7 +36,7 @@ class PromptRulesService:
         """保存或更新用户的提示词规则（支持部分更新）"""
         try:
             # 检查用户规则是否存在
-            existing = await self.get_user_rules(user_id)
+            existing = await self._load_user_rules(user_id)
             
             # 允许的字段列表
             allowed_fields = [
@@ -61,6 +77,8 @@ class PromptRulesService:
                 await self.db.table_insert('user_prompt_rules', update_fields)
                 logger.info(f'✅ 创建用户提示词规则成功: user_id={user_id}, 字段数={len(update_fields)}')
             
+            await cache.invalidate(rules_cache_tag(user_id))
+            
             # 返回更新后的规则
             return await self.get_user_rules(user_id)
             
@@ -73,6 +91,7 @@ class PromptRulesService:
         try:
             sql = "DELETE FROM user_prompt_rules WHERE user_id = ?"
             await self.db.execute(sql, [user_id])
+            await cache.invalidate(rules_cache_tag(user_id))
             logger.info(f'✅ 删除用户提示词规则成功: user_id={user_id}')
         except Exception as e:
             logger.error(f'❌ 删除用户提示词规则失败: {e}')
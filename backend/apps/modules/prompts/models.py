@@ -54,6 +54,7 @@ class PromptListItem:
     id: int = openapi.Integer(description="提示词ID")
     title: str = openapi.String(description="标题")
     description: str = openapi.String(description="描述")
+    preview: str = openapi.String(description="最终提示词预览(截断,被截断时以…结尾)")
     language: str = openapi.String(description="语言")
     format: str = openapi.String(description="格式")
     prompt_type: str = openapi.String(description="提示词类型")
@@ -67,6 +68,7 @@ class PromptListItem:
     last_version_time: str = openapi.String(description="最后版本时间")
     create_time: str = openapi.String(description="创建时间")
     update_time: str = openapi.String(description="更新时间")
+    snippet: str = openapi.String(description="搜索高亮摘要(仅关键词搜索时返回, HTML, 关键词以<mark>包裹)")
 
 
 # 提示词列表响应
@@ -76,6 +78,8 @@ class PromptListData:
     page: int = openapi.Integer(description="当前页")
     limit: int = openapi.Integer(description="每页数量")
     items: list = openapi.Array(PromptListItem, description="提示词列表")
+    next_cursor: str = openapi.String(description="下一页游标(没有下一页时为null)")
+    has_more: bool = openapi.Boolean(description="是否还有下一页(游标分页)")
 
 
 @openapi.component
@@ -118,6 +122,19 @@ class PromptDetailResponse:
     data: PromptInfo = openapi.Object(PromptInfo, description="提示词详情")
 
 
+# 批量详情响应
+@openapi.component
+class PromptBatchData:
+    items: list = openapi.Array(PromptInfo, description="提示词详情列表(按请求的ID顺序)")
+    missing: list = openapi.Array(openapi.Integer(), description="不存在或无权限的ID")
+
+
+@openapi.component
+class PromptBatchResponse:
+    code: int = openapi.Integer(description="状态码", default=200)
+    data: PromptBatchData = openapi.Object(PromptBatchData, description="响应数据")
+
+
 # 错误响应
 @openapi.component
 class ErrorResponse:
@@ -6,18 +6,75 @@ import json
 import datetime
 from sanic.log import logger
 
+from apps.utils.blob_store import PROMPT_BLOB_FIELDS, blob_store, dump_refs, parse_refs
+from apps.utils.cache import cache, prompt_cache_tag, prompt_counter_tag
+from apps.utils.fulltext import build_search, make_snippet
+from apps.utils.http_cache import make_etag
+from apps.utils.pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_condition, next_cursor
+from apps.utils.tag_utils import join_tags, release_prompt_tags, split_tags, sync_prompt_tags, tag_filter_condition
+from apps.utils.version_store import version_store
+from config.settings import Config
+
+
+# 列表可返回的字段（fields= 参数）；preview 为 final_prompt 的前 PROMPT_PREVIEW_LENGTH 个字符
+LIST_FIELDS = (
+    'id', 'title', 'description', 'preview', 'final_prompt', 'language', 'format',
+    'prompt_type', 'system_prompt', 'conversation_history',
+    'is_favorite', 'is_public', 'view_count', 'use_count', 'tags',
+    'current_version', 'total_versions', 'last_version_time',
+    'create_time', 'update_time'
+)
+
+# 预置的字段组合：summary（默认，不含大文本字段）/ full（与详情相同的大文本字段全部返回）
+LIST_PROJECTIONS = {
+    'summary': tuple(f for f in LIST_FIELDS if f not in ('final_prompt', 'system_prompt', 'conversation_history')),
+    'full': tuple(f for f in LIST_FIELDS if f != 'preview'),
+}
+
+# 批量获取详情时单次最多的ID数
+BATCH_DETAIL_LIMIT = 100
+
+# 不参与详情 ETag 的字段（浏览/使用次数经写缓冲更新，刷新时触发器会同时更新 update_time）
+ETAG_EXCLUDED_FIELDS = ('view_count', 'use_count', 'update_time')
+
+
+class InvalidFields(ValueError):
+    """fields 参数包含不支持的字段"""
+
+
+def parse_list_fields(fields) -> tuple:
+    """
+    解析 fields 参数
+
+    Args:
+        fields: summary / full / 逗号分隔的字段名，为空时使用 summary
+
+    Raises:
+        InvalidFields: 包含不支持的字段
+    """
+    fields = (fields or 'summary').strip()
+    if fields in LIST_PROJECTIONS:
+        return LIST_PROJECTIONS[fields]
+    names = tuple(dict.fromkeys(f.strip() for f in fields.split(',') if f.strip()))
+    unknown = [f for f in names if f not in LIST_FIELDS]
+    if unknown or not names:
+        raise InvalidFields(f'不支持的字段: {", ".join(unknown)}' if unknown else 'fields 不能为空')
+    return names
+
 
 class PromptService:
     """提示词服务类"""
     
-    def __init__(self, db):
+    def __init__(self, db, counters=None):
         """
         初始化提示词服务
         
         Args:
             db: 数据库连接对象(ezmysql ConnectionAsync)
+            counters: 计数器写缓冲(CounterBuffer)，为空时浏览/使用次数直接更新数据库
         """
         self.db = db
+        self.counters = counters
     
     async def save_prompt(self, user_id, data):
         """
@@ -141,7 +198,7 @@ class PromptService:
             # 处理数组字段(转为JSON字符串)
             thinking_points = json.dumps(data.get('thinking_points', []), ensure_ascii=False) if data.get('thinking_points') else None
             advice = json.dumps(data.get('advice', []), ensure_ascii=False) if data.get('advice') else None
-            tags_list = data.get('tags', [])
+            tags_list = split_tags(data.get('tags'))
             tags = ','.join(tags_list) if tags_list else None
             
             # 准备插入数据
@@ -168,12 +225,13 @@ class PromptService:
                 'conversation_history': data.get('conversation_history', '') if data.get('prompt_type') == 'user' else None
             }
             
-            # 插入数据库
-            prompt_id = await self.db.table_insert('prompts', fields)
-            
-            # 更新标签统计
-            if tags_list:
-                await self._update_tags(user_id, tags_list)
+            # 插入数据库，同一事务内写入大字段、标签映射与标签计数
+            async with self.db.transaction():
+                refs = await blob_store.externalize(self.db, fields, PROMPT_BLOB_FIELDS)
+                fields['content_refs'] = dump_refs(refs)
+                prompt_id = await self.db.table_insert('prompts', fields)
+                if tags_list:
+                    await sync_prompt_tags(self.db, user_id, prompt_id, tags_list)
             
             logger.info(f'✅ 提示词创建成功: prompt_id={prompt_id}, user_id={user_id}, title={fields["title"]}')
             
@@ -183,144 +241,211 @@ class PromptService:
             logger.error(f'❌ 创建提示词失败: {e}')
             raise
     
-    async def get_prompts_list(self, user_id, page=1, limit=10, keyword='', tag='', is_favorite='', sort='create_time'):
+    async def get_prompts_list(self, user_id, page=1, limit=10, keyword='', tag='', is_favorite='', sort='create_time',
+                               cursor=None, with_total=True, fields=None):
         """
         获取提示词列表(分页)
+        
+        fields 指定返回的字段（见 LIST_FIELDS / LIST_PROJECTIONS），默认 summary 不返回
+        final_prompt / system_prompt / conversation_history，只返回截断后的 preview；
+        id 和排序字段总是返回
+        
+        支持两种分页方式：
+        - 页码分页: page + limit（默认，返回total）
+        - 游标分页: cursor 不为 None 时启用（空字符串表示第一页），按 (排序字段, id) 定位，
+          深翻页与首页同样快；total 仅在 with_total=True 时计算
+        
+        关键词搜索优先使用全文索引（见 apps.utils.fulltext），可按相关度排序(sort=relevance)，
+        结果带高亮摘要 snippet；全文索引不可用或关键词过短时回退到 LIKE
+        
+        Raises:
+            InvalidCursor: 游标无效
+            InvalidFields: fields 包含不支持的字段
         """
         try:
             offset = (page - 1) * limit if page > 0 else 0
+            keyword = (keyword or '').strip()
+            fields = parse_list_fields(fields)
             
-            # 构建基础查询
+            # 排序（id 作为第二排序键，保证顺序稳定，也是游标分页的定位键）
+            sort_options = {
+                'create_time': 'create_time',
+                'update_time': 'update_time',
+                'view_count': 'view_count',
+                'use_count': 'use_count'
+            }
+            
+            # 构建基础查询（只查询需要的列；preview 在数据库中截断，多取一个字符判断是否被截断；
+            # 搜索时多一列 snippet，先取 final_prompt 全文，查询后替换为高亮摘要）
+            preview_length = Config.PROMPT_PREVIEW_LENGTH
+            columns = [f for f in ('id', sort_options.get(sort, 'create_time')) if f not in fields] + list(fields)
+            select_list = [
+                f"SUBSTR(final_prompt, 1, {preview_length + 1}) AS preview" if f == 'preview' else f
+                for f in columns
+            ]
+            if keyword:
+                select_list.append("final_prompt AS snippet")
             base_query = """
-                SELECT id, title, description, final_prompt, language, format, 
-                       prompt_type, system_prompt, conversation_history,
-                       is_favorite, is_public, view_count, use_count, tags, 
-                       current_version, total_versions, last_version_time, 
-                       create_time, update_time
+                SELECT {}
                 FROM prompts
-            """
+            """.format(', '.join(select_list))
             
-            # 构建WHERE条件
+            # 构建WHERE条件（参数按条件顺序收集）
             conditions = ["user_id = " + str(user_id)]
+            filter_params = []
             
-            if keyword and keyword.strip():
-                # 安全处理搜索关键词
+            search = build_search(self.db, keyword) if keyword else None
+            if keyword and not search:
+                # 全文索引不可用或关键词过短，回退到 LIKE
                 safe_keyword = keyword.replace("'", "").replace("\"", "").replace("\\", "").replace("%", "%%")
-                conditions.append("(title LIKE '%%{}%%' OR description LIKE '%%{}%%')".format(safe_keyword, safe_keyword))
+                conditions.append(
+                    "(title LIKE '%%{0}%%' OR description LIKE '%%{0}%%' OR final_prompt LIKE '%%{0}%%')".format(safe_keyword)
+                )
             
             if tag and tag.strip():
-                # 安全处理标签
-                safe_tag = tag.replace("'", "").replace("\"", "").replace("\\", "").replace("%", "%%")
-                conditions.append("tags LIKE '%%{}%%'".format(safe_tag))
+                # 按标签精确筛选，走 prompt_tag_map 索引
+                condition, params = tag_filter_condition(user_id, tag)
+                conditions.append(condition)
+                filter_params += params
             
             if is_favorite != '':
                 conditions.append("is_favorite = " + str(int(is_favorite)))
             
-            where_clause = " WHERE " + " AND ".join(conditions)
-            
-            # 排序
-            sort_options = {
-                'create_time': 'create_time DESC',
-                'update_time': 'update_time DESC',
-                'view_count': 'view_count DESC', 
-                'use_count': 'use_count DESC'
-            }
-            order_by = sort_options.get(sort, 'create_time DESC')
-            
-            # 分页
-            pagination = " LIMIT " + str(limit) + " OFFSET " + str(offset)
-            
-            # 完整查询
-            list_sql = base_query + where_clause + " ORDER BY " + order_by + pagination
-            
-            # 执行查询
-            items = await self.db.query(list_sql)
+            if sort == 'relevance' and not search:
+                sort = 'create_time'
+            if sort != 'relevance' and sort not in sort_options:
+                sort = 'create_time'
             
-            # 计数查询
-            count_sql = "SELECT COUNT(*) as total FROM prompts" + where_clause
-            count_result = await self.db.get(count_sql)
-            total = count_result['total'] if count_result else 0
+            # 全文检索过滤条件放在最后（相关度排序改用JOIN时去掉）
+            base_params = list(filter_params)
+            if search:
+                conditions.append(search.condition)
+                filter_params += search.condition_params
+            where_clause = " WHERE " + " AND ".join(conditions)
             
-            # 处理标签
+            # 计数查询（不含游标条件）
+            total = None
+            if cursor is None or with_total:
+                count_sql = "SELECT COUNT(*) as total FROM prompts" + where_clause
+                count_result = await self.db.get(count_sql, filter_params)
+                total = count_result['total'] if count_result else 0
+            
+            if sort == 'relevance':
+                # 相关度排序没有稳定的定位键，游标中保存的是偏移量
+                if cursor:
+                    offset, _ = decode_cursor(cursor, sort)
+                    if not isinstance(offset, int) or offset < 0:
+                        raise InvalidCursor('无效的分页游标')
+                
+                # 需要JOIN取相关度时，JOIN已完成全文过滤，去掉过滤条件
+                params = filter_params + search.rank_params
+                rank_query = base_query
+                rank_where = where_clause
+                if search.rank_join:
+                    rank_query += search.rank_join
+                    rank_where = " WHERE " + " AND ".join(conditions[:-1])
+                    params = search.rank_join_params + base_params + search.rank_params
+                
+                list_sql = rank_query + rank_where + " ORDER BY " + search.rank + ", id DESC" + \
+                    " LIMIT " + str(limit + 1) + " OFFSET " + str(offset)
+                items = await self.db.query(list_sql, params)
+                
+                cursor_value = None
+                if len(items) > limit:
+                    items = items[:limit]
+                    cursor_value = encode_cursor(sort, offset + limit, 0)
+            elif cursor is None:
+                sort_column = sort_options[sort]
+                order_by = f"{sort_column} DESC, id DESC"
+                
+                # 页码分页
+                pagination = " LIMIT " + str(limit) + " OFFSET " + str(offset)
+                list_sql = base_query + where_clause + " ORDER BY " + order_by + pagination
+                
+                # 执行查询（列表使用轻量级行对象，避免逐行构造dict）
+                items = await self.db.query(list_sql, filter_params)
+                
+                # 还有下一页时同样返回游标，客户端可从任意一页切换到游标分页
+                cursor_value = None
+                if items and offset + len(items) < total:
+                    cursor_value = encode_cursor(sort, items[-1][sort_column], items[-1]['id'])
+            else:
+                sort_column = sort_options[sort]
+                order_by = f"{sort_column} DESC, id DESC"
+                
+                # 游标分页：多取一行判断是否还有下一页
+                params = list(filter_params)
+                cursor_where = where_clause
+                if cursor:
+                    value, last_id = decode_cursor(cursor, sort)
+                    condition, cursor_params = keyset_condition(sort_column, 'id', value, last_id)
+                    cursor_where += " AND " + condition
+                    params += cursor_params
+                list_sql = base_query + cursor_where + " ORDER BY " + order_by + " LIMIT " + str(limit + 1)
+                
+                items = await self.db.query(list_sql, params)
+                items, cursor_value = next_cursor(items, limit, sort, sort_column)
+            
+            # 高亮摘要（只处理当前页）
+            if keyword:
+                for item in items:
+                    item['snippet'] = make_snippet(
+                        [item['snippet'], item.get('description'), item.get('title')], keyword
+                    )
+            
+            # 合并尚未落库的浏览/使用次数
+            if self.counters:
+                self.counters.merge('prompts', items)
+            
+            # 处理标签、时间、预览（只处理返回的字段）
+            time_fields = [f for f in ('create_time', 'update_time', 'last_version_time') if f in columns]
             for item in items:
-                tags_str = item.get('tags', '')
-                if tags_str and tags_str.strip():
-                    # 检测是否是Python list字符串表示（如 "['tag1', 'tag2']"）
-                    if tags_str.startswith('[') and tags_str.endswith(']'):
-                        try:
-                            # 尝试使用json.loads解析
-                            item['tags'] = json.loads(tags_str)
-                        except:
-                            # 如果失败，按逗号分割
-                            item['tags'] = [tag.strip() for tag in tags_str.split(',') if tag.strip()]
-                    else:
-                        # 正常的逗号分隔格式
-                        item['tags'] = [tag.strip() for tag in tags_str.split(',') if tag.strip()]
-                else:
-                    item['tags'] = []
-                item['create_time'] = str(item['create_time']) if item.get('create_time') else ''
-                item['update_time'] = str(item['update_time']) if item.get('update_time') else ''
-                item['last_version_time'] = str(item['last_version_time']) if item.get('last_version_time') else ''
+                if 'tags' in fields:
+                    item['tags'] = split_tags(item.get('tags'))
+                for field in time_fields:
+                    item[field] = str(item[field]) if item[field] else ''
+                if 'preview' in fields and item['preview'] and len(item['preview']) > preview_length:
+                    item['preview'] = item['preview'][:preview_length] + '…'
+            
+            if cursor is not None:
+                result = {
+                    'limit': limit,
+                    'items': items,
+                    'next_cursor': cursor_value,
+                    'has_more': cursor_value is not None
+                }
+                if total is not None:
+                    result['total'] = total
+                return result
             
             return {
                 'total': total,
                 'page': page,
                 'limit': limit,
-                'items': items
+                'items': items,
+                'next_cursor': cursor_value
             }
             
+        except (InvalidCursor, InvalidFields):
+            raise
         except Exception as e:
             logger.error(f'❌ 查询提示词列表失败: {e}')
             raise
     
     async def get_prompt_detail(self, user_id, prompt_id):
         """
-        获取提示词详情
+        获取提示词详情（经缓存，写操作通过 prompt_cache_tag 失效）
         """
         try:
-            where_condition = "id = " + str(prompt_id) + " AND user_id = " + str(user_id)
-            sql = "SELECT * FROM prompts WHERE " + where_condition
-            prompt = await self.db.get(sql)
+            prompt = await self._cached_detail(user_id, prompt_id)
             
             if prompt:
-                # 解析JSON字段
-                if prompt.get('thinking_points'):
-                    try:
-                        prompt['thinking_points'] = json.loads(prompt['thinking_points'])
-                    except:
-                        prompt['thinking_points'] = []
-                else:
-                    prompt['thinking_points'] = []
-                
-                if prompt.get('advice'):
-                    try:
-                        prompt['advice'] = json.loads(prompt['advice'])
-                    except:
-                        prompt['advice'] = []
-                else:
-                    prompt['advice'] = []
-                
-                if prompt.get('tags'):
-                    tags_str = prompt['tags']
-                    # 检测是否是Python list字符串表示（如 "['tag1', 'tag2']"）
-                    if tags_str.startswith('[') and tags_str.endswith(']'):
-                        try:
-                            # 尝试使用json.loads解析
-                            prompt['tags'] = json.loads(tags_str)
-                        except:
-                            # 如果失败，按逗号分割
-                            prompt['tags'] = [tag.strip() for tag in tags_str.split(',') if tag.strip()]
-                    else:
-                        # 正常的逗号分隔格式
-                        prompt['tags'] = [tag.strip() for tag in tags_str.split(',') if tag.strip()]
-                else:
-                    prompt['tags'] = []
-                
-                # 时间格式化
-                prompt['create_time'] = str(prompt['create_time']) if prompt.get('create_time') else ''
-                prompt['update_time'] = str(prompt['update_time']) if prompt.get('update_time') else ''
-                prompt['last_version_time'] = str(prompt['last_version_time']) if prompt.get('last_version_time') else ''
-                
+                # 次数单独缓存：点击只失效计数，不失效详情
+                counts = await self._cached_counts(prompt_id)
+                if counts:
+                    prompt.update(counts)
+                if self.counters:
+                    self.counters.merge('prompts', [prompt])
                 logger.debug(f'✅ 查询提示词详情成功: prompt_id={prompt_id}, user_id={user_id}')
             else:
                 logger.warning(f'⚠️  提示词不存在或无权限: prompt_id={prompt_id}, user_id={user_id}')
@@ -331,6 +456,127 @@ class PromptService:
             logger.error(f'❌ 查询提示词详情失败: {e}')
             raise
     
+    async def get_prompt_etag(self, user_id, prompt_id):
+        """
+        提示词详情的 ETag（与详情缓存一起经 prompt_cache_tag 失效）
+        
+        由 id 和详情内容的摘要生成，不包含 ETAG_EXCLUDED_FIELDS
+        
+        Returns:
+            str: ETag，提示词不存在或无权限返回None
+        """
+        return await cache.get_or_load(
+            f'prompt_etag:{user_id}:{prompt_id}',
+            lambda: self._load_prompt_etag(user_id, prompt_id),
+            tags=[prompt_cache_tag(prompt_id)]
+        )
+    
+    async def _load_prompt_etag(self, user_id, prompt_id):
+        prompt = await self._cached_detail(user_id, prompt_id)
+        if not prompt:
+            return None
+        content = {k: v for k, v in prompt.items() if k not in ETAG_EXCLUDED_FIELDS}
+        return make_etag(prompt_id, json.dumps(content, sort_keys=True, ensure_ascii=False, default=str))
+    
+    def _cached_counts(self, prompt_id):
+        """缓存中的浏览/使用次数（计数刷新时经 prompt_counter_tag 失效）"""
+        return cache.get_or_load(
+            f'prompt_counts:{prompt_id}',
+            lambda: self.db.get("SELECT view_count, use_count FROM prompts WHERE id = ?", [prompt_id]),
+            tags=[prompt_counter_tag(prompt_id), prompt_cache_tag(prompt_id)]
+        )
+    
+    def _cached_detail(self, user_id, prompt_id):
+        """缓存中的详情（次数可能已落后，读取时以 _cached_counts 为准）"""
+        return cache.get_or_load(
+            f'prompt:{user_id}:{prompt_id}',
+            lambda: self._load_prompt_detail(user_id, prompt_id),
+            tags=[prompt_cache_tag(prompt_id)]
+        )
+    
+    async def _load_prompt_detail(self, user_id, prompt_id):
+        """从数据库读取提示词详情"""
+        where_condition = "id = " + str(prompt_id) + " AND user_id = " + str(user_id)
+        sql = "SELECT * FROM prompts WHERE " + where_condition
+        prompt = await self.db.get(sql)
+        
+        if prompt:
+            # 还原外置存储的大字段
+            await blob_store.materialize(self.db, prompt)
+            self._format_detail(prompt)
+        
+        return prompt
+    
+    async def get_prompts_detail(self, user_id, prompt_ids):
+        """
+        批量获取提示词详情（一次查询，不增加浏览次数）
+        
+        Args:
+            prompt_ids: 提示词ID列表（最多 BATCH_DETAIL_LIMIT 个）
+            
+        Returns:
+            list: 按 prompt_ids 顺序返回存在且有权限的提示词
+        """
+        try:
+            prompt_ids = list(dict.fromkeys(int(i) for i in prompt_ids))
+            if not prompt_ids:
+                return []
+            if len(prompt_ids) > BATCH_DETAIL_LIMIT:
+                raise ValueError(f'一次最多获取 {BATCH_DETAIL_LIMIT} 个提示词')
+            
+            sql = "SELECT * FROM prompts WHERE user_id = ? AND id IN (" + ', '.join(['?'] * len(prompt_ids)) + ")"
+            rows = await self.db.query(sql, [user_id] + prompt_ids)
+            
+            # 外置存储的大字段一次读取，之后逐行还原时命中缓存
+            digests = [digest for row in rows for digest in parse_refs(row.get('content_refs')).values()]
+            if digests:
+                await blob_store.get_many(self.db, digests)
+            for row in rows:
+                await blob_store.materialize(self.db, row)
+                self._format_detail(row)
+            
+            if self.counters:
+                self.counters.merge('prompts', rows)
+            
+            by_id = {row['id']: row for row in rows}
+            return [by_id[i] for i in prompt_ids if i in by_id]
+            
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f'❌ 批量查询提示词详情失败: {e}')
+            raise
+    
+    @staticmethod
+    def _format_detail(prompt):
+        """详情字段格式化（解析JSON字段、拆分标签、时间转字符串）"""
+        if prompt:
+            # 解析JSON字段
+            if prompt.get('thinking_points'):
+                try:
+                    prompt['thinking_points'] = json.loads(prompt['thinking_points'])
+                except:
+                    prompt['thinking_points'] = []
+            else:
+                prompt['thinking_points'] = []
+            
+            if prompt.get('advice'):
+                try:
+                    prompt['advice'] = json.loads(prompt['advice'])
+                except:
+                    prompt['advice'] = []
+            else:
+                prompt['advice'] = []
+            
+            prompt['tags'] = split_tags(prompt.get('tags'))
+            
+            # 时间格式化
+            prompt['create_time'] = str(prompt['create_time']) if prompt.get('create_time') else ''
+            prompt['update_time'] = str(prompt['update_time']) if prompt.get('update_time') else ''
+            prompt['last_version_time'] = str(prompt['last_version_time']) if prompt.get('last_version_time') else ''
+        
+        return prompt
+    
     async def update_prompt(self, user_id, prompt_id, data):
         """
         更新提示词
@@ -345,15 +591,16 @@ class PromptService:
         """
         try:
             # 先检查权限
-            check_sql = "SELECT id FROM prompts WHERE id = " + str(prompt_id) + " AND user_id = " + str(user_id)
+            check_sql = "SELECT id, content_refs FROM prompts WHERE id = " + str(prompt_id) + " AND user_id = " + str(user_id)
             exists = await self.db.get(check_sql)
             
             if not exists:
                 logger.warning(f'⚠️  无权限更新提示词: prompt_id={prompt_id}, user_id={user_id}')
                 return False
             
-            # 构建更新语句
+            # 构建更新语句（可能外置存储的大字段先收集，在事务中处理）
             update_fields = []
+            blob_values = {}
             
             def escape_sql_string(value):
                 """转义SQL字符串中的特殊字符"""
@@ -373,18 +620,16 @@ class PromptService:
                 update_fields.append("description = '" + escape_sql_string(data.get('description', '')) + "'")
             
             if 'requirement_report' in data:
-                update_fields.append("requirement_report = '" + escape_sql_string(data.get('requirement_report', '')) + "'")
+                blob_values['requirement_report'] = data.get('requirement_report', '')
             
             if 'thinking_points' in data:
-                thinking_points = escape_sql_string(json.dumps(data['thinking_points'], ensure_ascii=False))
-                update_fields.append("thinking_points = '" + thinking_points + "'")
+                blob_values['thinking_points'] = json.dumps(data['thinking_points'], ensure_ascii=False)
             
             if 'initial_prompt' in data:
-                update_fields.append("initial_prompt = '" + escape_sql_string(data.get('initial_prompt', '')) + "'")
+                blob_values['initial_prompt'] = data.get('initial_prompt', '')
             
             if 'advice' in data:
-                advice = escape_sql_string(json.dumps(data['advice'], ensure_ascii=False))
-                update_fields.append("advice = '" + advice + "'")
+                blob_values['advice'] = json.dumps(data['advice'], ensure_ascii=False)
             
             if 'final_prompt' in data:
                 update_fields.append("final_prompt = '" + escape_sql_string(data.get('final_prompt', '')) + "'")
@@ -406,21 +651,29 @@ class PromptService:
                 update_fields.append("conversation_history = '" + escape_sql_string(data.get('conversation_history', '')) + "'")
             
             if 'tags' in data:
-                tags = ','.join(data['tags']) if data['tags'] else ''
-                update_fields.append("tags = '" + escape_sql_string(tags) + "'")
-                # 更新标签统计
-                if data['tags']:
-                    await self._update_tags(user_id, data['tags'])
+                tags_list = split_tags(data['tags'])
+                update_fields.append("tags = '" + escape_sql_string(join_tags(tags_list)) + "'")
             
-            if not update_fields:
+            if not update_fields and not blob_values:
                 logger.warning('⚠️  没有需要更新的字段')
                 return False
             
-            update_sql = """
-                UPDATE prompts SET """ + ', '.join(update_fields) + """
-                WHERE id = """ + str(prompt_id) + """ AND user_id = """ + str(user_id)
+            # 同一事务内更新大字段引用、标签映射与标签计数
+            async with self.db.transaction():
+                if blob_values:
+                    content_refs = await blob_store.replace(self.db, blob_values, exists['content_refs'])
+                    for field, value in blob_values.items():
+                        update_fields.append(field + " = '" + escape_sql_string(value) + "'")
+                    update_fields.append("content_refs = " + ("'" + content_refs + "'" if content_refs else "NULL"))
+                
+                update_sql = """
+                    UPDATE prompts SET """ + ', '.join(update_fields) + """
+                    WHERE id = """ + str(prompt_id) + """ AND user_id = """ + str(user_id)
+                await self.db.execute(update_sql)
+                if 'tags' in data:
+                    await sync_prompt_tags(self.db, user_id, prompt_id, tags_list)
             
-            await self.db.execute(update_sql)
+            await cache.invalidate(prompt_cache_tag(prompt_id))
             
             logger.info(f'✅ 更新提示词成功: prompt_id={prompt_id}, user_id={user_id}')
             return True
@@ -442,16 +695,22 @@ class PromptService:
         """
         try:
             # 先检查权限
-            check_sql = "SELECT id FROM prompts WHERE id = " + str(prompt_id) + " AND user_id = " + str(user_id)
+            check_sql = "SELECT id, content_refs FROM prompts WHERE id = " + str(prompt_id) + " AND user_id = " + str(user_id)
             exists = await self.db.get(check_sql)
             
             if not exists:
                 logger.warning(f'⚠️  无权限删除提示词: prompt_id={prompt_id}, user_id={user_id}')
                 return False
             
-            # 删除提示词(级联删除关联的分享记录)
+            # 删除提示词(级联删除关联的分享记录、标签映射、版本)，释放其引用的大字段内容
             delete_sql = "DELETE FROM prompts WHERE id = " + str(prompt_id) + " AND user_id = " + str(user_id)
-            await self.db.execute(delete_sql)
+            async with self.db.transaction():
+                await release_prompt_tags(self.db, prompt_id)
+                await version_store.delete_versions(self.db, prompt_id)
+                await self.db.execute(delete_sql)
+                await blob_store.release(self.db, parse_refs(exists['content_refs']).values())
+            
+            await cache.invalidate(prompt_cache_tag(prompt_id))
             
             logger.info(f'✅ 删除提示词成功: prompt_id={prompt_id}, user_id={user_id}')
             return True
@@ -488,6 +747,7 @@ class PromptService:
                 WHERE id = """ + str(prompt_id) + """ AND user_id = """ + str(user_id)
             
             await self.db.execute(update_sql)
+            await cache.invalidate(prompt_cache_tag(prompt_id))
             
             action = '收藏' if is_favorite else '取消收藏'
             logger.info(f'✅ {action}提示词成功: prompt_id={prompt_id}, user_id={user_id}')
@@ -502,8 +762,12 @@ class PromptService:
         增加查看次数
         """
         try:
-            sql = "UPDATE prompts SET view_count = view_count + 1 WHERE id = " + str(prompt_id)
-            await self.db.execute(sql)
+            if self.counters:
+                await self.counters.incr('prompts', 'view_count', prompt_id)
+            else:
+                sql = "UPDATE prompts SET view_count = view_count + 1 WHERE id = " + str(prompt_id)
+                await self.db.execute(sql)
+                await cache.invalidate(prompt_counter_tag(prompt_id))
             logger.debug(f'✅ 增加查看次数: prompt_id={prompt_id}')
             
         except Exception as e:
@@ -522,49 +786,15 @@ class PromptService:
             if not exists:
                 return False
             
-            sql = "UPDATE prompts SET use_count = use_count + 1 WHERE id = " + str(prompt_id)
-            await self.db.execute(sql)
+            if self.counters:
+                await self.counters.incr('prompts', 'use_count', prompt_id)
+            else:
+                sql = "UPDATE prompts SET use_count = use_count + 1 WHERE id = " + str(prompt_id)
+                await self.db.execute(sql)
+                await cache.invalidate(prompt_counter_tag(prompt_id))
             logger.debug(f'✅ 增加使用次数: prompt_id={prompt_id}')
             return True
             
         except Exception as e:
             logger.error(f'❌ 增加使用次数失败: {e}')
             raise
-    
-    async def _update_tags(self, user_id, tags):
-        """
-        更新标签统计(内部方法)
-        
-        Args:
-            user_id: 用户ID
-            tags: 标签列表
-        """
-        try:
-            for tag in tags:
-                if not tag:
-                    continue
-                
-                # 检查标签是否存在
-                safe_tag = tag.replace("'", "''")
-                check_sql = "SELECT id, use_count FROM prompt_tags WHERE user_id = " + str(user_id) + " AND tag_name = '" + safe_tag + "'"
-                existing = await self.db.get(check_sql)
-                
-                if existing:
-                    # 更新使用次数
-                    update_sql = "UPDATE prompt_tags SET use_count = use_count + 1 WHERE id = " + str(existing['id'])
-                    await self.db.execute(update_sql)
-                else:
-                    # 创建新标签
-                    fields = {
-                        'tag_name': tag,
-                        'user_id': user_id,
-                        'use_count': 1
-                    }
-                    await self.db.table_insert('prompt_tags', fields)
-                
-            logger.debug(f'✅ 更新标签统计成功: user_id={user_id}, tags={tags}')
-            
-        except Exception as e:
-            logger.error(f'❌ 更新标签统计失败: {e}')
-            # 不抛出异常,因为这不是关键操作
-
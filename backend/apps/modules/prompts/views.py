@@ -8,7 +8,9 @@ from sanic_ext import openapi
 from sanic.log import logger
 
 from apps.utils.auth_middleware import auth_required
-from .services import PromptService
+from apps.utils.http_cache import CACHE_REVALIDATE, cache_headers, etag_matches, not_modified
+from apps.utils.pagination import InvalidCursor
+from .services import BATCH_DETAIL_LIMIT, InvalidFields, PromptService
 from .models import *
 
 
@@ -95,10 +97,13 @@ async def save_prompt(request):
 @openapi.secured("BearerAuth")
 @openapi.parameter("page", int, "query", description="页码", required=False)
 @openapi.parameter("limit", int, "query", description="每页数量", required=False)
-@openapi.parameter("keyword", str, "query", description="搜索关键词", required=False)
-@openapi.parameter("tag", str, "query", description="标签筛选", required=False)
+@openapi.parameter("keyword", str, "query", description="搜索关键词(全文检索标题/描述/提示词内容)", required=False)
+@openapi.parameter("tag", str, "query", description="标签筛选（精确匹配标签名）", required=False)
 @openapi.parameter("is_favorite", str, "query", description="是否收藏 1/0", required=False)
-@openapi.parameter("sort", str, "query", description="排序字段 create_time/update_time/view_count/use_count", required=False)
+@openapi.parameter("sort", str, "query", description="排序字段 create_time/update_time/view_count/use_count/relevance(仅搜索时)", required=False)
+@openapi.parameter("cursor", str, "query", description="游标分页: 传空值取第一页, 之后传上一页返回的next_cursor", required=False)
+@openapi.parameter("with_total", str, "query", description="游标分页时是否返回总数 1/0(默认0)", required=False)
+@openapi.parameter("fields", str, "query", description="返回字段: summary(默认,不含大文本,返回截断的preview)/full/逗号分隔的字段名", required=False)
 @openapi.response(200, {"application/json": PromptListResponse}, description="查询成功")
 async def get_prompts_list(request):
     """获取提示词列表"""
@@ -113,6 +118,12 @@ async def get_prompts_list(request):
         is_favorite = request.args.get('is_favorite', '')
         sort = request.args.get('sort', 'create_time')
         
+        # 游标分页（cursor= 空值也视为启用，表示第一页）
+        args = request.get_args(keep_blank_values=True)
+        cursor = args.get('cursor') if 'cursor' in args else None
+        with_total = request.args.get('with_total', '0') == '1'
+        fields = request.args.get('fields')
+        
         # 参数校验
         if page < 1:
             page = 1
@@ -120,9 +131,10 @@ async def get_prompts_list(request):
             limit = 10
         
         # 查询列表
-        prompt_service = PromptService(request.app.ctx.db)
+        prompt_service = PromptService(request.app.ctx.db, request.app.ctx.counters)
         result = await prompt_service.get_prompts_list(
-            user_id, page, limit, keyword, tag, is_favorite, sort
+            user_id, page, limit, keyword, tag, is_favorite, sort,
+            cursor=cursor, with_total=with_total, fields=fields
         )
         
         return json({
@@ -130,6 +142,11 @@ async def get_prompts_list(request):
             'data': result
         })
         
+    except (InvalidCursor, InvalidFields) as e:
+        return json({
+            'code': 400,
+            'message': str(e)
+        })
     except Exception as e:
         logger.error(f'❌ 查询提示词列表失败: {e}')
         return json({
@@ -138,20 +155,74 @@ async def get_prompts_list(request):
         })
 
 
+@prompts.get('/batch')
+@auth_required
+@openapi.summary("批量获取提示词详情")
+@openapi.description(f"按ID批量获取提示词的完整信息(一次最多{BATCH_DETAIL_LIMIT}个,不增加查看次数)")
+@openapi.secured("BearerAuth")
+@openapi.parameter("ids", str, "query", description="逗号分隔的提示词ID", required=True)
+@openapi.response(200, {"application/json": PromptBatchResponse}, description="查询成功")
+@openapi.response(400, {"application/json": ErrorResponse}, description="参数错误")
+async def get_prompts_batch(request):
+    """批量获取提示词详情"""
+    try:
+        user_id = request.ctx.user_id
+        
+        try:
+            ids = [int(i) for i in request.args.get('ids', '').split(',') if i.strip()]
+        except ValueError:
+            return json({
+                'code': 400,
+                'message': 'ids 格式错误'
+            })
+        
+        prompt_service = PromptService(request.app.ctx.db, request.app.ctx.counters)
+        items = await prompt_service.get_prompts_detail(user_id, ids)
+        
+        return json({
+            'code': 200,
+            'data': {
+                'items': items,
+                'missing': sorted(set(ids) - {item['id'] for item in items})
+            }
+        })
+        
+    except ValueError as e:
+        return json({
+            'code': 400,
+            'message': str(e)
+        })
+    except Exception as e:
+        logger.error(f'❌ 批量查询提示词详情失败: {e}')
+        return json({
+            'code': 500,
+            'message': f'查询失败: {str(e)}'
+        })
+
+
 @prompts.get('/<prompt_id:int>')
 @auth_required
 @openapi.summary("获取提示词详情")
-@openapi.description("获取指定提示词的完整信息")
+@openapi.description("获取指定提示词的完整信息（支持 If-None-Match 协商缓存）")
 @openapi.secured("BearerAuth")
+@openapi.parameter("If-None-Match", str, "header", description="上次响应的 ETag，内容未变化时返回 304")
 @openapi.response(200, {"application/json": PromptDetailResponse}, description="查询成功")
+@openapi.response(304, description="内容未变化")
 @openapi.response(404, {"application/json": ErrorResponse}, description="不存在")
 async def get_prompt_detail(request, prompt_id):
     """获取提示词详情"""
     try:
         user_id = request.ctx.user_id
         
+        prompt_service = PromptService(request.app.ctx.db, request.app.ctx.counters)
+        
+        # 协商缓存：内容未变化时直接返回304（仍计一次查看）
+        etag = await prompt_service.get_prompt_etag(user_id, prompt_id)
+        if etag_matches(request, etag):
+            await prompt_service.increase_view_count(prompt_id)
+            return not_modified(request, etag, CACHE_REVALIDATE)
+        
         # 查询详情
-        prompt_service = PromptService(request.app.ctx.db)
         prompt = await prompt_service.get_prompt_detail(user_id, prompt_id)
         
         if not prompt:
@@ -166,7 +237,7 @@ async def get_prompt_detail(request, prompt_id):
         return json({
             'code': 200,
             'data': prompt
-        })
+        }, headers=cache_headers(etag, CACHE_REVALIDATE))
         
     except Exception as e:
         logger.error(f'❌ 查询提示词详情失败: {e}')
@@ -297,7 +368,7 @@ async def record_use(request, prompt_id):
         user_id = request.ctx.user_id
         
         # 增加使用次数
-        prompt_service = PromptService(request.app.ctx.db)
+        prompt_service = PromptService(request.app.ctx.db, request.app.ctx.counters)
         success = await prompt_service.increase_use_count(user_id, prompt_id)
         
         if not success:
@@ -2,10 +2,18 @@
 """
 全局AI设置服务
 管理员配置，所有用户共享
+读取走进程内只读快照，保存/重置时按 SETTINGS_CACHE_TAG 失效（其他进程经缓存失效通知刷新）
 """
 import json
 from sanic.log import logger
 
+from apps.utils.cache import cache, SETTINGS_CACHE_TAG
+from apps.utils.snapshot import Snapshot
+
+
+# 全局AI设置快照（进程内共享）
+settings_snapshot = Snapshot(SETTINGS_CACHE_TAG)
+
 
 class GlobalAISettingsService:
     """全局AI设置服务类"""
@@ -15,11 +23,20 @@ class GlobalAISettingsService:
     
     async def get_settings(self) -> dict:
         """
-        获取全局AI设置（所有用户可调用）
+        获取全局AI设置（所有用户可调用，读取进程内快照，不访问数据库）
         
         Returns:
-            dict: AI设置数据，如果不存在返回默认值
+            FrozenDict: 只读的AI设置数据（需要修改时先 dict() 复制），如果不存在返回默认值
         """
+        return await settings_snapshot.get(self._load_settings)
+    
+    async def get_settings_etag(self) -> str:
+        """当前全局AI设置快照的 ETag（内容摘要，保存/重置后随快照重新加载而变化）"""
+        await settings_snapshot.get(self._load_settings)
+        return settings_snapshot.etag
+    
+    async def _load_settings(self) -> dict:
+        """从数据库读取全局AI设置"""
         try:
             sql = "SELECT * FROM global_ai_settings LIMIT 1"
             result = await self.db.get(sql)
@@ -103,6 +120,7 @@ class GlobalAISettingsService:
                     1 if settings.get('use_slim_rules', False) else 0,
                     admin_user_id,
                 ))
+            await cache.invalidate(SETTINGS_CACHE_TAG)
             
             logger.info(f'✅ 管理员保存全局AI设置成功: admin_id={admin_user_id}')
             return True
@@ -124,6 +142,7 @@ class GlobalAISettingsService:
         try:
             sql = "DELETE FROM global_ai_settings"
             await self.db.execute(sql)
+            await cache.invalidate(SETTINGS_CACHE_TAG)
             
             logger.info(f'✅ 管理员重置全局AI设置成功: admin_id={admin_user_id}')
             return True
@@ -131,20 +150,3 @@ class GlobalAISettingsService:
         except Exception as e:
             logger.error(f'❌ 重置全局AI设置失败: {e}')
             raise
-
-
-class UserService:
-    """用户服务（用于检查管理员权限）"""
-    
-    def __init__(self, db):
-        self.db = db
-    
-    async def is_admin(self, user_id: int) -> bool:
-        """检查用户是否为管理员"""
-        try:
-            sql = f"SELECT is_admin FROM users WHERE id = {user_id}"
-            result = await self.db.get(sql)
-            return result and result.get('is_admin', 0) == 1
-        except Exception as e:
-            logger.error(f'❌ 检查管理员权限失败: {e}')
-            return False
@@ -9,8 +9,9 @@ from sanic.response import json
 from sanic_ext import openapi
 from sanic.log import logger
 
-from apps.utils.auth_middleware import auth_required
-from .services import GlobalAISettingsService, UserService
+from apps.utils.auth_middleware import admin_required, auth_required
+from apps.utils.http_cache import CACHE_REVALIDATE, cache_headers, etag_matches, make_etag, not_modified
+from .services import GlobalAISettingsService
 
 
 # 创建设置蓝图
@@ -20,32 +21,34 @@ settings = Blueprint('settings', url_prefix='/api/settings')
 @settings.get('/ai')
 @auth_required
 @openapi.summary("获取全局AI设置")
-@openapi.description("获取管理员配置的全局AI提供商设置（所有用户可用）")
+@openapi.description("获取管理员配置的全局AI提供商设置（所有用户可用，支持 If-None-Match 协商缓存）")
 @openapi.secured("BearerAuth")
+@openapi.parameter("If-None-Match", str, "header", description="上次响应的 ETag，设置未变化时返回 304")
 @openapi.response(200, {"application/json": {
     "code": int,
     "data": dict
 }})
+@openapi.response(304, description="设置未变化")
 async def get_ai_settings(request):
     """获取全局AI设置（所有用户可用）"""
     try:
-        user_id = request.ctx.user_id
+        settings_service = GlobalAISettingsService(request.app.ctx.db)
+        
+        # 协商缓存（响应中包含管理员标识，一并计入 ETag）
+        etag = make_etag(await settings_service.get_settings_etag(), request.ctx.is_admin)
+        if etag_matches(request, etag):
+            return not_modified(request, etag, CACHE_REVALIDATE)
         
         # 获取设置
-        settings_service = GlobalAISettingsService(request.app.ctx.db)
         settings_data = await settings_service.get_settings()
         
-        # 检查当前用户是否为管理员
-        user_service = UserService(request.app.ctx.db)
-        is_admin = await user_service.is_admin(user_id)
-        
-        # 添加管理员标识
-        settings_data['is_admin'] = is_admin
+        # 添加管理员标识（取自Token声明；设置为只读快照，复制后再添加）
+        settings_data = dict(settings_data, is_admin=request.ctx.is_admin)
         
         return json({
             'code': 200,
             'data': settings_data
-        })
+        }, headers=cache_headers(etag, CACHE_REVALIDATE))
         
     except Exception as e:
         logger.error(f'❌ 获取AI设置失败: {e}')
@@ -57,6 +60,7 @@ async def get_ai_settings(request):
 
 @settings.post('/ai')
 @auth_required
+@admin_required
 @openapi.summary("保存全局AI设置")
 @openapi.description("保存AI提供商配置（仅管理员可用）")
 @openapi.secured("BearerAuth")
@@ -68,16 +72,6 @@ async def save_ai_settings(request):
     try:
         user_id = request.ctx.user_id
         
-        # 检查管理员权限
-        user_service = UserService(request.app.ctx.db)
-        is_admin = await user_service.is_admin(user_id)
-        
-        if not is_admin:
-            return json({
-                'code': 403,
-                'message': '权限不足，仅管理员可修改AI设置'
-            })
-        
         data = request.json
         
         # 保存设置
@@ -99,6 +93,7 @@ async def save_ai_settings(request):
 
 @settings.delete('/ai')
 @auth_required
+@admin_required
 @openapi.summary("重置全局AI设置")
 @openapi.description("重置AI提供商配置为默认值（仅管理员可用）")
 @openapi.secured("BearerAuth")
@@ -109,16 +104,6 @@ async def reset_ai_settings(request):
     try:
         user_id = request.ctx.user_id
         
-        # 检查管理员权限
-        user_service = UserService(request.app.ctx.db)
-        is_admin = await user_service.is_admin(user_id)
-        
-        if not is_admin:
-            return json({
-                'code': 403,
-                'message': '权限不足，仅管理员可重置AI设置'
-            })
-        
         # 重置设置
         settings_service = GlobalAISettingsService(request.app.ctx.db)
         await settings_service.reset_settings(user_id)
@@ -134,3 +119,32 @@ async def reset_ai_settings(request):
             'code': 500,
             'message': f'重置失败: {str(e)}'
         })
+
+
+@settings.get('/db-metrics')
+@auth_required
+@admin_required
+@openapi.summary("获取数据库查询统计")
+@openapi.description("按路由统计的SQL次数和DB耗时 p50/p99（仅管理员可用）")
+@openapi.secured("BearerAuth")
+@openapi.response(200, {"application/json": {
+    "code": int,
+    "data": dict
+}})
+@openapi.response(403, {"application/json": {"code": int, "message": str}})
+async def get_db_metrics(request):
+    """获取数据库查询统计（仅管理员可用）"""
+    try:
+        metrics = getattr(request.app.ctx, 'db_metrics', None)
+        
+        return json({
+            'code': 200,
+            'data': metrics.route_summary() if metrics else {}
+        })
+        
+    except Exception as e:
+        logger.error(f'❌ 获取数据库查询统计失败: {e}')
+        return json({
+            'code': 500,
+            'message': f'获取失败: {str(e)}'
+        })
@@ -26,7 +26,7 @@ class TagService:
             limit: 返回数量限制,默认50个
             
         Returns:
-            list: 标签列表,按使用次数降序
+            list: 标签列表,按使用次数（使用该标签的提示词数量）降序
         """
         try:
             sql = f"""
@@ -27,6 +27,10 @@ class VersionListItem:
     author_avatar: str = openapi.String(description="作者头像")
     content_size: int = openapi.Integer(description="内容大小（字节）")
     use_count: int = openapi.Integer(description="使用次数")
+    lines_added: int = openapi.Integer(description="相对上一版本新增的行数")
+    lines_removed: int = openapi.Integer(description="相对上一版本删除的行数")
+    changed_fields: list = openapi.Array(str, description="相对上一版本改动的字段")
+    diff_summary: str = openapi.String(description="变更摘要（各字段增删行数及第一处改动）")
     create_time: str = openapi.String(description="创建时间")
 
 
@@ -37,6 +41,8 @@ class VersionListData:
     page: int = openapi.Integer(description="当前页")
     limit: int = openapi.Integer(description="每页数量")
     items: list = openapi.Array(VersionListItem, description="版本列表")
+    next_cursor: str = openapi.String(description="下一页游标(没有下一页时为null)")
+    has_more: bool = openapi.Boolean(description="是否还有下一页(游标分页)")
 
 
 @openapi.component
@@ -79,6 +85,8 @@ class VersionDetail:
     change_summary: str = openapi.String(description="变更摘要")
     change_type: str = openapi.String(description="变更类型")
     parent_version_id: int = openapi.Integer(description="父版本ID")
+    storage_format: str = openapi.String(description="存储格式: full/keyframe/delta")
+    base_version_id: int = openapi.Integer(description="增量存储的基准版本ID")
     
     # 作者
     created_by: int = openapi.Integer(description="创建者ID")
@@ -103,8 +111,10 @@ class VersionDetailResponse:
 class VersionCompareData:
     from_version: dict = openapi.Object({}, description="源版本信息")
     to_version: dict = openapi.Object({}, description="目标版本信息")
-    changes: dict = openapi.Object({}, description="变更标记")
-    diff: dict = openapi.Object({}, description="差异详情")
+    changes: dict = openapi.Object({}, description="变更标记（含 changed_fields 改动的字段列表）")
+    granularity: str = openapi.String(description="差异粒度 line/word/char")
+    diff: dict = openapi.Object({}, description="各改动字段的差异 {字段: {hunks: [{from_line, to_line, ops: [[=/-/+, 文本]]}], stats}}")
+    stats: dict = openapi.Object({}, description="汇总统计 lines_added/lines_removed/chars_added/chars_removed")
 
 
 @openapi.component
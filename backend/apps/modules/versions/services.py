@@ -6,18 +6,28 @@ import json
 import datetime
 from sanic.log import logger
 
+from apps.utils.blob_store import blob_store
+from apps.utils.cache import cache, prompt_cache_tag
+from apps.utils.http_cache import make_etag
+from apps.utils.pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_condition, next_cursor
+from apps.utils.tag_utils import join_tags, split_tags, sync_prompt_tags
+from apps.utils.text_diff import change_stats, diff_fields, field_text
+from apps.utils.version_store import CONTENT_FIELDS, DIFF_FIELDS, version_store
+
 
 class VersionService:
     """版本管理服务类"""
     
-    def __init__(self, db):
+    def __init__(self, db, diff_engine=None):
         """
         初始化版本服务
         
         Args:
             db: 数据库连接对象(ezmysql ConnectionAsync)
+            diff_engine: 差异计算（DiffEngine，app.ctx.diff_engine），为空时在当前协程中直接计算
         """
         self.db = db
+        self.diff_engine = diff_engine
     
     # ============ 辅助方法 ============
     
@@ -95,56 +105,61 @@ class VersionService:
             
             if not current_prompt:
                 raise ValueError('提示词不存在或无权限')
+            await blob_store.materialize(self.db, current_prompt)
             
             # 2. 生成新版本号
             change_type = data.get('change_type', 'patch')
             current_version = current_prompt.get('current_version', '1.0.0')
             new_version = self.generate_next_version(current_version, change_type)
             
-            # 3. 准备版本数据（完整快照）
-            version_data = {
-                'prompt_id': prompt_id,
-                'version_number': new_version,
-                'version_type': 'manual',
-                'version_tag': data.get('version_tag', None),
+            # 3. 准备版本数据（大文本字段按 VERSION_STORAGE 保存为关键帧/增量，见 apps.utils.version_store）
+            content = {field: current_prompt.get(field, '') for field in CONTENT_FIELDS}
+            
+            async with self.db.transaction():
+                storage_columns, depth = await version_store.encode(self.db, prompt_id, content)
                 
-                # 内容快照
-                'title': current_prompt['title'],
-                'description': current_prompt.get('description', ''),
-                'requirement_report': current_prompt.get('requirement_report', ''),
-                'thinking_points': current_prompt.get('thinking_points', ''),
-                'initial_prompt': current_prompt.get('initial_prompt', ''),
-                'advice': current_prompt.get('advice', ''),
-                'final_prompt': current_prompt.get('final_prompt', ''),
-                'language': current_prompt.get('language', 'zh'),
-                'format': current_prompt.get('format', 'markdown'),
-                'tags': current_prompt.get('tags', ''),
+                # 相对上一版本的变更统计（上一版本内容通常已在缓存中）
+                parent_id = storage_columns['parent_version_id']
+                parent = await version_store.load_snapshot(self.db, prompt_id, parent_id) if parent_id else None
+                snapshot = dict(content, title=current_prompt['title'], tags=current_prompt.get('tags'))
                 
-                # 用户提示词上下文（保存完整上下文）
-                'system_prompt': current_prompt.get('system_prompt', ''),
-                'conversation_history': current_prompt.get('conversation_history', ''),
+                version_data = {
+                    'prompt_id': prompt_id,
+                    'version_number': new_version,
+                    'version_type': 'manual',
+                    'version_tag': data.get('version_tag', None),
+                    
+                    # 内容快照
+                    'title': current_prompt['title'],
+                    'language': current_prompt.get('language', 'zh'),
+                    'format': current_prompt.get('format', 'markdown'),
+                    'tags': current_prompt.get('tags', ''),
+                    **storage_columns,
+                    
+                    # 元数据
+                    'change_log': data.get('change_log', ''),
+                    'change_summary': data.get('change_summary', '版本更新'),
+                    'change_type': change_type,
+                    'created_by': user_id,
+                    'content_size': len(current_prompt.get('final_prompt', '')),
+                    **change_stats(parent, snapshot, DIFF_FIELDS)
+                }
                 
-                # 元数据
-                'change_log': data.get('change_log', ''),
-                'change_summary': data.get('change_summary', '版本更新'),
-                'change_type': change_type,
-                'created_by': user_id,
-                'content_size': len(current_prompt.get('final_prompt', ''))
-            }
-            
-            # 4. 插入版本表
-            version_id = await self.db.table_insert('prompt_versions', version_data)
-            
-            # 5. 更新主表版本信息
-            current_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            update_sql = (
-                "UPDATE prompts " 
-                "SET current_version = '" + new_version + "', "
-                "total_versions = total_versions + 1, "
-                "last_version_time = '" + current_time + "' "
-                "WHERE id = " + str(prompt_id)
-            )
-            await self.db.execute(update_sql)
+                # 4. 插入版本表（关键帧引用的外置内容与版本行在同一事务中写入）
+                version_id = await self.db.table_insert('prompt_versions', version_data)
+                
+                # 5. 更新主表版本信息
+                current_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                update_sql = (
+                    "UPDATE prompts " 
+                    "SET current_version = '" + new_version + "', "
+                    "total_versions = total_versions + 1, "
+                    "last_version_time = '" + current_time + "' "
+                    "WHERE id = " + str(prompt_id)
+                )
+                await self.db.execute(update_sql)
+            version_store.remember(version_id, content, depth)
+            await cache.invalidate(prompt_cache_tag(prompt_id))
             
             logger.info(f'✅ 版本创建成功: prompt_id={prompt_id}, version={new_version}')
             
@@ -159,7 +174,8 @@ class VersionService:
             raise
     
     async def get_version_history(self, prompt_id: int, user_id: int, 
-                                  page=1, limit=20, version_tag=None):
+                                  page=1, limit=20, version_tag=None,
+                                  cursor=None, with_total=True):
         """
         获取版本历史列表
         
@@ -169,9 +185,14 @@ class VersionService:
             page: 页码
             limit: 每页数量
             version_tag: 版本标签筛选（可选）
+            cursor: 游标分页（None为页码分页，空字符串表示第一页）
+            with_total: 游标分页时是否计算总数
         
         Returns:
-            dict: {total, page, limit, items}
+            dict: {total, page, limit, items, next_cursor}；游标分页时为 {limit, items, next_cursor, has_more[, total]}
+        
+        Raises:
+            InvalidCursor: 游标无效
         """
         try:
             # 1. 验证权限
@@ -195,50 +216,116 @@ class VersionService:
             # 3. 计算偏移量
             offset = (page - 1) * limit if page > 0 else 0
             
-            # 4. 查询总数
-            count_sql = f"""
-                SELECT COUNT(*) as total 
-                FROM prompt_versions v
-                WHERE {where_clause}
-            """
-            count_result = await self.db.get(count_sql)
-            total = count_result['total'] if count_result else 0
+            # 4. 查询总数（游标分页默认不计算）
+            total = None
+            if cursor is None or with_total:
+                count_sql = f"""
+                    SELECT COUNT(*) as total 
+                    FROM prompt_versions v
+                    WHERE {where_clause}
+                """
+                count_result = await self.db.get(count_sql)
+                total = count_result['total'] if count_result else 0
+            
+            # 5. 查询版本列表（包含作者信息），按 (create_time, id) 降序
+            params = []
+            if cursor is None:
+                pagination = f"LIMIT {limit} OFFSET {offset}"
+            else:
+                if cursor:
+                    value, last_id = decode_cursor(cursor, 'create_time')
+                    condition, params = keyset_condition('v.create_time', 'v.id', value, last_id)
+                    where_clause += " AND " + condition
+                # 多取一行判断是否还有下一页
+                pagination = f"LIMIT {limit + 1}"
             
-            # 5. 查询版本列表（包含作者信息）
             list_sql = f"""
                 SELECT 
                     v.id, v.version_number, v.version_tag, v.version_type,
                     v.change_summary, v.content_size, v.use_count,
+                    v.lines_added, v.lines_removed, v.changed_fields, v.diff_summary,
                     v.created_by, v.create_time,
                     u.name as author_name,
                     u.avatar as author_avatar
                 FROM prompt_versions v
                 LEFT JOIN users u ON v.created_by = u.id
                 WHERE {where_clause}
-                ORDER BY v.create_time DESC
-                LIMIT {limit} OFFSET {offset}
+                ORDER BY v.create_time DESC, v.id DESC
+                {pagination}
             """
             
-            items = await self.db.query(list_sql)
+            items = await self.db.query(list_sql, params)
+            
+            if cursor is None:
+                cursor_value = None
+                if items and offset + len(items) < total:
+                    cursor_value = encode_cursor('create_time', items[-1]['create_time'], items[-1]['id'])
+            else:
+                items, cursor_value = next_cursor(items, limit, 'create_time', 'create_time')
             
-            # 6. 格式化时间
+            # 6. 格式化时间、变更字段
             for item in items:
                 item['create_time'] = str(item['create_time']) if item.get('create_time') else ''
+                item['changed_fields'] = item['changed_fields'].split(',') if item.get('changed_fields') else []
                 item['author_avatar'] = item.get('author_avatar', '')
             
             logger.debug(f'✅ 查询版本列表成功: prompt_id={prompt_id}, total={total}')
             
+            if cursor is not None:
+                result = {
+                    'limit': limit,
+                    'items': items,
+                    'next_cursor': cursor_value,
+                    'has_more': cursor_value is not None
+                }
+                if total is not None:
+                    result['total'] = total
+                return result
+            
             return {
                 'total': total,
                 'page': page,
                 'limit': limit,
-                'items': items
+                'items': items,
+                'next_cursor': cursor_value
             }
             
+        except InvalidCursor:
+            raise
         except Exception as e:
             logger.error(f'❌ 查询版本列表失败: {e}')
             raise
     
+    async def get_version_etag(self, prompt_id: int, user_id: int, version_id: int):
+        """
+        版本详情的 ETag（只查询标签，不读取、重建内容）
+        
+        版本内容创建后不再变化，版本ID不会复用，ID即可标识内容；
+        响应中可变的列（标签、使用/回滚计数、作者信息）一并计入
+        
+        Returns:
+            str: ETag，版本不存在或无权限返回None
+        """
+        sql = f"""
+            SELECT v.version_tag, v.use_count, v.rollback_count,
+                   u.name as author_name, u.avatar as author_avatar
+            FROM prompt_versions v
+            LEFT JOIN users u ON v.created_by = u.id
+            INNER JOIN prompts p ON v.prompt_id = p.id
+            WHERE v.id = {version_id}
+              AND v.prompt_id = {prompt_id}
+              AND p.user_id = {user_id}
+              AND v.is_deleted = 0
+        """
+        row = await self.db.get(sql)
+        if not row:
+            return None
+        return make_etag(
+            'version', version_id, row.get('version_tag') or '',
+            row.get('use_count') or 0, row.get('rollback_count') or 0,
+            row.get('author_name') or '', row.get('author_avatar') or ''
+        )
+    
     async def get_version_detail(self, prompt_id: int, user_id: int, version_id: int):
         """
         获取版本详情
@@ -269,7 +356,11 @@ class VersionService:
             if not version:
                 raise ValueError('版本不存在或无权限')
             
-            # 2. 解析JSON字段
+            # 2. 还原内容字段（关键帧/增量存储的版本需要重建）
+            version.update(await version_store.load(self.db, version))
+            version.pop('content_blob', None)
+            
+            # 3. 解析JSON字段
             if version.get('thinking_points'):
                 try:
                     version['thinking_points'] = json.loads(version['thinking_points'])
@@ -286,12 +377,10 @@ class VersionService:
             else:
                 version['advice'] = []
             
-            if version.get('tags'):
-                version['tags'] = version['tags'].split(',') if version['tags'] else []
-            else:
-                version['tags'] = []
+            version['tags'] = split_tags(version.get('tags'))
+            version['changed_fields'] = version['changed_fields'].split(',') if version.get('changed_fields') else []
             
-            # 3. 格式化时间
+            # 4. 格式化时间
             version['create_time'] = str(version['create_time']) if version.get('create_time') else ''
             version['author_avatar'] = version.get('author_avatar', '')
             
@@ -303,16 +392,48 @@ class VersionService:
             logger.error(f'❌ 获取版本详情失败: {e}')
             raise
     
+    @staticmethod
+    def _version_summary(version: dict) -> dict:
+        return {
+            'id': version['id'],
+            'version_number': version['version_number'],
+            'title': version['title'],
+            'description': version.get('description', ''),
+            'tags': version.get('tags', []),
+            'create_time': version['create_time'],
+            'author_name': version.get('author_name', '')
+        }
+    
+    async def get_current_draft(self, prompt_id: int, user_id: int):
+        """
+        获取提示词当前内容（尚未保存为版本的草稿），字段格式与版本详情一致
+        """
+        sql = f"SELECT * FROM prompts WHERE id = {prompt_id} AND user_id = {user_id}"
+        prompt = await self.db.get(sql)
+        if not prompt:
+            raise ValueError('提示词不存在或无权限')
+        await blob_store.materialize(self.db, prompt)
+        for field in ('thinking_points', 'advice'):
+            try:
+                prompt[field] = json.loads(prompt[field]) if prompt.get(field) else []
+            except ValueError:
+                prompt[field] = []
+        prompt['tags'] = split_tags(prompt.get('tags'))
+        return prompt
+    
     async def compare_versions(self, prompt_id: int, user_id: int, 
-                              from_version_id: int, to_version_id: int):
+                              from_version_id: int, to_version_id=None,
+                              granularity: str = 'line', context: int = 3):
         """
-        对比两个版本
+        对比两个版本（服务端计算差异，只返回改动的 hunk 与统计）
         
         Args:
             prompt_id: 提示词ID
             user_id: 用户ID
             from_version_id: 源版本ID
-            to_version_id: 目标版本ID
+            to_version_id: 目标版本ID，None 表示与当前草稿对比
+            granularity: 差异粒度 line/word/char
+            context: 每个 hunk 的上下文行数
         
         Returns:
             dict: 对比结果
@@ -320,49 +441,49 @@ class VersionService:
         try:
             # 1. 获取两个版本
             from_version = await self.get_version_detail(prompt_id, user_id, from_version_id)
-            to_version = await self.get_version_detail(prompt_id, user_id, to_version_id)
+            if to_version_id is None:
+                draft = await self.get_current_draft(prompt_id, user_id)
+                to_version = dict(draft, id=None, version_number=draft.get('current_version'),
+                                  create_time=str(draft['update_time']) if draft.get('update_time') else '')
+            else:
+                to_version = await self.get_version_detail(prompt_id, user_id, to_version_id)
             
-            # 2. 计算变更标记
+            # 2. 计算各字段差异（版本内容不可变，版本对的结果可缓存；草稿不缓存）
+            pairs = {
+                field: (field_text(field, from_version.get(field)), field_text(field, to_version.get(field)))
+                for field in DIFF_FIELDS
+            }
+            cache_key = None if to_version_id is None else (from_version_id, to_version_id)
+            if self.diff_engine:
+                diff = await self.diff_engine.diff(pairs, granularity, context, cache_key=cache_key)
+            else:
+                diff = diff_fields(pairs, granularity, context)
+            
+            # 3. 变更标记与汇总统计
             changes = {
-                'title_changed': from_version['title'] != to_version['title'],
-                'description_changed': from_version.get('description', '') != to_version.get('description', ''),
-                'final_prompt_changed': from_version.get('final_prompt', '') != to_version.get('final_prompt', ''),
-                'tags_changed': from_version.get('tags', '') != to_version.get('tags', '')
+                'title_changed': 'title' in diff,
+                'description_changed': 'description' in diff,
+                'final_prompt_changed': 'final_prompt' in diff,
+                'tags_changed': 'tags' in diff,
+                'changed_fields': list(diff)
             }
+            stats = {key: sum(item['stats'][key] for item in diff.values())
+                     for key in ('lines_added', 'lines_removed', 'chars_added', 'chars_removed')}
+            
+            to_summary = self._version_summary(to_version)
+            if to_version_id is None:
+                to_summary['is_draft'] = True
             
-            # 3. 构建对比结果
             result = {
-                'from_version': {
-                    'id': from_version['id'],
-                    'version_number': from_version['version_number'],
-                    'title': from_version['title'],
-                    'description': from_version.get('description', ''),
-                    'final_prompt': from_version.get('final_prompt', ''),
-                    'tags': from_version.get('tags', []),
-                    'create_time': from_version['create_time'],
-                    'author_name': from_version.get('author_name', '')
-                },
-                'to_version': {
-                    'id': to_version['id'],
-                    'version_number': to_version['version_number'],
-                    'title': to_version['title'],
-                    'description': to_version.get('description', ''),
-                    'final_prompt': to_version.get('final_prompt', ''),
-                    'tags': to_version.get('tags', []),
-                    'create_time': to_version['create_time'],
-                    'author_name': to_version.get('author_name', '')
-                },
+                'from_version': self._version_summary(from_version),
+                'to_version': to_summary,
                 'changes': changes,
-                'diff': {
-                    # 简化的diff，前端可以使用更复杂的diff算法
-                    'final_prompt': {
-                        'from': from_version.get('final_prompt', ''),
-                        'to': to_version.get('final_prompt', '')
-                    }
-                }
+                'granularity': granularity,
+                'diff': diff,
+                'stats': stats
             }
             
-            logger.debug(f'✅ 版本对比成功: from={from_version_id}, to={to_version_id}')
+            logger.debug(f'✅ 版本对比成功: from={from_version_id}, to={to_version_id or "draft"}')
             
             return result
             
@@ -417,9 +538,7 @@ class VersionService:
                 return s
             
             # 处理tags字段（可能是列表，需要转换为逗号分隔的字符串）
-            tags_value = target_version.get("tags", "")
-            if isinstance(tags_value, list):
-                tags_value = ','.join(tags_value)
+            tags_value = join_tags(target_version.get("tags"))
             
             # 处理thinking_points和advice字段（可能是列表，需要转换为JSON字符串）
             thinking_points_value = target_version.get("thinking_points", "")
@@ -430,23 +549,36 @@ class VersionService:
             if isinstance(advice_value, list):
                 advice_value = json.dumps(advice_value, ensure_ascii=False)
             
-            update_sql = f"""
-                UPDATE prompts SET
-                    title = '{escape_sql_string(target_version["title"])}',
-                    description = '{escape_sql_string(target_version.get("description", ""))}',
-                    requirement_report = '{escape_sql_string(target_version.get("requirement_report", ""))}',
-                    thinking_points = '{escape_sql_string(thinking_points_value)}',
-                    initial_prompt = '{escape_sql_string(target_version.get("initial_prompt", ""))}',
-                    advice = '{escape_sql_string(advice_value)}',
-                    final_prompt = '{escape_sql_string(target_version.get("final_prompt", ""))}',
-                    language = '{escape_sql_string(target_version.get("language", "zh"))}',
-                    format = '{escape_sql_string(target_version.get("format", "markdown"))}',
-                    tags = '{escape_sql_string(tags_value)}',
-                    system_prompt = '{escape_sql_string(target_version.get("system_prompt", ""))}',
-                    conversation_history = '{escape_sql_string(target_version.get("conversation_history", ""))}'
-                WHERE id = {prompt_id}
-            """
-            await self.db.execute(update_sql)
+            blob_values = {
+                'requirement_report': target_version.get("requirement_report", ""),
+                'thinking_points': thinking_points_value,
+                'initial_prompt': target_version.get("initial_prompt", ""),
+                'advice': advice_value,
+            }
+            
+            async with self.db.transaction():
+                # 大字段按需外置存储，释放被替换内容的引用
+                content_refs = await blob_store.replace(self.db, blob_values, current_prompt.get('content_refs'))
+                content_refs_sql = f"'{content_refs}'" if content_refs else 'NULL'
+                update_sql = f"""
+                    UPDATE prompts SET
+                        title = '{escape_sql_string(target_version["title"])}',
+                        description = '{escape_sql_string(target_version.get("description", ""))}',
+                        requirement_report = '{escape_sql_string(blob_values["requirement_report"])}',
+                        thinking_points = '{escape_sql_string(blob_values["thinking_points"])}',
+                        initial_prompt = '{escape_sql_string(blob_values["initial_prompt"])}',
+                        advice = '{escape_sql_string(blob_values["advice"])}',
+                        content_refs = {content_refs_sql},
+                        final_prompt = '{escape_sql_string(target_version.get("final_prompt", ""))}',
+                        language = '{escape_sql_string(target_version.get("language", "zh"))}',
+                        format = '{escape_sql_string(target_version.get("format", "markdown"))}',
+                        tags = '{escape_sql_string(tags_value)}',
+                        system_prompt = '{escape_sql_string(target_version.get("system_prompt", ""))}',
+                        conversation_history = '{escape_sql_string(target_version.get("conversation_history", ""))}'
+                    WHERE id = {prompt_id}
+                """
+                await self.db.execute(update_sql)
+                await sync_prompt_tags(self.db, user_id, prompt_id, tags_value)
             
             # 5. 直接更新主表版本号为目标版本（不创建新版本）
             target_version_num = target_version['version_number']
@@ -466,6 +598,7 @@ class VersionService:
                 WHERE id = {version_id}
             """
             await self.db.execute(update_stats_sql)
+            await cache.invalidate(prompt_cache_tag(prompt_id))
             
             logger.info(f'✅ 回滚成功: prompt_id={prompt_id}, to_version={target_version_num}')
             
@@ -575,6 +708,7 @@ class VersionService:
                 WHERE id = {prompt_id}
             """
             await self.db.execute(update_count_sql)
+            await cache.invalidate(prompt_cache_tag(prompt_id))
             
             logger.info(f'✅ 删除版本成功: version_id={version_id}')
             
@@ -8,6 +8,9 @@ from sanic_ext import openapi
 from sanic.log import logger
 
 from apps.utils.auth_middleware import auth_required
+from apps.utils.http_cache import CACHE_REVALIDATE, cache_headers, etag_matches, not_modified
+from apps.utils.pagination import InvalidCursor
+from apps.utils.text_diff import GRANULARITIES
 from .services import VersionService
 from .models import *
 
@@ -81,6 +84,8 @@ async def create_version(request, prompt_id):
 @openapi.parameter("page", int, "query", description="页码", required=False)
 @openapi.parameter("limit", int, "query", description="每页数量", required=False)
 @openapi.parameter("tag", str, "query", description="版本标签筛选", required=False)
+@openapi.parameter("cursor", str, "query", description="游标分页: 传空值取第一页, 之后传上一页返回的next_cursor", required=False)
+@openapi.parameter("with_total", str, "query", description="游标分页时是否返回总数 1/0(默认0)", required=False)
 @openapi.response(200, {"application/json": VersionListResponse}, description="查询成功")
 async def get_version_list(request, prompt_id):
     """获取版本列表"""
@@ -92,6 +97,11 @@ async def get_version_list(request, prompt_id):
         limit = int(request.args.get('limit', 20))
         version_tag = request.args.get('tag', None)
         
+        # 游标分页（cursor= 空值也视为启用，表示第一页）
+        args = request.get_args(keep_blank_values=True)
+        cursor = args.get('cursor') if 'cursor' in args else None
+        with_total = request.args.get('with_total', '0') == '1'
+        
         # 参数校验
         if page < 1:
             page = 1
@@ -101,7 +111,8 @@ async def get_version_list(request, prompt_id):
         # 查询列表
         version_service = VersionService(request.app.ctx.db)
         result = await version_service.get_version_history(
-            prompt_id, user_id, page, limit, version_tag
+            prompt_id, user_id, page, limit, version_tag,
+            cursor=cursor, with_total=with_total
         )
         
         return json({
@@ -109,6 +120,11 @@ async def get_version_list(request, prompt_id):
             'data': result
         })
         
+    except InvalidCursor as e:
+        return json({
+            'code': 400,
+            'message': str(e)
+        })
     except ValueError as e:
         return json({
             'code': 404,
@@ -125,23 +141,31 @@ async def get_version_list(request, prompt_id):
 @versions.get('/<prompt_id:int>/versions/<version_id:int>')
 @auth_required
 @openapi.summary("获取版本详情")
-@openapi.description("获取指定版本的完整信息")
+@openapi.description("获取指定版本的完整信息（支持 If-None-Match 协商缓存）")
 @openapi.secured("BearerAuth")
+@openapi.parameter("If-None-Match", str, "header", description="上次响应的 ETag，未变化时返回 304")
 @openapi.response(200, {"application/json": VersionDetailResponse}, description="查询成功")
+@openapi.response(304, description="未变化")
 @openapi.response(404, {"application/json": ErrorResponse}, description="版本不存在")
 async def get_version_detail(request, prompt_id, version_id):
     """获取版本详情"""
     try:
         user_id = request.ctx.user_id
         
-        # 查询详情
         version_service = VersionService(request.app.ctx.db)
+        
+        # 协商缓存：先只查询 ETag，命中时不重建版本内容
+        etag = await version_service.get_version_etag(prompt_id, user_id, version_id)
+        if etag_matches(request, etag):
+            return not_modified(request, etag, CACHE_REVALIDATE)
+        
+        # 查询详情
         version = await version_service.get_version_detail(prompt_id, user_id, version_id)
         
         return json({
             'code': 200,
             'data': version
-        })
+        }, headers=cache_headers(etag, CACHE_REVALIDATE))
         
     except ValueError as e:
         return json({
@@ -159,10 +183,12 @@ async def get_version_detail(request, prompt_id, version_id):
 @versions.get('/<prompt_id:int>/versions/compare')
 @auth_required
 @openapi.summary("版本对比")
-@openapi.description("对比两个版本的差异")
+@openapi.description("对比两个版本的差异（服务端计算，返回改动的 hunk 与增删统计）")
 @openapi.secured("BearerAuth")
 @openapi.parameter("from", int, "query", description="源版本ID", required=True)
-@openapi.parameter("to", int, "query", description="目标版本ID", required=True)
+@openapi.parameter("to", str, "query", description="目标版本ID，current 表示与当前草稿对比", required=True)
+@openapi.parameter("granularity", str, "query", description="差异粒度 line/word/char，默认 line")
+@openapi.parameter("context", int, "query", description="上下文行数，默认 3")
 @openapi.response(200, {"application/json": VersionCompareResponse}, description="对比成功")
 async def compare_versions(request, prompt_id):
     """版本对比"""
@@ -179,13 +205,28 @@ async def compare_versions(request, prompt_id):
                 'message': '缺少from或to参数'
             })
         
-        from_version_id = int(from_version_id)
-        to_version_id = int(to_version_id)
+        granularity = request.args.get('granularity', 'line')
+        if granularity not in GRANULARITIES:
+            return json({
+                'code': 400,
+                'message': 'granularity参数必须为 ' + '/'.join(GRANULARITIES)
+            })
+        
+        try:
+            from_version_id = int(from_version_id)
+            to_version_id = None if to_version_id == 'current' else int(to_version_id)
+            context = min(max(int(request.args.get('context', 3)), 0), 20)
+        except ValueError:
+            return json({
+                'code': 400,
+                'message': '参数格式错误'
+            })
         
         # 对比版本
-        version_service = VersionService(request.app.ctx.db)
+        version_service = VersionService(request.app.ctx.db, diff_engine=request.app.ctx.diff_engine)
         result = await version_service.compare_versions(
-            prompt_id, user_id, from_version_id, to_version_id
+            prompt_id, user_id, from_version_id, to_version_id,
+            granularity=granularity, context=context
         )
         
         return json({
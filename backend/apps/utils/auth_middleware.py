@@ -1,6 +1,10 @@
 """
 认证中间件
 用于保护需要登录的API接口
+
+角色和激活状态取自Token声明(见 JWTUtil.generate_token)；Token的令牌版本(tv)与用户当前的令牌版本
+(AuthService.get_token_state，缓存)比对，禁用、吊销后之前签发的Token立即失效；
+登出只吊销当前Token（按 jti，AuthService.is_token_revoked，缓存）
 """
 from functools import wraps
 from sanic.response import json
@@ -8,6 +12,32 @@ from sanic.log import logger
 from apps.utils.jwt_utils import JWTUtil
 
 
+async def _get_principal(request, user_id):
+    """当前用户的最新信息（短TTL缓存）"""
+    # 延迟导入，避免 auth 模块与中间件循环导入
+    from apps.modules.auth.services import AuthService
+    return await AuthService(request.app.ctx.db).get_principal(user_id)
+
+
+async def _is_revoked(request, payload):
+    """Token是否已被吊销（用户不存在、已禁用，禁用/吊销后令牌版本已变化，或该Token已登出）"""
+    from apps.modules.auth.services import AuthService
+    service = AuthService(request.app.ctx.db)
+    state = await service.get_token_state(payload['user_id'])
+    if not state or not state.get('is_active') or payload.get('tv', 0) != state.get('token_version', 0):
+        return True
+    return bool(payload.get('jti')) and await service.is_token_revoked(payload['jti'])
+
+
+async def _is_admin(request, payload):
+    """Token声明中的管理员标识；旧版Token没有 role 声明时查询用户（缓存）"""
+    is_admin = JWTUtil.is_admin(payload)
+    if is_admin is None:
+        principal = await _get_principal(request, payload['user_id'])
+        is_admin = bool(principal and principal.get('is_admin', 0) == 1)
+    return is_admin
+
+
 def auth_required(func):
     """
     认证装饰器
@@ -17,6 +47,7 @@ def auth_required(func):
         async def my_protected_route(request):
             user_id = request.ctx.user_id  # 从上下文获取用户ID
             open_id = request.ctx.open_id  # 从上下文获取open_id
+            is_admin = request.ctx.is_admin  # 是否管理员（Token声明）
             ...
     
     如果认证失败,返回401错误
@@ -53,11 +84,27 @@ def auth_required(func):
                 'message': 'Token无效或已过期,请重新登录'
             }, status=200)
         
+        if not payload.get('active', True):
+            logger.warning(f'❌ 未授权访问: {request.path} - 账号已被禁用')
+            return json({
+                'code': 401,
+                'message': '账号已被禁用'
+            }, status=200)
+        
+        if await _is_revoked(request, payload):
+            logger.warning(f'❌ 未授权访问: {request.path} - Token已吊销')
+            return json({
+                'code': 401,
+                'message': '登录已失效,请重新登录'
+            }, status=200)
+        
         # 4. 将用户信息添加到request上下文
         request.ctx.user_id = payload['user_id']
         request.ctx.open_id = payload['open_id']
+        request.ctx.is_admin = await _is_admin(request, payload)
+        request.ctx.token_payload = payload
         
-        logger.debug(f'✅ 认证成功: user_id={payload["user_id"]}, path={request.path}')
+        logger.debug('✅ 认证成功: user_id=%s, path=%s', payload['user_id'], request.path)
         
         # 5. 调用原函数
         return await func(request, *args, **kwargs)
@@ -88,19 +135,21 @@ def optional_auth(func):
         # 初始化用户信息为None
         request.ctx.user_id = None
         request.ctx.open_id = None
+        request.ctx.is_admin = False
         
         if auth_header and auth_header.startswith('Bearer '):
             token = auth_header.split(' ')[1]
             payload = JWTUtil.verify_token(token)
             
-            if payload:
+            if payload and payload.get('active', True) and not await _is_revoked(request, payload):
                 request.ctx.user_id = payload['user_id']
                 request.ctx.open_id = payload['open_id']
-                logger.debug(f'✅ 可选认证: 已登录用户访问 user_id={payload["user_id"]}')
+                request.ctx.is_admin = await _is_admin(request, payload)
+                logger.debug('✅ 可选认证: 已登录用户访问 user_id=%s', payload['user_id'])
             else:
-                logger.debug(f'⚠️  可选认证: Token无效,按未登录处理')
+                logger.debug('⚠️  可选认证: Token无效,按未登录处理')
         else:
-            logger.debug(f'⚠️  可选认证: 未登录用户访问 path={request.path}')
+            logger.debug('⚠️  可选认证: 未登录用户访问 path=%s', request.path)
         
         return await func(request, *args, **kwargs)
     
@@ -112,6 +161,8 @@ def admin_required(func):
     管理员权限装饰器
     
     需要先经过auth_required认证,再检查是否为管理员
+    Token声明不是管理员时直接拒绝；声明为管理员时再按最新用户信息（短TTL缓存）确认，
+    禁用账号或取消管理员后不必等Token过期
     
     使用方法:
         @auth_required
@@ -124,18 +175,21 @@ def admin_required(func):
     async def wrapper(request, *args, **kwargs):
         user_id = request.ctx.user_id
         
-        # TODO: 这里需要查询数据库判断用户是否为管理员
-        # 暂时简化实现,可以根据实际需求扩展
+        is_admin = getattr(request.ctx, 'is_admin', False)
+        if is_admin:
+            principal = await _get_principal(request, user_id)
+            is_admin = bool(
+                principal and principal.get('is_active', 0) and principal.get('is_admin', 0) == 1
+            )
         
-        # 示例: 假设user_id为1的是管理员
-        if user_id != 1:
+        if not is_admin:
             logger.warning(f'❌ 权限不足: user_id={user_id} 尝试访问管理员接口 {request.path}')
             return json({
                 'code': 403,
                 'message': '权限不足,需要管理员权限'
             }, status=200)
         
-        logger.debug(f'✅ 管理员认证成功: user_id={user_id}')
+        logger.debug('✅ 管理员认证成功: user_id=%s', user_id)
         return await func(request, *args, **kwargs)
     
     return wrapper
@@ -0,0 +1,412 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+内容寻址的大文本存储
+按内容的 SHA-256 保存，相同内容只存一份，content_blobs.ref_count 记录引用次数，归零时删除
+
+- 后端 db:  内容（zlib压缩）保存在 content_blobs.content
+- 后端 dir: 内容保存在 BLOB_DIR/<hash前2位>/<hash>，读取时通过 mmap 映射文件；
+           content_blobs 只记录引用计数
+
+引用计数：
+- 保存一律 INSERT … ON CONFLICT/ON DUPLICATE KEY UPDATE ref_count = ref_count + n，
+  与并发的 release（减计数后删除归零的记录）不会出现"先查到记录、更新时记录已被删除"
+- 一次调整中的增加和减少按 hash 顺序逐条执行，并发事务加锁顺序一致，不会死锁
+- dir 后端计数归零时不在当前事务中删除：事务提交后（db.after_commit）重新锁定记录，计数仍为 0
+  才删除记录和文件。事务回滚时记录与文件都保持原样；并发保存同一内容时 upsert 会等删除的事务结束，
+  之后发现文件不存在再重新写入
+- dir 后端启动时清理：补删计数为 0 的记录（进程在提交后、删除前退出），
+  删除没有对应记录且超过 ORPHAN_AGE 未写入的文件（写入后事务回滚留下的）
+- 文件读写、删除在线程池中执行，不阻塞事件循环
+
+使用方：
+- prompts: requirement_report / thinking_points / initial_prompt / advice 超过 BLOB_MIN_SIZE 时外置，
+  列中留空，content_refs 记录 {字段: hash}（这几个字段不参与列表和全文检索，行变小后列表查询读取的页更少）
+  final_prompt / system_prompt / conversation_history 仍保存在行内：列表预览（SUBSTR）和全文检索直接读取这几列
+- prompt_versions: 关键帧中超过 BLOB_MIN_SIZE 的字段只记录 hash（见 apps.utils.version_store）
+"""
+
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import time
+import zlib
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sanic.log import logger
+
+from config.settings import Config
+
+
+# prompts 表中外置存储的字段
+PROMPT_BLOB_FIELDS = ('requirement_report', 'thinking_points', 'initial_prompt', 'advice')
+
+# dir 后端：没有对应记录的文件超过该时间（秒）未写入才视为孤儿文件删除（避免删掉正在保存、尚未提交的内容）
+ORPHAN_AGE = 3600
+
+
+def _placeholders(count: int) -> str:
+    return ', '.join(['?'] * count)
+
+
+class BlobStore:
+    """内容寻址存储"""
+
+    def __init__(self, backend: str = 'db', directory: str = '', min_size: int = 1024, cache_size: int = 256):
+        """
+        Args:
+            backend: db / dir
+            directory: dir 后端的存储目录
+            min_size: 内容达到该长度（字符数）才外置存储，0 表示不外置
+            cache_size: 读取缓存的条目数（内容不可变，无需失效）
+        """
+        self.backend = backend
+        self.directory = directory
+        self.min_size = min_size
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def should_store(self, text: Optional[str]) -> bool:
+        """是否外置存储"""
+        return self.min_size > 0 and text is not None and len(text) >= self.min_size
+
+    @staticmethod
+    def digest(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    # ============ 缓存 ============
+
+    def _cache_get(self, digest: str) -> Optional[str]:
+        text = self._cache.get(digest)
+        if text is not None:
+            self._cache.move_to_end(digest)
+        return text
+
+    def _cache_put(self, digest: str, text: str):
+        if self.cache_size <= 0:
+            return
+        self._cache[digest] = text
+        self._cache.move_to_end(digest)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    # ============ dir 后端文件 ============
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest)
+
+    @staticmethod
+    async def _run_io(func, *args):
+        """在线程池中执行文件操作"""
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def _write_file(self, digest: str, data: bytes):
+        path = self._path(digest)
+        if os.path.exists(path):
+            # 更新修改时间，清理孤儿文件时不会删除正在保存的内容
+            os.utime(path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _ensure_file(self, digest: str, data: bytes):
+        """写文件之后、upsert 之前，并发的删除可能删掉了文件（upsert 等它提交后插入了新记录）"""
+        if not os.path.exists(self._path(digest)):
+            self._write_file(digest, data)
+
+    def _read_file(self, digest: str) -> bytes:
+        with open(self._path(digest), 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return zlib.decompress(mapped)
+
+    def _read_files(self, digests: List[str]) -> Dict[str, str]:
+        return {digest: self._read_file(digest).decode('utf-8') for digest in digests}
+
+    def _remove_file(self, digest: str):
+        try:
+            os.remove(self._path(digest))
+        except FileNotFoundError:
+            pass
+
+    # ============ 读写 ============
+
+    async def put_many(self, db, texts: Iterable[str]) -> List[str]:
+        """
+        保存内容并增加引用计数（每个元素一次引用）
+
+        Returns:
+            list: 与 texts 顺序对应的 hash
+        """
+        texts = list(texts)
+        digests = [self.digest(text) for text in texts]
+        await self._update_refs(db, dict(zip(digests, texts)), Counter(digests))
+        return digests
+
+    async def _update_refs(self, db, contents: Dict[str, str], deltas: Dict[str, int]):
+        """
+        调整引用计数：增加的 upsert（contents 提供内容），减少的更新后删除归零的记录
+
+        在同一事务内按 hash 顺序逐条处理，并发事务以相同顺序锁定记录，避免死锁
+        （多行 INSERT/UPDATE 的加锁顺序不确定，增加和减少分两条语句时两个事务会交叉等待）
+        """
+        deltas = {digest: delta for digest, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        upsert_sql = "INSERT INTO content_blobs (hash, size, ref_count, content) VALUES (?, ?, ?, ?)"
+        if db.dialect == 'mysql':
+            upsert_sql += " ON DUPLICATE KEY UPDATE ref_count = ref_count + VALUES(ref_count)"
+        else:
+            upsert_sql += " ON CONFLICT (hash) DO UPDATE SET ref_count = content_blobs.ref_count + excluded.ref_count"
+
+        async with db.transaction():
+            for digest, delta in sorted(deltas.items()):
+                if delta > 0:
+                    data = contents[digest].encode('utf-8')
+                    compressed = zlib.compress(data)
+                    if self.backend == 'dir':
+                        # 文件先于记录写入，记录存在时文件一定存在
+                        await self._run_io(self._write_file, digest, compressed)
+                    await db.execute(upsert_sql, [digest, len(data), delta, compressed if self.backend == 'db' else None])
+                    if self.backend == 'dir':
+                        await self._run_io(self._ensure_file, digest, compressed)
+                    self._cache_put(digest, contents[digest])
+                    continue
+
+                await db.execute("UPDATE content_blobs SET ref_count = ref_count + ? WHERE hash = ?", [delta, digest])
+                if self.backend == 'dir':
+                    # 文件无法随事务回滚：提交后再确认计数仍为 0 时删除
+                    await db.after_commit(lambda digest=digest: self._collect(db, digest))
+                    continue
+                await db.execute("DELETE FROM content_blobs WHERE hash = ? AND ref_count <= 0", [digest])
+                self._cache.pop(digest, None)
+
+    async def _collect(self, db, digest: str):
+        """dir：删除计数为 0 的记录及其文件（持有行锁时重新检查计数，期间并发的 upsert 等待）"""
+        lock = '' if db.dialect == 'sqlite' else ' FOR UPDATE'
+        async with db.transaction():
+            row = await db.get(f"SELECT ref_count FROM content_blobs WHERE hash = ?{lock}", [digest])
+            if row is None or row['ref_count'] > 0:
+                return
+            await db.execute("DELETE FROM content_blobs WHERE hash = ?", [digest])
+            self._cache.pop(digest, None)
+            await self._run_io(self._remove_file, digest)
+
+    async def get_many(self, db, digests: Iterable[str]) -> Dict[str, str]:
+        """读取内容 {hash: 内容}"""
+        result = {}
+        missing = []
+        for digest in set(digests):
+            text = self._cache_get(digest)
+            if text is None:
+                missing.append(digest)
+            else:
+                result[digest] = text
+        if not missing:
+            return result
+
+        if self.backend == 'dir':
+            result.update(await self._run_io(self._read_files, missing))
+        else:
+            rows = await db.query(
+                "SELECT hash, content FROM content_blobs WHERE hash IN (" + _placeholders(len(missing)) + ")",
+                missing
+            )
+            for row in rows:
+                result[row['hash']] = zlib.decompress(bytes(row['content'])).decode('utf-8')
+
+        for digest in missing:
+            if digest not in result:
+                raise ValueError(f'内容缺失: {digest}')
+            self._cache_put(digest, result[digest])
+        return result
+
+    async def release(self, db, digests: Iterable[str]):
+        """减少引用计数（每个元素一次引用），归零的内容删除"""
+        counts = Counter(digest for digest in digests if digest)
+        await self._update_refs(db, {}, {digest: -count for digest, count in counts.items()})
+
+    # ============ dir 后端清理 ============
+
+    def _old_files(self) -> List[Tuple[str, str]]:
+        """超过 ORPHAN_AGE 未写入的文件 [(文件名, 路径)]"""
+        deadline = time.time() - ORPHAN_AGE
+        result = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if os.stat(path).st_mtime < deadline:
+                        result.append((name, path))
+                except FileNotFoundError:
+                    pass
+        return result
+
+    @staticmethod
+    def _remove_if_old(path: str) -> bool:
+        """删除前再检查一次修改时间（期间可能有保存相同内容的请求更新了它）"""
+        try:
+            if os.stat(path).st_mtime >= time.time() - ORPHAN_AGE:
+                return False
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    async def sweep(self, db):
+        """dir：删除计数为 0 的记录及文件、没有对应记录的孤儿文件"""
+        if self.backend != 'dir':
+            return
+        rows = await db.query("SELECT hash FROM content_blobs WHERE ref_count <= 0")
+        for row in rows:
+            await self._collect(db, row['hash'])
+
+        files = await self._run_io(self._old_files)
+        removed = 0
+        for start in range(0, len(files), 500):
+            batch = files[start:start + 500]
+            known = await db.query(
+                "SELECT hash FROM content_blobs WHERE hash IN (" + _placeholders(len(batch)) + ")",
+                [name for name, _ in batch]
+            )
+            known = {row['hash'] for row in known}
+            for name, path in batch:
+                if name not in known and await self._run_io(self._remove_if_old, path):
+                    removed += 1
+        if rows or removed:
+            logger.info(f'✅ 内容存储清理完成: 计数为0的记录 {len(rows)} 条，孤儿文件 {removed} 个')
+
+    def init_app(self, app):
+        """dir 后端：服务启动后在后台清理（数据库初始化和迁移之后）"""
+        if self.backend != 'dir':
+            return
+
+        @app.listener('after_server_start')
+        async def sweep_blobs(app, loop):
+            async def run():
+                try:
+                    await self.sweep(app.ctx.db)
+                except Exception as e:
+                    logger.error(f'❌ 内容存储清理失败: {e!r}')
+            app.ctx.blob_sweep_task = asyncio.ensure_future(run())
+
+    # ============ 行字段外置/还原 ============
+
+    async def externalize(self, db, values: Dict[str, Optional[str]], fields: Iterable[str]) -> Dict[str, str]:
+        """
+        将 values 中较大的字段外置存储（values 中对应字段改为空字符串）
+
+        Returns:
+            dict: {字段: hash}
+        """
+        fields = [field for field in fields if self.should_store(values.get(field))]
+        if not fields:
+            return {}
+        digests = await self.put_many(db, [values[field] for field in fields])
+        for field in fields:
+            values[field] = ''
+        return dict(zip(fields, digests))
+
+    async def replace(self, db, values: Dict[str, Optional[str]], refs_json: Optional[str]) -> Optional[str]:
+        """
+        更新行中外置字段：新值按需外置，同时释放被替换字段原来的引用
+        （增加和释放在一次调整中完成，需与行更新在同一事务内调用）
+
+        Args:
+            values: 要更新的字段（会被修改：外置的字段改为空字符串）
+            refs_json: 行中现有的 content_refs
+
+        Returns:
+            str: 新的 content_refs
+        """
+        refs = parse_refs(refs_json)
+        released = [refs.pop(field) for field in list(refs) if field in values]
+        fields = [field for field in values if self.should_store(values[field])]
+        texts = [values[field] for field in fields]
+        digests = [self.digest(text) for text in texts]
+        deltas = Counter(digests)
+        deltas.subtract(released)
+        await self._update_refs(db, dict(zip(digests, texts)), deltas)
+        for field in fields:
+            values[field] = ''
+        refs.update(zip(fields, digests))
+        return dump_refs(refs)
+
+    async def materialize(self, db, row, refs_column: str = 'content_refs'):
+        """把行中外置的字段还原为内容（原地修改，并移除 content_refs 列）"""
+        refs = parse_refs(row.pop(refs_column, None))
+        if not refs:
+            return row
+        contents = await self.get_many(db, refs.values())
+        for field, digest in refs.items():
+            row[field] = contents[digest]
+        return row
+
+
+def parse_refs(refs_json: Optional[str]) -> Dict[str, str]:
+    """解析 content_refs"""
+    if not refs_json:
+        return {}
+    try:
+        return json.loads(refs_json)
+    except ValueError:
+        logger.warning(f'⚠️  content_refs 格式错误: {refs_json[:100]}')
+        return {}
+
+
+def dump_refs(refs: Dict[str, str]) -> Optional[str]:
+    return json.dumps(refs, separators=(',', ':')) if refs else None
+
+
+blob_store = BlobStore(
+    backend=Config.BLOB_BACKEND,
+    directory=Config.BLOB_DIR,
+    min_size=Config.BLOB_MIN_SIZE,
+    cache_size=Config.BLOB_CACHE_SIZE
+)
+
+
+# ==========================================
+# 迁移步骤
+# ==========================================
+
+async def externalize_prompt_fields(db):
+    """把已有提示词中的大字段迁移到 content_blobs（按id分批）"""
+    if blob_store.min_size <= 0:
+        return
+    # should_store 按字符数判断；MySQL 的 LENGTH 是字节数，需用 CHAR_LENGTH
+    length_func = 'CHAR_LENGTH' if db.dialect == 'mysql' else 'LENGTH'
+    length_conditions = ' OR '.join(
+        f"{length_func}({field}) >= {blob_store.min_size}" for field in PROMPT_BLOB_FIELDS
+    )
+    columns = ', '.join(PROMPT_BLOB_FIELDS)
+    last_id = 0
+    total = 0
+    while True:
+        rows = await db.query(
+            f"SELECT id, content_refs, {columns} FROM prompts WHERE id > ? AND ({length_conditions}) "
+            f"ORDER BY id LIMIT 200",
+            [last_id]
+        )
+        if not rows:
+            break
+        for row in rows:
+            values = {field: row[field] for field in PROMPT_BLOB_FIELDS if blob_store.should_store(row[field])}
+            if not values:
+                continue
+            async with db.transaction():
+                refs_json = await blob_store.replace(db, values, row['content_refs'])
+                assignments = ', '.join(f"{field} = ?" for field in values)
+                await db.execute(
+                    f"UPDATE prompts SET {assignments}, content_refs = ? WHERE id = ?",
+                    [*values.values(), refs_json, row['id']]
+                )
+            total += 1
+        last_id = rows[-1]['id']
+    logger.info(f'✅ 提示词大字段外置完成: {total} 个提示词')
@@ -0,0 +1,404 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+多级缓存（提示词详情、全局AI设置、用户提示词规则等读多写少的数据）
+
+- 本地层: 进程内 LRU，条目有较短的 TTL（CACHE_LOCAL_TTL）兜底
+- Redis层: CACHE_BACKEND=redis 时启用（redis.asyncio），多进程/多实例共享；启动时连不上 Redis 会记录错误并只用本地层
+- 失效: 按标签显式失效。每个标签有版本号，条目记录写入时各标签的版本，版本不一致即视为失效：
+  - 写路径调用 invalidate(标签)，版本号 +1（Redis 中 INCR），并通过 pub/sub 通知其他进程更新本地版本号
+  - 加载数据前先取得标签版本，加载期间发生的失效会使新写入的条目直接作废，不会缓存旧数据
+- CACHE_BACKEND=memory 使用进程内的 Redis 替身（MemoryRedis），本地开发与测试无需 Redis 服务
+
+值以JSON保存，命中时重新解析，调用方可以随意修改返回的对象
+"""
+
+import asyncio
+import datetime
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+from sanic.log import logger
+
+from apps.utils.json_utils import json_dumps, json_loads
+
+
+def _default(obj):
+    # 与各服务的时间格式化一致（str(datetime)）
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return str(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class _MemoryPipeline:
+    def __init__(self, client):
+        self._client = client
+        self._commands = []
+
+    def __getattr__(self, name):
+        def command(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+        return command
+
+    async def execute(self):
+        return [await getattr(self._client, name)(*args, **kwargs) for name, args, kwargs in self._commands]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self._commands = []
+
+
+class _MemoryPubSub:
+    def __init__(self, client):
+        self._client = client
+        self._queue = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self._client._subscribers.setdefault(channel, []).append(self._queue)
+
+    async def listen(self):
+        while True:
+            yield await self._queue.get()
+
+    async def aclose(self):
+        for queues in self._client._subscribers.values():
+            if self._queue in queues:
+                queues.remove(self._queue)
+
+
+class MemoryRedis:
+    """进程内的 Redis 替身，只实现缓存用到的命令（与 redis.asyncio 接口一致）"""
+
+    def __init__(self):
+        self._data: Dict[str, tuple] = {}
+        self._subscribers: Dict[str, list] = {}
+
+    def _alive(self, key):
+        item = self._data.get(key)
+        if item and item[1] is not None and item[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return item
+
+    async def get(self, key):
+        item = self._alive(key)
+        return item[0] if item else None
+
+    async def mget(self, keys):
+        return [await self.get(key) for key in keys]
+
+    async def set(self, key, value, ex=None):
+        self._data[key] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    async def incr(self, key):
+        item = self._alive(key)
+        value = int(item[0]) + 1 if item else 1
+        self._data[key] = (str(value), item[1] if item else None)
+        return value
+
+    async def delete(self, *keys):
+        return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+    async def expire(self, key, seconds):
+        item = self._alive(key)
+        if item:
+            self._data[key] = (item[0], time.monotonic() + seconds)
+        return bool(item)
+
+    async def zadd(self, key, mapping):
+        item = self._alive(key)
+        members = item[0] if item else {}
+        added = sum(1 for member in mapping if member not in members)
+        members.update(mapping)
+        self._data[key] = (members, item[1] if item else None)
+        return added
+
+    async def zremrangebyscore(self, key, min_score, max_score):
+        item = self._alive(key)
+        if not item:
+            return 0
+        removed = [member for member, score in item[0].items() if min_score <= score <= max_score]
+        for member in removed:
+            del item[0][member]
+        return len(removed)
+
+    async def zrange(self, key, start, end, withscores=False):
+        item = self._alive(key)
+        members = sorted(item[0].items(), key=lambda pair: pair[1]) if item else []
+        members = members[start:] if end == -1 else members[start:end + 1]
+        return members if withscores else [member for member, _ in members]
+
+    async def publish(self, channel, message):
+        queues = self._subscribers.get(channel, [])
+        for queue in queues:
+            queue.put_nowait({'type': 'message', 'channel': channel, 'data': message})
+        return len(queues)
+
+    def pipeline(self, transaction=True):
+        return _MemoryPipeline(self)
+
+    def pubsub(self):
+        return _MemoryPubSub(self)
+
+    async def aclose(self):
+        self._subscribers.clear()
+
+
+def create_redis(url: str):
+    """创建 Redis 异步客户端（redis.asyncio，需要 redis>=5.0.1）"""
+    try:
+        from redis import asyncio as redis_asyncio
+    except ImportError as e:
+        raise RuntimeError(f'CACHE_BACKEND=redis 需要 redis>=5.0.1（redis.asyncio）: {e}')
+    return redis_asyncio.from_url(url)
+
+
+class Cache:
+    """本地LRU + 可选Redis 的两级缓存，按标签版本失效"""
+
+    def __init__(self, local_size: int = 1024, local_ttl: float = 30, redis_ttl: int = 300,
+                 prefix: str = 'yprompt:cache:'):
+        """
+        Args:
+            local_size: 本地层条目数，0 表示不使用本地层
+            local_ttl: 本地层条目的最长存活时间（秒，跨进程失效消息丢失时的兜底）
+            redis_ttl: Redis层条目的过期时间（秒）
+            prefix: Redis 键前缀
+        """
+        self.local_size = local_size
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+        self.prefix = prefix
+        self.channel = prefix + 'invalidate'
+        self.redis = None
+        # {键: (过期时间, {标签: 版本}, JSON)}
+        self._local = OrderedDict()
+        # {标签: (版本, 最近更新时间)}，长时间未变化的标签定期清理（其条目必然已过期）
+        self._versions: Dict[str, tuple] = {}
+        self._listener: Optional[asyncio.Task] = None
+
+    # ============ 标签版本 ============
+
+    def _version(self, tag: str) -> int:
+        item = self._versions.get(tag)
+        return item[0] if item else 0
+
+    def _set_version(self, tag: str, version: int):
+        if version > self._version(tag):
+            self._versions[tag] = (version, time.monotonic())
+
+    def _prune_versions(self):
+        """清理超过 local_ttl 未变化的本地标签版本（更早写入的本地条目都已过期，版本归零不会误判为有效）"""
+        if len(self._versions) < 10000:
+            return
+        deadline = time.monotonic() - self.local_ttl
+        self._versions = {tag: item for tag, item in self._versions.items() if item[1] > deadline}
+
+    def tag_version(self, tag: str) -> int:
+        """本进程已知的标签版本（Redis 模式下由失效通知保持最新，不访问 Redis）"""
+        return self._version(tag)
+
+    def _tag_key(self, tag: str) -> str:
+        return f'{self.prefix}tag:{tag}'
+
+    # ============ 读写 ============
+
+    def _local_get(self, key: str):
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        expires_at, versions, data = entry
+        if expires_at <= time.monotonic() or any(self._version(tag) != v for tag, v in versions.items()):
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return data
+
+    def _local_put(self, key: str, versions: Dict[str, int], data: str):
+        if self.local_size <= 0:
+            return
+        self._local[key] = (time.monotonic() + self.local_ttl, versions, data)
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable], tags: Iterable[str] = (),
+                          ttl: Optional[int] = None, cache_none: bool = False):
+        """
+        读取缓存，未命中时调用 loader 加载并写入
+
+        Args:
+            key: 缓存键
+            loader: 无参协程函数，返回可JSON序列化的值
+            tags: 失效标签
+            ttl: Redis层过期时间（秒），默认 redis_ttl
+            cache_none: loader 返回 None 时是否缓存
+        """
+        tags = list(tags)
+        data = self._local_get(key)
+        if data is not None:
+            return json_loads(data)
+
+        versions = {tag: self._version(tag) for tag in tags}
+        if self.redis is not None:
+            try:
+                values = await self.redis.mget([self.prefix + key] + [self._tag_key(tag) for tag in tags])
+                versions = {tag: int(value or 0) for tag, value in zip(tags, values[1:])}
+                for tag, version in versions.items():
+                    self._set_version(tag, version)
+                if values[0] is not None:
+                    entry = json_loads(values[0])
+                    if entry['t'] == versions:
+                        data = json_dumps(entry['d'])
+                        self._local_put(key, versions, data)
+                        return entry['d']
+            except Exception as e:
+                logger.warning(f'⚠️  Redis缓存读取失败，直接加载: {e}')
+
+        value = await loader()
+        if value is None and not cache_none:
+            return value
+
+        data = json_dumps(value, default=_default)
+        self._local_put(key, versions, data)
+        if self.redis is not None:
+            try:
+                await self.redis.set(self.prefix + key, '{"t":' + json_dumps(versions) + ',"d":' + data + '}',
+                                     ex=ttl or self.redis_ttl)
+            except Exception as e:
+                logger.warning(f'⚠️  Redis缓存写入失败: {e}')
+        return value
+
+    async def invalidate(self, *tags: str):
+        """使带有这些标签的缓存失效（本进程立即生效，其他进程经 pub/sub 通知）"""
+        if not tags:
+            return
+        self._prune_versions()
+        if self.redis is None:
+            for tag in tags:
+                self._set_version(tag, self._version(tag) + 1)
+            return
+
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for tag in tags:
+                    pipe.incr(self._tag_key(tag))
+                versions = dict(zip(tags, await pipe.execute()))
+            for tag, version in versions.items():
+                self._set_version(tag, int(version))
+            await self.redis.publish(self.channel, json_dumps(versions))
+        except Exception as e:
+            # Redis 不可用：至少让本进程的本地层失效，Redis层条目依赖 TTL 过期
+            logger.error(f'❌ Redis缓存失效失败: {tags}: {e}')
+            for tag in tags:
+                self._set_version(tag, self._version(tag) + 1)
+
+    def clear(self):
+        """清空本地层"""
+        self._local.clear()
+
+    # ============ Redis 连接与失效通知 ============
+
+    async def _listen(self):
+        """订阅失效通知，更新本地标签版本"""
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get('type') != 'message':
+                        continue
+                    for tag, version in json_loads(message['data']).items():
+                        self._set_version(tag, int(version))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 断线期间收不到通知，清空本地层（本地条目不会比 local_ttl 更旧）
+                logger.error(f'❌ 缓存失效通知中断，1秒后重连: {e}')
+                self.clear()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    async def connect(self, backend: str, url: str = ''):
+        """
+        连接缓存后端
+
+        Args:
+            backend: local（只用本地层）/ redis / memory（进程内 Redis 替身）
+        """
+        if backend == 'redis':
+            # 客户端库缺失属于部署错误，直接中止启动
+            self.redis = create_redis(url)
+            try:
+                await self.redis.ping()
+            except Exception as e:
+                # Redis 暂时不可用：只用本地层继续运行（多进程间的失效只能依赖本地层 TTL）
+                logger.error(f'❌ Redis连接失败，缓存只使用本地层，多进程失效通知不可用: {e}')
+                await self.redis.aclose()
+                self.redis = None
+                return
+        elif backend == 'memory':
+            self.redis = MemoryRedis()
+        else:
+            return
+        self._listener = asyncio.ensure_future(self._listen())
+        logger.info(f'✅ 缓存已启用: 本地层 + {backend}')
+
+    async def close(self):
+        if self._listener:
+            self._listener.cancel()
+            self._listener = None
+        if self.redis is not None:
+            await self.redis.aclose()
+            self.redis = None
+
+    def init_app(self, app):
+        """注册到应用：启动时连接后端，停止时关闭"""
+
+        @app.listener('before_server_start')
+        async def setup_cache(app, loop):
+            self.local_size = app.config.get('CACHE_LOCAL_SIZE', self.local_size)
+            self.local_ttl = app.config.get('CACHE_LOCAL_TTL', self.local_ttl)
+            self.redis_ttl = app.config.get('CACHE_REDIS_TTL', self.redis_ttl)
+            await self.connect(app.config.get('CACHE_BACKEND', 'local'), app.config.get('REDIS_CON', ''))
+
+        @app.listener('after_server_stop')
+        async def close_cache(app, loop):
+            await self.close()
+
+
+# ==========================================
+# 缓存标签（写路径按标签失效）
+# ==========================================
+
+SETTINGS_CACHE_TAG = 'ai_settings'
+
+
+def prompt_cache_tag(prompt_id) -> str:
+    return f'prompt:{prompt_id}'
+
+
+def prompt_counter_tag(prompt_id) -> str:
+    """提示词浏览/使用次数（计数刷新只失效这一项，详情缓存不受影响）"""
+    return f'prompt_counts:{prompt_id}'
+
+
+def rules_cache_tag(user_id) -> str:
+    return f'rules:{user_id}'
+
+
+def user_cache_tag(user_id) -> str:
+    return f'user:{user_id}'
+
+
+def revoked_token_tag(jti) -> str:
+    return f'revoked_token:{jti}'
+
+
+cache = Cache()
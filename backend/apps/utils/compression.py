@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+JSON 响应压缩
+
+- 按请求的 Accept-Encoding 协商 zstd / br / gzip（zstd、br 需要安装 zstandard、brotli，未安装时跳过）
+- 只压缩 application/json 且不小于 COMPRESS_MIN_SIZE 字节的响应；已经编码过的响应（预压缩的静态文件）不处理
+- 压缩后的响应带的强 ETag 改为弱 ETag（见 apps.utils.http_cache）
+- 压缩级别按延迟取舍（zstd 3 / br 4 / gzip 5）：提示词 JSON 在这些级别上的压缩率比最高级别只差几个百分点，
+  耗时只有最高级别的 1/2（gzip）到 1/80（br）
+- 不小于 COMPRESS_EXECUTOR_THRESHOLD 字节的响应在线程池中压缩（三种算法压缩时都会释放 GIL），不阻塞事件循环
+"""
+
+import asyncio
+import gzip
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from sanic.log import logger
+
+from config.settings import Config
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli 为可选依赖
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard 为可选依赖
+    zstandard = None
+
+
+def _gzip(data: bytes, level: int) -> bytes:
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _brotli(data: bytes, level: int) -> bytes:
+    return brotli.compress(data, quality=level)
+
+
+def _zstd(data: bytes, level: int) -> bytes:
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+class ResponseCompressor:
+    """JSON 响应压缩"""
+
+    # 服务端优先顺序：{编码: (压缩函数, 级别)}
+    CODECS = {
+        'zstd': (_zstd, 3),
+        'br': (_brotli, 4),
+        'gzip': (_gzip, 5),
+    }
+    AVAILABLE = {
+        'zstd': zstandard is not None,
+        'br': brotli is not None,
+        'gzip': True,
+    }
+
+    ENABLED = Config.COMPRESS_ENABLED
+    MIN_SIZE = Config.COMPRESS_MIN_SIZE
+    EXECUTOR_THRESHOLD = Config.COMPRESS_EXECUTOR_THRESHOLD
+    WORKERS = Config.COMPRESS_WORKERS
+
+    _executor: Optional[ThreadPoolExecutor] = None
+
+    @classmethod
+    def negotiate(cls, accept_encoding: str) -> Optional[str]:
+        """
+        根据 Accept-Encoding 选择编码
+
+        Returns:
+            str: 客户端接受（q > 0）的编码中服务端最优先的一个，没有可用编码返回 None
+        """
+        accepted = {}
+        for item in accept_encoding.lower().split(','):
+            name, _, params = item.strip().partition(';')
+            q = 1.0
+            params = params.strip()
+            if params.startswith('q='):
+                try:
+                    q = float(params[2:])
+                except ValueError:
+                    q = 0.0
+            accepted[name.strip()] = q
+        wildcard = accepted.get('*', 0.0)
+        for encoding in cls.CODECS:
+            if cls.AVAILABLE[encoding] and accepted.get(encoding, wildcard) > 0:
+                return encoding
+        return None
+
+    @classmethod
+    def compress(cls, encoding: str, data: bytes) -> bytes:
+        codec, level = cls.CODECS[encoding]
+        return codec(data, level)
+
+    @classmethod
+    async def compress_async(cls, encoding: str, data: bytes) -> bytes:
+        """大响应在线程池中压缩"""
+        if cls._executor is None or len(data) < cls.EXECUTOR_THRESHOLD:
+            return cls.compress(encoding, data)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(cls._executor, cls.compress, encoding, data)
+
+    @classmethod
+    async def compress_response(cls, request, response):
+        """响应中间件：按需压缩 JSON 响应体"""
+        if response is None or 'content-encoding' in response.headers:
+            return
+        body = getattr(response, 'body', None)
+        if not body or len(body) < cls.MIN_SIZE:
+            return
+        if not (response.content_type or '').startswith('application/json'):
+            return
+
+        vary = response.headers.get('vary')
+        if not vary:
+            response.headers['vary'] = 'Accept-Encoding'
+        elif 'accept-encoding' not in vary.lower():
+            response.headers['vary'] = f'{vary}, Accept-Encoding'
+
+        encoding = cls.negotiate(request.headers.get('accept-encoding', ''))
+        if encoding is None:
+            return
+        compressed = await cls.compress_async(encoding, body)
+        if len(compressed) >= len(body):
+            return
+        response.body = compressed
+        response.headers['content-encoding'] = encoding
+        # 压缩后的字节与未压缩的表示不同，强 ETag 改为弱 ETag
+        etag = response.headers.get('etag')
+        if etag and not etag.startswith('W/'):
+            response.headers['etag'] = f'W/{etag}'
+
+    @classmethod
+    def init_app(cls, app):
+        """注册到应用：响应中间件 + 压缩线程池"""
+        if not cls.ENABLED:
+            return
+
+        @app.listener('before_server_start')
+        async def setup_compress_executor(app, loop):
+            if cls.WORKERS > 0:
+                cls._executor = ThreadPoolExecutor(max_workers=cls.WORKERS, thread_name_prefix='compress')
+            available = [encoding for encoding in cls.CODECS if cls.AVAILABLE[encoding]]
+            logger.info(f'✅ JSON响应压缩已启用: {"/".join(available)}，不小于 {cls.MIN_SIZE} 字节')
+
+        @app.listener('after_server_stop')
+        async def shutdown_compress_executor(app, loop):
+            if cls._executor is not None:
+                cls._executor.shutdown(wait=False)
+                cls._executor = None
+
+        app.register_middleware(cls.compress_response, 'response')
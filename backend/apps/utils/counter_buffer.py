@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+计数器写缓冲（write-behind）
+浏览次数、使用次数等计数先在内存中累加，定时合并为批量
+UPDATE ... SET col = col + ? 写入数据库，服务停止时再刷新一次
+
+- 每次点击不再单独提交一次事务（SQLite 上避免与其他写操作串行排队）
+- 读取时通过 merge() 把尚未落库的增量合并到查询结果中
+- 多进程部署时每个 worker 各自缓冲、各自刷新，增量语义保证结果正确
+- 进程异常退出会丢失最近一个刷新周期内的计数（计数不是关键数据）
+- 刷新后按 CACHE_TAGS 使缓存中对应行的计数失效（缓存的计数已落后，合并的增量又已清空）；
+  只失效单独缓存的计数列，详情、ETag 等缓存不受频繁点击影响
+"""
+
+import asyncio
+from typing import Dict, Iterable, Tuple
+
+from sanic.log import logger
+
+from apps.utils.cache import cache, prompt_counter_tag
+
+
+class CounterBuffer:
+    """计数器写缓冲"""
+
+    # 允许缓冲的计数列（表名、列名会拼进SQL，只能来自这里）
+    COLUMNS = {
+        'prompts': ('view_count', 'use_count'),
+    }
+
+    # 刷新后需要失效的计数缓存标签
+    CACHE_TAGS = {
+        'prompts': prompt_counter_tag,
+    }
+
+    def __init__(self, db, flush_interval: float = 5.0, max_pending: int = 1000):
+        """
+        Args:
+            db: 数据库适配器
+            flush_interval: 刷新间隔(秒)，0 表示不缓冲，每次直接更新
+            max_pending: 缓冲的行数达到该值时立即刷新
+        """
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        # {(表名, 列名): {行id: 增量}}
+        self._pending: Dict[Tuple[str, str], Dict[int, int]] = {}
+        # 正在写入数据库的增量（写入完成前读取时同样需要合并）
+        self._inflight: Dict[Tuple[str, str], Dict[int, int]] = {}
+        self._pending_rows = 0
+        self._flush_lock = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.flush_interval > 0
+
+    @staticmethod
+    def _update_sql(table: str, column: str) -> str:
+        return f"UPDATE {table} SET {column} = {column} + ? WHERE id = ?"
+
+    async def incr(self, table: str, column: str, row_id: int, delta: int = 1):
+        """累加计数"""
+        if column not in self.COLUMNS.get(table, ()):
+            raise ValueError(f'不支持缓冲的计数列: {table}.{column}')
+
+        if not self.enabled:
+            await self.db.execute(self._update_sql(table, column), [delta, row_id])
+            if table in self.CACHE_TAGS:
+                await cache.invalidate(self.CACHE_TAGS[table](row_id))
+            return
+
+        counters = self._pending.setdefault((table, column), {})
+        if row_id not in counters:
+            self._pending_rows += 1
+        counters[row_id] = counters.get(row_id, 0) + delta
+
+        if self._pending_rows >= self.max_pending:
+            await self.flush()
+
+    def pending(self, table: str, column: str, row_id: int) -> int:
+        """尚未落库的增量"""
+        key = (table, column)
+        return self._pending.get(key, {}).get(row_id, 0) + self._inflight.get(key, {}).get(row_id, 0)
+
+    def merge(self, table: str, rows: Iterable):
+        """把尚未落库的增量合并到查询结果（行需包含 id 和计数列）"""
+        if not self._pending and not self._inflight:
+            return
+        for row in rows:
+            if not row:
+                continue
+            for column in self.COLUMNS.get(table, ()):
+                if column not in row:
+                    continue
+                delta = self.pending(table, column, row['id'])
+                if delta:
+                    row[column] = (row[column] or 0) + delta
+
+    async def flush(self):
+        """把缓冲的增量批量写入数据库（每个计数列一次 execute_many）"""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            self._inflight, self._pending = self._pending, {}
+            self._pending_rows = 0
+
+            for (table, column), counters in list(self._inflight.items()):
+                # 按id排序，多个worker同时刷新时加锁顺序一致
+                params_list = [[counters[row_id], row_id] for row_id in sorted(counters)]
+                try:
+                    await self.db.execute_many(self._update_sql(table, column), params_list)
+                except Exception as e:
+                    # 写入失败的增量放回缓冲，下次刷新重试
+                    logger.error(f'❌ 计数刷新失败: {table}.{column}: {e}')
+                    pending = self._pending.setdefault((table, column), {})
+                    for row_id, delta in counters.items():
+                        if row_id not in pending:
+                            self._pending_rows += 1
+                        pending[row_id] = pending.get(row_id, 0) + delta
+                    del self._inflight[(table, column)]
+                    continue
+
+                # 增量已落库，在下一次 await 之前移出 in-flight，避免读取时重复计入
+                del self._inflight[(table, column)]
+                logger.debug(f'✅ 计数刷新: {table}.{column}, {len(params_list)} 行')
+                if table in self.CACHE_TAGS:
+                    try:
+                        await cache.invalidate(*[self.CACHE_TAGS[table](row_id) for row_id in counters])
+                    except Exception as e:
+                        logger.error(f'❌ 计数缓存失效失败: {table}.{column}: {e}')
+
+    async def run(self):
+        """定时刷新循环"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                # 服务停止时取消的是等待，进行中的刷新继续完成
+                await asyncio.shield(self.flush())
+            except Exception as e:
+                logger.error(f'❌ 计数刷新异常: {e}')
+
+    @classmethod
+    def init_app(cls, app):
+        """注册到应用：服务启动后创建并开始定时刷新，服务停止前刷新剩余计数"""
+
+        @app.listener('before_server_start')
+        async def setup_counters(app, loop):
+            # 在数据库初始化（DB.init_app 注册的监听器）之后执行
+            counters = cls(
+                app.ctx.db,
+                flush_interval=app.config.get('COUNTER_FLUSH_INTERVAL', 5),
+                max_pending=app.config.get('COUNTER_MAX_PENDING', 1000)
+            )
+            app.ctx.counters = counters
+            if counters.enabled:
+                logger.info(f'✅ 计数器写缓冲已启用: 每 {counters.flush_interval}s 刷新')
+
+        @app.listener('after_server_start')
+        async def start_counter_flush(app, loop):
+            counters = app.ctx.counters
+            if counters.enabled:
+                app.ctx.counter_task = asyncio.ensure_future(counters.run())
+
+        @app.listener('before_server_stop')
+        async def stop_counter_flush(app, loop):
+            task = getattr(app.ctx, 'counter_task', None)
+            if task:
+                task.cancel()
+            counters = getattr(app.ctx, 'counters', None)
+            if counters:
+                await counters.flush()
+                logger.info('✅ 计数器缓冲已刷新')
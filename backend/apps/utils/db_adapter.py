@@ -2,16 +2,58 @@
 # -*- coding: utf-8 -*-
 """
 数据库适配器
-支持 SQLite 和 MySQL 双数据库
+支持 SQLite、MySQL 和 PostgreSQL
 """
 
+import asyncio
+import contextlib
+import contextvars
+import sqlite3
 from abc import ABC, abstractmethod
+from functools import lru_cache
 from typing import Any, Dict, List, Optional
 from sanic.log import logger
 
+from apps.utils.db_migrations import run_migrations
+from apps.utils.fulltext import detect_fulltext
+from apps.utils.password_utils import PasswordUtil
+
+
+# 当前事务提交后要执行的回调（最外层事务进入时创建，不在事务中时为 None）
+_after_commit = contextvars.ContextVar('db_after_commit', default=None)
+
+
+def _enter_after_commit(nested: bool):
+    """
+    进入事务：最外层新建回调列表，返回用于恢复的 token；
+    嵌套层（保存点）返回当前列表长度，保存点回滚时丢弃其后登记的回调
+    """
+    if nested:
+        return len(_after_commit.get())
+    return _after_commit.set([])
+
+
+def _rollback_after_commit(mark: int):
+    """保存点回滚：丢弃保存点内登记的回调"""
+    del _after_commit.get()[mark:]
+
+
+async def _run_after_commit(callbacks):
+    """最外层事务提交后依次执行回调（事务已提交，回调失败只记录日志）"""
+    for callback in callbacks:
+        try:
+            await callback()
+        except Exception as e:
+            logger.error(f'❌ 事务提交后的回调执行失败: {e!r}')
+
 
 class DatabaseAdapter(ABC):
-    """数据库适配器基类"""
+    """
+    数据库适配器基类
+
+    SQL统一使用 ? 占位符；各子类的 dialect 属性标明方言（sqlite/mysql/postgres），
+    需要方言相关SQL（如全文检索）的地方据此分支
+    """
     
     @abstractmethod
     async def connect(self):
@@ -38,6 +80,11 @@ class DatabaseAdapter(ABC):
         """执行SQL"""
         pass
     
+    @abstractmethod
+    async def execute_many(self, sql: str, params_list: List[List]):
+        """同一SQL批量执行多组参数（在一个事务中提交）"""
+        pass
+    
     @abstractmethod
     async def table_insert(self, table: str, data: Dict) -> int:
         """插入数据"""
@@ -52,10 +99,78 @@ class DatabaseAdapter(ABC):
     def transaction(self):
         """事务"""
         pass
+    
+    @abstractmethod
+    def lock(self, name: str):
+        """跨进程的命名互斥锁（多实例/多worker之间），如迁移只允许一个进程执行"""
+        pass
+    
+    async def after_commit(self, callback):
+        """
+        在最外层事务提交后执行 callback（无参协程函数）；事务回滚时不执行
+        不在事务中时立即执行。用于数据库之外、无法随事务回滚的操作（如删除文件）
+        """
+        callbacks = _after_commit.get()
+        if callbacks is None:
+            await callback()
+        else:
+            callbacks.append(callback)
+
+
+@lru_cache(maxsize=1024)
+def convert_placeholders(sql: str, style: str = 'numeric') -> str:
+    """
+    把 ? 占位符转换为驱动使用的格式
+    跳过字符串字面量、带引号的标识符和注释中的 ?
+    
+    Args:
+        style: numeric -> $1, $2 ...（asyncpg）; format -> %s（PyMySQL）
+    """
+    if '?' not in sql:
+        return sql
+
+    result = []
+    index = 0
+    i = 0
+    length = len(sql)
+    while i < length:
+        ch = sql[i]
+        if ch in ("'", '"'):
+            # 字面量/标识符：'' 或 "" 为转义，整体原样保留
+            end = i + 1
+            while end < length:
+                if sql[end] == ch:
+                    if end + 1 < length and sql[end + 1] == ch:
+                        end += 2
+                        continue
+                    break
+                end += 1
+            result.append(sql[i:end + 1])
+            i = end + 1
+        elif ch == '-' and sql.startswith('--', i):
+            end = sql.find('\n', i)
+            end = length if end == -1 else end
+            result.append(sql[i:end])
+            i = end
+        elif ch == '?':
+            index += 1
+            result.append(f'${index}' if style == 'numeric' else '%s')
+            i += 1
+        else:
+            result.append(ch)
+            i += 1
+    return ''.join(result)
 
 
 class MySQLAdapter(DatabaseAdapter):
-    """MySQL适配器 (使用ezmysql)"""
+    """
+    MySQL适配器 (使用ezmysql)
+
+    ezmysql 每次调用从连接池取一个连接；transaction() 在当前任务内固定一个连接，
+    事务内的调用直接在该连接上执行
+    """
+    
+    dialect = 'mysql'
     
     def __init__(self, config: Dict):
         from ezmysql import ConnectionAsync
@@ -72,6 +187,7 @@ class MySQLAdapter(DatabaseAdapter):
             autocommit=True,
             charset='utf8mb4'
         )
+        self._conn = contextvars.ContextVar('mysql_transaction_conn', default=None)
         logger.info(f"✅ MySQL连接池创建成功: {config['host']}/{config['database']}")
     
     async def connect(self):
@@ -84,46 +200,185 @@ class MySQLAdapter(DatabaseAdapter):
             self.db.close()
             logger.info("✅ MySQL连接池已关闭")
     
+    @staticmethod
+    async def _run_on(conn, sql: str, params, fetch: Optional[str] = None):
+        """在指定连接上执行（事务内使用）"""
+        async with conn.cursor() as cur:
+            await cur.execute(convert_placeholders(sql, 'format'), tuple(params or ()))
+            if fetch == 'one':
+                return await cur.fetchone()
+            if fetch == 'all':
+                return await cur.fetchall()
+            return cur.lastrowid
+    
     async def get(self, sql: str, params: Optional[List] = None) -> Optional[Dict]:
         """查询单条记录"""
-        if params:
-            return await self.db.get(sql, params)
-        return await self.db.get(sql)
+        conn = self._conn.get()
+        if conn is not None:
+            return await self._run_on(conn, sql, params, 'one')
+        return await self.db.get(convert_placeholders(sql, 'format'), *(params or ()))
     
     async def query(self, sql: str, params: Optional[List] = None) -> List[Dict]:
         """查询多条记录"""
-        if params:
-            return await self.db.query(sql, params)
-        return await self.db.query(sql)
+        conn = self._conn.get()
+        if conn is not None:
+            return await self._run_on(conn, sql, params, 'all')
+        return await self.db.query(convert_placeholders(sql, 'format'), *(params or ()))
     
     async def execute(self, sql: str, params: Optional[List] = None):
-        """执行SQL"""
-        if params:
-            await self.db.execute(sql, params)
-        else:
-            await self.db.execute(sql)
+        """执行SQL（? 占位符转换为 %s，参数逐个传给 PyMySQL）"""
+        conn = self._conn.get()
+        if conn is not None:
+            return await self._run_on(conn, sql, params)
+        return await self.db.execute(convert_placeholders(sql, 'format'), *(params or ()))
+    
+    async def execute_many(self, sql: str, params_list: List[List]):
+        """批量执行（同一连接、一次提交）"""
+        if not params_list:
+            return
+        conn = self._conn.get()
+        if conn is not None:
+            async with conn.cursor() as cur:
+                await cur.executemany(convert_placeholders(sql, 'format'), params_list)
+            return
+        if not self.db.pool:
+            await self.db.init_pool()
+        async with self.db.pool.acquire() as conn:
+            await conn.begin()
+            try:
+                async with conn.cursor() as cur:
+                    await cur.executemany(convert_placeholders(sql, 'format'), params_list)
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
     
     async def table_insert(self, table: str, data: Dict) -> int:
         """插入数据"""
+        conn = self._conn.get()
+        if conn is not None:
+            columns = ', '.join(data.keys())
+            placeholders = ', '.join(['?' for _ in data])
+            sql = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
+            return await self._run_on(conn, sql, list(data.values()))
         return await self.db.table_insert(table, data)
     
     async def table_update(self, table: str, data: Dict, where: str):
         """更新数据"""
-        await self.db.table_update(table, data, where)
+        set_clause = ', '.join([f"{k} = ?" for k in data.keys()])
+        sql = f"UPDATE {table} SET {set_clause} WHERE {where}"
+        await self.execute(sql, list(data.values()))
     
     def transaction(self):
-        """事务（ezmysql支持）"""
-        return self.db.transaction()
+        """
+        事务（支持嵌套，内层为保存点）
+
+        Example:
+            async with db.transaction():
+                await db.execute(...)
+                await db.table_insert(...)
+        """
+        return _MySQLTransaction(self)
+    
+    @contextlib.asynccontextmanager
+    async def lock(self, name: str):
+        """
+        命名锁（GET_LOCK，会话级）：单独占用一个连接，不开启事务
+
+        Example:
+            async with db.lock('migrations'):
+                ...
+        """
+        if not self.db.pool:
+            await self.db.init_pool()
+        conn = await self.db.pool.acquire()
+        try:
+            while True:
+                row = await self._run_on(conn, "SELECT GET_LOCK(?, 10) AS locked", [name], 'one')
+                if row and row['locked'] == 1:
+                    break
+                logger.info(f'⏳ 等待数据库锁: {name}')
+            try:
+                yield self
+            finally:
+                await self._run_on(conn, "SELECT RELEASE_LOCK(?)", [name])
+        finally:
+            self.db.pool.release(conn)
+
+
+class _MySQLTransaction:
+    """MySQLAdapter.transaction() 返回的异步上下文管理器"""
+    
+    def __init__(self, adapter: MySQLAdapter):
+        self.adapter = adapter
+        self.conn = None
+        self.savepoint = None
+        self.token = None
+        self.callbacks = None
+    
+    async def __aenter__(self):
+        adapter = self.adapter
+        current = adapter._conn.get()
+        if current is not None:
+            # 嵌套事务使用保存点
+            self.conn = current
+            self.savepoint = f'sp_{id(self)}'
+            await adapter._run_on(current, f'SAVEPOINT {self.savepoint}', None)
+            self.callbacks = _enter_after_commit(nested=True)
+            return adapter
+        
+        if not adapter.db.pool:
+            await adapter.db.init_pool()
+        self.conn = await adapter.db.pool.acquire()
+        try:
+            await self.conn.begin()
+        except BaseException:
+            adapter.db.pool.release(self.conn)
+            raise
+        self.token = adapter._conn.set(self.conn)
+        self.callbacks = _enter_after_commit(nested=False)
+        return adapter
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        adapter = self.adapter
+        if self.savepoint:
+            if exc_type is not None:
+                _rollback_after_commit(self.callbacks)
+                await adapter._run_on(self.conn, f'ROLLBACK TO SAVEPOINT {self.savepoint}', None)
+            await adapter._run_on(self.conn, f'RELEASE SAVEPOINT {self.savepoint}', None)
+            return False
+        callbacks = _after_commit.get()
+        _after_commit.reset(self.callbacks)
+        try:
+            if exc_type is None:
+                await self.conn.commit()
+            else:
+                await self.conn.rollback()
+        finally:
+            adapter._conn.reset(self.token)
+            adapter.db.pool.release(self.conn)
+        if exc_type is None:
+            await _run_after_commit(callbacks)
+        return False
 
 
 class SQLiteAdapter(DatabaseAdapter):
-    """SQLite适配器 (使用aiosqlite)"""
+    """
+    SQLite适配器 (使用aiosqlite)
+
+    所有请求共用一个连接：写操作通过 _write_lock 串行，事务期间其他任务的写操作等待事务结束，
+    避免混入同一个事务；事务内的调用（同一任务，由contextvar识别）不逐条提交
+    """
+    
+    dialect = 'sqlite'
     
     def __init__(self, config: Dict):
         import os
         
         self.db_path = config['path']
         self.db = None
+        self._write_lock = asyncio.Lock()
+        self._tx_depth = contextvars.ContextVar('sqlite_transaction_depth', default=0)
         
         # 确保数据库目录存在
         db_dir = os.path.dirname(self.db_path)
@@ -137,8 +392,8 @@ class SQLiteAdapter(DatabaseAdapter):
         
         self.db = await aiosqlite.connect(self.db_path)
         
-        # 设置Row Factory，返回字典格式
-        self.db.row_factory = aiosqlite.Row
+        # 不使用Row Factory，直接取元组按列名组装 dict（比先构造 aiosqlite.Row 再转 dict 快约 1/3）
+        self.db.row_factory = None
         
         # 启用外键约束
         await self.db.execute('PRAGMA foreign_keys = ON')
@@ -156,22 +411,38 @@ class SQLiteAdapter(DatabaseAdapter):
         """查询单条记录"""
         async with self.db.execute(sql, params or []) as cursor:
             row = await cursor.fetchone()
-            if row:
-                # aiosqlite.Row 转为字典
-                return dict(row)
-            return None
+            if row is None:
+                return None
+            return dict(zip([d[0] for d in cursor.description], row))
     
     async def query(self, sql: str, params: Optional[List] = None) -> List[Dict]:
         """查询多条记录"""
         async with self.db.execute(sql, params or []) as cursor:
             rows = await cursor.fetchall()
-            # 转为字典列表
-            return [dict(row) for row in rows]
+            if not rows:
+                return []
+            columns = [d[0] for d in cursor.description]
+            return [dict(zip(columns, row)) for row in rows]
+    
+    async def _write(self, sql: str, params, many: bool = False):
+        """写操作：事务内直接执行（由事务统一提交），否则加写锁执行并立即提交"""
+        run = self.db.executemany if many else self.db.execute
+        if self._tx_depth.get():
+            return await run(sql, params)
+        async with self._write_lock:
+            cursor = await run(sql, params)
+            await self.db.commit()
+            return cursor
     
     async def execute(self, sql: str, params: Optional[List] = None):
         """执行SQL"""
-        await self.db.execute(sql, params or [])
-        await self.db.commit()
+        await self._write(sql, params or [])
+    
+    async def execute_many(self, sql: str, params_list: List[List]):
+        """批量执行（一次提交，只有一次fsync）"""
+        if not params_list:
+            return
+        await self._write(sql, params_list, many=True)
     
     async def table_insert(self, table: str, data: Dict) -> int:
         """插入数据"""
@@ -179,8 +450,7 @@ class SQLiteAdapter(DatabaseAdapter):
         placeholders = ', '.join(['?' for _ in data])
         sql = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
         
-        cursor = await self.db.execute(sql, list(data.values()))
-        await self.db.commit()
+        cursor = await self._write(sql, list(data.values()))
         return cursor.lastrowid
     
     async def table_update(self, table: str, data: Dict, where: str):
@@ -188,13 +458,273 @@ class SQLiteAdapter(DatabaseAdapter):
         set_clause = ', '.join([f"{k} = ?" for k in data.keys()])
         sql = f"UPDATE {table} SET {set_clause} WHERE {where}"
         
-        await self.db.execute(sql, list(data.values()))
-        await self.db.commit()
+        await self._write(sql, list(data.values()))
     
     def transaction(self):
-        """事务（SQLite自动提交模式下使用begin/commit）"""
-        # 返回数据库连接对象，可以使用 async with db.transaction() 控制事务
-        return self.db
+        """
+        事务（支持嵌套，内层为保存点）
+
+        Example:
+            async with db.transaction():
+                await db.execute(...)
+                await db.table_insert(...)
+        """
+        return _SQLiteTransaction(self)
+    
+    def lock(self, name: str):
+        """
+        命名锁：SQLite 没有命名锁，以 BEGIN IMMEDIATE 事务占住数据库写锁（name 仅为接口一致）
+        块内的操作都在该事务中，正常结束时提交、异常时回滚；不能在事务中调用
+        """
+        return _SQLiteTransaction(self, immediate=True)
+    
+    async def _begin_immediate(self):
+        """BEGIN IMMEDIATE，其他进程持有写锁时（超过 busy timeout 报 locked）持续重试"""
+        while True:
+            try:
+                await self.db.execute('BEGIN IMMEDIATE')
+                return
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+                logger.info('⏳ 数据库被其他进程锁定，等待写锁')
+                await asyncio.sleep(1)
+
+
+class _SQLiteTransaction:
+    """SQLiteAdapter.transaction() / lock() 返回的异步上下文管理器"""
+    
+    def __init__(self, adapter: SQLiteAdapter, immediate: bool = False):
+        self.adapter = adapter
+        self.immediate = immediate
+        self.depth = 0
+        self.token = None
+        self.callbacks = None
+    
+    async def __aenter__(self):
+        adapter = self.adapter
+        self.depth = adapter._tx_depth.get()
+        if self.depth == 0:
+            await adapter._write_lock.acquire()
+            try:
+                if self.immediate:
+                    await adapter._begin_immediate()
+                else:
+                    await adapter.db.execute('BEGIN')
+            except BaseException:
+                adapter._write_lock.release()
+                raise
+        else:
+            await adapter.db.execute(f'SAVEPOINT sp_{self.depth}')
+        self.token = adapter._tx_depth.set(self.depth + 1)
+        self.callbacks = _enter_after_commit(nested=self.depth > 0)
+        return adapter
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        adapter = self.adapter
+        adapter._tx_depth.reset(self.token)
+        if self.depth > 0:
+            if exc_type is not None:
+                _rollback_after_commit(self.callbacks)
+                await adapter.db.execute(f'ROLLBACK TO sp_{self.depth}')
+            await adapter.db.execute(f'RELEASE sp_{self.depth}')
+            return False
+        callbacks = _after_commit.get()
+        _after_commit.reset(self.callbacks)
+        try:
+            if exc_type is None:
+                await adapter.db.commit()
+            else:
+                await adapter.db.rollback()
+        finally:
+            adapter._write_lock.release()
+        if exc_type is None:
+            await _run_after_commit(callbacks)
+        return False
+
+
+class PostgresAdapter(DatabaseAdapter):
+    """
+    PostgreSQL适配器 (使用asyncpg连接池)
+
+    - ? 占位符自动转换为 $n
+    - 时间字段以文本收发，与 SQLite/MySQL 一样使用 'YYYY-MM-DD HH:MM:SS' 字符串
+    - table_insert 通过 RETURNING id 取得自增ID
+    - transaction() 在当前任务内固定一个连接，事务内的所有调用走同一连接
+    """
+    
+    dialect = 'postgres'
+    
+    def __init__(self, config: Dict):
+        self.config = config
+        self.pool = None
+        self._conn = contextvars.ContextVar('pg_transaction_conn', default=None)
+    
+    @staticmethod
+    async def _init_connection(conn):
+        """新连接初始化：时间类型以文本格式收发"""
+        for type_name in ('timestamp', 'timestamptz', 'date'):
+            await conn.set_type_codec(
+                type_name, schema='pg_catalog',
+                encoder=str, decoder=str, format='text'
+            )
+    
+    async def connect(self):
+        """创建连接池"""
+        import asyncpg
+        
+        config = self.config
+        pool_args = {
+            'min_size': config.get('minsize', 2),
+            'max_size': config.get('maxsize', 10),
+            'max_inactive_connection_lifetime': config.get('pool_recycle', 3600),
+            'init': self._init_connection,
+        }
+        if config.get('dsn'):
+            self.pool = await asyncpg.create_pool(dsn=config['dsn'], **pool_args)
+            target = config['dsn'].rsplit('@', 1)[-1]
+        else:
+            self.pool = await asyncpg.create_pool(
+                host=config['host'],
+                port=config.get('port', 5432),
+                user=config['user'],
+                password=config['password'],
+                database=config['database'],
+                **pool_args
+            )
+            target = f"{config['host']}/{config['database']}"
+        logger.info(f"✅ PostgreSQL连接池创建成功: {target}")
+    
+    async def close(self):
+        """关闭连接池"""
+        if self.pool:
+            await self.pool.close()
+            self.pool = None
+            logger.info("✅ PostgreSQL连接池已关闭")
+    
+    def _executor(self):
+        """事务内使用固定连接，否则直接使用连接池"""
+        return self._conn.get() or self.pool
+    
+    async def get(self, sql: str, params: Optional[List] = None) -> Optional[Dict]:
+        """查询单条记录"""
+        row = await self._executor().fetchrow(convert_placeholders(sql), *(params or ()))
+        if row is None:
+            return None
+        return dict(row)
+    
+    async def query(self, sql: str, params: Optional[List] = None) -> List[Dict]:
+        """查询多条记录"""
+        rows = await self._executor().fetch(convert_placeholders(sql), *(params or ()))
+        return [dict(row) for row in rows]
+    
+    async def execute(self, sql: str, params: Optional[List] = None):
+        """执行SQL"""
+        await self._executor().execute(convert_placeholders(sql), *(params or ()))
+    
+    async def execute_many(self, sql: str, params_list: List[List]):
+        """批量执行（asyncpg executemany 本身在一个事务中执行）"""
+        if not params_list:
+            return
+        await self._executor().executemany(convert_placeholders(sql), params_list)
+    
+    async def table_insert(self, table: str, data: Dict) -> int:
+        """插入数据，返回自增ID"""
+        columns = ', '.join(data.keys())
+        placeholders = ', '.join(f'${i}' for i in range(1, len(data) + 1))
+        sql = f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) RETURNING id"
+        return await self._executor().fetchval(sql, *data.values())
+    
+    async def table_update(self, table: str, data: Dict, where: str):
+        """更新数据"""
+        set_clause = ', '.join([f"{k} = ?" for k in data.keys()])
+        sql = f"UPDATE {table} SET {set_clause} WHERE {where}"
+        await self.execute(sql, list(data.values()))
+    
+    def transaction(self):
+        """
+        事务
+
+        Example:
+            async with db.transaction():
+                await db.execute(...)
+                await db.table_insert(...)
+        """
+        return _PostgresTransaction(self)
+    
+    @contextlib.asynccontextmanager
+    async def lock(self, name: str):
+        """
+        命名锁（会话级 advisory lock）：单独占用一个连接，不开启事务
+
+        轮询 pg_try_advisory_lock 而不阻塞等待：阻塞中的语句持有快照，
+        持锁方的 CREATE INDEX CONCURRENTLY 会等待该快照结束，形成死锁
+        """
+        conn = await self.pool.acquire()
+        try:
+            while not await conn.fetchval("SELECT pg_try_advisory_lock(hashtext($1))", name):
+                logger.info(f'⏳ 等待数据库锁: {name}')
+                await asyncio.sleep(1)
+            try:
+                yield self
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock(hashtext($1))", name)
+        finally:
+            await self.pool.release(conn)
+
+
+class _PostgresTransaction:
+    """PostgresAdapter.transaction() 返回的异步上下文管理器（支持嵌套，内层为保存点）"""
+    
+    def __init__(self, adapter: PostgresAdapter):
+        self.adapter = adapter
+        self.conn = None
+        self.tx = None
+        self.token = None
+        self.nested = False
+        self.callbacks = None
+    
+    async def __aenter__(self):
+        current = self.adapter._conn.get()
+        if current is not None:
+            self.conn = current
+            self.nested = True
+        else:
+            self.conn = await self.adapter.pool.acquire()
+            self.token = self.adapter._conn.set(self.conn)
+        self.tx = self.conn.transaction()
+        try:
+            await self.tx.start()
+        except BaseException:
+            await self._release()
+            raise
+        self.callbacks = _enter_after_commit(nested=self.nested)
+        return self.adapter
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.nested:
+            if exc_type is not None:
+                _rollback_after_commit(self.callbacks)
+            callbacks = ()
+        else:
+            callbacks = _after_commit.get()
+            _after_commit.reset(self.callbacks)
+        try:
+            if exc_type is None:
+                await self.tx.commit()
+            else:
+                await self.tx.rollback()
+        finally:
+            await self._release()
+        if exc_type is None:
+            await _run_after_commit(callbacks)
+        return False
+    
+    async def _release(self):
+        if self.token is not None:
+            self.adapter._conn.reset(self.token)
+            self.token = None
+            await self.adapter.pool.release(self.conn)
 
 
 async def create_database_adapter(db_type: str, config: Dict, app_config: Dict = None) -> DatabaseAdapter:
@@ -202,7 +732,7 @@ async def create_database_adapter(db_type: str, config: Dict, app_config: Dict =
     创建数据库适配器
     
     Args:
-        db_type: 数据库类型 'sqlite' 或 'mysql'
+        db_type: 数据库类型 'sqlite'、'mysql' 或 'postgres'
         config: 数据库配置
         app_config: 应用配置（可选，用于获取默认管理员账号等配置）
         
@@ -215,14 +745,33 @@ async def create_database_adapter(db_type: str, config: Dict, app_config: Dict =
         
         # 检查是否需要初始化数据库
         await _initialize_sqlite_if_needed(adapter, app_config)
-        
-        return adapter
     elif db_type == 'mysql':
         adapter = MySQLAdapter(config)
         await adapter.connect()
-        return adapter
+        
+        # MySQL表结构需手动执行 init_mysql.sql，未初始化时不执行迁移
+        if not await adapter.get(
+            "SELECT 1 AS found FROM information_schema.tables "
+            "WHERE table_schema = DATABASE() AND table_name = 'users'"
+        ):
+            logger.warning("⚠️  MySQL数据库未初始化，请先执行 migrations/init_mysql.sql")
+            return adapter
+    elif db_type == 'postgres':
+        adapter = PostgresAdapter(config)
+        await adapter.connect()
+        
+        # 检查是否需要初始化数据库
+        await _initialize_postgres_if_needed(adapter, app_config)
     else:
         raise ValueError(f"不支持的数据库类型: {db_type}")
+    
+    # 执行未完成的版本化迁移（索引等增量变更，已是最新时只需一次查询）
+    await run_migrations(adapter)
+    
+    # 全文索引是否可用（不可用时关键词搜索回退到 LIKE）
+    adapter.fulltext = await detect_fulltext(adapter)
+    
+    return adapter
 
 
 async def _initialize_sqlite_if_needed(adapter: SQLiteAdapter, config: Dict = None):
@@ -277,13 +826,56 @@ async def _initialize_sqlite_if_needed(adapter: SQLiteAdapter, config: Dict = No
         raise
 
 
-async def _create_default_admin(adapter: SQLiteAdapter, config: Dict = None):
+async def _initialize_postgres_if_needed(adapter: PostgresAdapter, config: Dict = None):
+    """
+    检查并初始化PostgreSQL数据库
+    如果users表不存在，则执行初始化脚本
+    
+    Args:
+        adapter: PostgreSQL适配器
+        config: 应用配置（用于获取默认管理员账号配置）
+    """
+    try:
+        result = await adapter.get("SELECT to_regclass('users') AS name")
+        
+        if not result or not result['name']:
+            logger.info("📦 PostgreSQL数据库为空，开始初始化...")
+            
+            import os
+            script_path = os.path.join(
+                os.path.dirname(__file__),
+                '../../migrations/init_postgres.sql'
+            )
+            
+            if os.path.exists(script_path):
+                with open(script_path, 'r', encoding='utf-8') as f:
+                    sql_script = f.read()
+                
+                # 无参数时asyncpg支持一次执行多条语句
+                async with adapter.pool.acquire() as conn:
+                    await conn.execute(sql_script)
+                
+                logger.info("✅ PostgreSQL表结构初始化完成")
+                
+                await _create_default_admin(adapter, config)
+            else:
+                logger.warning(f"⚠️  未找到PostgreSQL初始化脚本: {script_path}")
+        else:
+            logger.info("✅ PostgreSQL数据库已存在，跳过表结构初始化")
+            await _sync_admin_account(adapter, config)
+            
+    except Exception as e:
+        logger.error(f"❌ PostgreSQL数据库初始化检查失败: {e}")
+        raise
+
+
+async def _create_default_admin(adapter: DatabaseAdapter, config: Dict = None):
     """
     创建默认管理员账号（仅用于首次初始化）
     从配置文件读取默认账号信息
     
     Args:
-        adapter: SQLite适配器
+        adapter: 数据库适配器（SQLite/PostgreSQL）
         config: 应用配置
     """
     try:
@@ -307,11 +899,8 @@ async def _create_default_admin(adapter: SQLiteAdapter, config: Dict = None):
             logger.info(f"✅ 管理员账号已存在: {admin_username}")
             return
         
-        # 生成密码哈希
-        import bcrypt
-        password_bytes = admin_password.encode('utf-8')
-        salt = bcrypt.gensalt(rounds=12)
-        password_hash = bcrypt.hashpw(password_bytes, salt).decode('utf-8')
+        # 生成密码哈希（bcrypt 线程池）
+        password_hash = await PasswordUtil.hash_password_async(admin_password)
         
         # 插入默认管理员账号
         await adapter.execute(
@@ -329,16 +918,16 @@ async def _create_default_admin(adapter: SQLiteAdapter, config: Dict = None):
         raise
 
 
-async def _sync_admin_account(adapter: SQLiteAdapter, config: Dict = None):
+async def _sync_admin_account(adapter: DatabaseAdapter, config: Dict = None):
     """
     同步管理员账号（每次启动时执行）
     - 如果配置的管理员用户名对应的账号不存在，则创建
-    - 如果存在，则更新密码（仅当密码哈希不匹配时）
+    - 如果存在，则更新密码（仅当密码校验不通过时才重新生成哈希）
     
     这样可以确保环境变量 ADMIN_USERNAME 和 ADMIN_PASSWORD 始终生效
     
     Args:
-        adapter: SQLite适配器
+        adapter: 数据库适配器（SQLite/PostgreSQL）
         config: 应用配置
     """
     try:
@@ -352,12 +941,6 @@ async def _sync_admin_account(adapter: SQLiteAdapter, config: Dict = None):
             admin_password = config.get('DEFAULT_ADMIN_PASSWORD', 'admin123')
             admin_name = config.get('DEFAULT_ADMIN_NAME', '管理员')
         
-        # 生成密码哈希
-        import bcrypt
-        password_bytes = admin_password.encode('utf-8')
-        salt = bcrypt.gensalt(rounds=12)
-        password_hash = bcrypt.hashpw(password_bytes, salt).decode('utf-8')
-        
         # 检查管理员账号是否已存在
         existing_admin = await adapter.get(
             "SELECT id, password_hash FROM users WHERE username = ? AND auth_type = 'local'",
@@ -369,23 +952,29 @@ async def _sync_admin_account(adapter: SQLiteAdapter, config: Dict = None):
             # 注意：由于bcrypt每次生成的salt不同，我们需要验证密码而不是直接比较哈希
             old_hash = existing_admin.get('password_hash', '')
             
-            # 验证当前密码是否正确
-            try:
-                is_password_correct = bcrypt.checkpw(password_bytes, old_hash.encode('utf-8'))
-            except:
-                is_password_correct = False
+            # 验证当前密码是否正确（格式错误的哈希按不匹配处理）
+            is_password_correct = await PasswordUtil.verify_password_async(admin_password, old_hash)
             
             if not is_password_correct:
                 # 密码不匹配，需要更新
+                password_hash = await PasswordUtil.hash_password_async(admin_password)
                 await adapter.execute(
                     "UPDATE users SET password_hash = ?, name = ? WHERE id = ?",
                     [password_hash, admin_name, existing_admin['id']]
                 )
+                # 密码变更后吊销之前签发的Token（从旧版本升级时 token_version 列由之后的迁移添加，此时跳过）
+                try:
+                    await adapter.execute(
+                        "UPDATE users SET token_version = token_version + 1 WHERE id = ?", [existing_admin['id']]
+                    )
+                except Exception:
+                    pass
                 logger.info(f"🔄 管理员账号密码已更新: {admin_username}")
             else:
                 logger.info(f"✅ 管理员账号配置正确: {admin_username}")
         else:
             # 账号不存在，创建新账号
+            password_hash = await PasswordUtil.hash_password_async(admin_password)
             await adapter.execute(
                 """
                 INSERT INTO users (username, password_hash, name, auth_type, is_admin, is_active)
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+数据库查询监控
+- 包装 DatabaseAdapter，统计每次SQL调用的耗时
+- 请求级计数：每个请求执行了多少条SQL、总耗时多少
+- 慢查询日志（SQL归一化，去掉字面量）
+- 按路由统计DB耗时的 p50/p99
+- 开发模式下检测 N+1 查询（同一请求内同一形状的SQL执行次数超过阈值）
+"""
+
+import re
+import time
+import contextvars
+from collections import Counter, deque
+from typing import Dict, List, Optional
+
+from sanic.log import logger
+
+from apps.utils.db_adapter import DatabaseAdapter
+
+
+# SQL归一化用到的正则
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    SQL归一化：把字符串/数字字面量替换为 ?，合并空白
+    用于慢查询日志和 N+1 检测（同一"形状"的SQL视为同一条）
+
+    Example:
+        >>> normalize_sql("SELECT id FROM prompts WHERE id = 12 AND title = 'a'")
+        "SELECT id FROM prompts WHERE id = ? AND title = ?"
+    """
+    shape = _STRING_LITERAL_RE.sub('?', sql)
+    shape = _NUMBER_LITERAL_RE.sub('?', shape)
+    shape = _IN_LIST_RE.sub('(?+)', shape)
+    return _WHITESPACE_RE.sub(' ', shape).strip()
+
+
+class RequestQueryStats:
+    """单个请求内的查询统计"""
+
+    __slots__ = ('route', 'count', 'total_time', 'shapes', 'warned')
+
+    def __init__(self, route: str):
+        self.route = route
+        self.count = 0
+        self.total_time = 0.0
+        self.shapes = Counter()
+        self.warned = set()
+
+
+class RouteStats:
+    """单个路由的DB耗时统计（保留最近N个请求的样本计算分位数）"""
+
+    __slots__ = ('requests', 'queries', 'samples')
+
+    def __init__(self, sample_size: int):
+        self.requests = 0
+        self.queries = 0
+        self.samples = deque(maxlen=sample_size)
+
+    def add(self, stats: RequestQueryStats):
+        self.requests += 1
+        self.queries += stats.count
+        self.samples.append(stats.total_time)
+
+    def summary(self) -> Dict:
+        ordered = sorted(self.samples)
+
+        def percentile(p):
+            if not ordered:
+                return 0.0
+            index = min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))
+            return round(ordered[index] * 1000, 2)
+
+        return {
+            'requests': self.requests,
+            'avg_queries': round(self.queries / self.requests, 2) if self.requests else 0,
+            'p50_ms': percentile(0.50),
+            'p99_ms': percentile(0.99),
+        }
+
+
+class QueryMetrics:
+    """查询统计收集器"""
+
+    def __init__(self, slow_query_ms=100, n_plus_one_threshold=5,
+                 detect_n_plus_one=False, sample_size=1000):
+        """
+        Args:
+            slow_query_ms: 慢查询阈值(毫秒)
+            n_plus_one_threshold: 同一请求内同一形状SQL的次数阈值
+            detect_n_plus_one: 是否检测N+1（建议仅开发模式开启）
+            sample_size: 每个路由保留的样本数
+        """
+        self.slow_query_ms = slow_query_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.detect_n_plus_one = detect_n_plus_one
+        self.sample_size = sample_size
+        self.routes: Dict[str, RouteStats] = {}
+        self._current = contextvars.ContextVar('db_query_stats', default=None)
+
+    def begin_request(self, route: str) -> RequestQueryStats:
+        """请求开始时调用，创建请求级统计"""
+        stats = RequestQueryStats(route)
+        self._current.set(stats)
+        return stats
+
+    def end_request(self) -> Optional[RequestQueryStats]:
+        """请求结束时调用，汇总到路由统计"""
+        stats = self._current.get()
+        if stats is None:
+            return None
+        self._current.set(None)
+
+        route_stats = self.routes.get(stats.route)
+        if route_stats is None:
+            route_stats = self.routes[stats.route] = RouteStats(self.sample_size)
+        route_stats.add(stats)
+        return stats
+
+    def record(self, sql: str, elapsed: float):
+        """记录一次SQL执行"""
+        stats = self._current.get()
+        elapsed_ms = elapsed * 1000
+
+        shape = None
+        if elapsed_ms >= self.slow_query_ms:
+            shape = normalize_sql(sql)
+            route = stats.route if stats else '-'
+            logger.warning(f'🐢 慢查询 {elapsed_ms:.1f}ms [{route}]: {shape}')
+
+        if stats is None:
+            return
+
+        stats.count += 1
+        stats.total_time += elapsed
+
+        if self.detect_n_plus_one:
+            shape = shape or normalize_sql(sql)
+            stats.shapes[shape] += 1
+            if stats.shapes[shape] > self.n_plus_one_threshold and shape not in stats.warned:
+                stats.warned.add(shape)
+                logger.warning(
+                    f'⚠️  疑似N+1查询 [{stats.route}]: 同一SQL执行超过 '
+                    f'{self.n_plus_one_threshold} 次: {shape}'
+                )
+
+    def route_summary(self) -> Dict[str, Dict]:
+        """按路由汇总的DB耗时统计"""
+        return {route: stats.summary() for route, stats in sorted(self.routes.items())}
+
+
+class InstrumentedAdapter(DatabaseAdapter):
+    """
+    带耗时统计的数据库适配器（装饰器模式）
+
+    对外接口与被包装的适配器完全一致，未定义的属性透传给内部适配器
+    """
+
+    def __init__(self, adapter: DatabaseAdapter, metrics: QueryMetrics):
+        self._adapter = adapter
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        return getattr(self._adapter, name)
+
+    async def _timed(self, sql: str, coro):
+        start = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            self._metrics.record(sql, time.perf_counter() - start)
+
+    async def connect(self):
+        await self._adapter.connect()
+
+    async def close(self):
+        await self._adapter.close()
+
+    async def get(self, sql: str, params: Optional[List] = None) -> Optional[Dict]:
+        return await self._timed(sql, self._adapter.get(sql, params))
+
+    async def query(self, sql: str, params: Optional[List] = None) -> List[Dict]:
+        return await self._timed(sql, self._adapter.query(sql, params))
+
+    async def execute(self, sql: str, params: Optional[List] = None):
+        return await self._timed(sql, self._adapter.execute(sql, params))
+
+    async def execute_many(self, sql: str, params_list: List[List]):
+        return await self._timed(sql, self._adapter.execute_many(sql, params_list))
+
+    async def table_insert(self, table: str, data: Dict) -> int:
+        sql = f"INSERT INTO {table} ({', '.join(data.keys())})"
+        return await self._timed(sql, self._adapter.table_insert(table, data))
+
+    async def table_update(self, table: str, data: Dict, where: str):
+        sql = f"UPDATE {table} SET {', '.join(data.keys())} WHERE {where}"
+        return await self._timed(sql, self._adapter.table_update(table, data, where))
+
+    def transaction(self):
+        return self._adapter.transaction()
+
+    def lock(self, name: str):
+        return self._adapter.lock(name)
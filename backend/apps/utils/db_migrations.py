@@ -0,0 +1,450 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+数据库版本化迁移
+- schema_version 表记录已执行的迁移版本，启动时只需一次 MAX(version) 查询即可判断是否需要迁移
+- 迁移只向前执行，每个迁移由若干步骤组成：
+  - RunSQL:      按方言执行SQL（sqlite/mysql/postgres，未提供的方言跳过）
+  - CreateIndex: 在线安全地创建索引（MySQL INPLACE/LOCK=NONE，PostgreSQL CONCURRENTLY）
+  - AddColumn:   添加列（已存在则跳过）
+  - 普通协程函数 async def step(db)：数据回填等需要代码处理的步骤
+- 迁移在数据库命名锁内执行（MySQL GET_LOCK / PostgreSQL advisory lock / SQLite BEGIN IMMEDIATE），多实例同时启动时只有一个执行
+- 新增迁移：在 MIGRATIONS 末尾追加，版本号递增，已发布的迁移不要修改
+"""
+
+import time
+from typing import Callable, Dict, List, Sequence, Union
+
+from sanic.log import logger
+
+from apps.utils.blob_store import externalize_prompt_fields
+from apps.utils.fulltext import PG_SEARCH_VECTOR, create_mysql_fulltext, create_sqlite_fulltext
+from apps.utils.tag_utils import backfill_prompt_tag_map
+from apps.utils.version_store import backfill_change_stats
+
+
+class RunSQL:
+    """执行SQL步骤"""
+
+    def __init__(self, sql: Union[str, Dict[str, Union[str, Sequence[str]]]]):
+        """
+        Args:
+            sql: 所有方言通用的SQL，或 {dialect: sql / [sql, ...]}
+        """
+        self.sql = sql
+
+    async def apply(self, db):
+        if isinstance(self.sql, str):
+            statements = [self.sql]
+        else:
+            statements = self.sql.get(db.dialect) or []
+            if isinstance(statements, str):
+                statements = [statements]
+        for statement in statements:
+            await db.execute(statement)
+
+    def __repr__(self):
+        return 'RunSQL'
+
+
+class CreateIndex:
+    """
+    创建索引步骤（已存在则跳过）
+
+    - SQLite:     CREATE INDEX IF NOT EXISTS（SQLite为库级锁，建索引期间写入会等待）
+    - MySQL:      ALGORITHM=INPLACE, LOCK=NONE，建索引期间不阻塞读写
+    - PostgreSQL: CREATE INDEX CONCURRENTLY，不阻塞写入；上次中断留下的无效索引会先删除再重建
+    """
+
+    def __init__(self, name: str, table: str, columns: Sequence[str], unique: bool = False):
+        self.name = name
+        self.table = table
+        self.columns = tuple(columns)
+        self.unique = unique
+
+    async def apply(self, db):
+        handler = getattr(self, f'_apply_{db.dialect}')
+        await handler(db)
+
+    @property
+    def _columns_sql(self):
+        return ', '.join(self.columns)
+
+    @property
+    def _unique_sql(self):
+        return 'UNIQUE ' if self.unique else ''
+
+    async def _apply_sqlite(self, db):
+        await db.execute(
+            f"CREATE {self._unique_sql}INDEX IF NOT EXISTS {self.name} "
+            f"ON {self.table}({self._columns_sql})"
+        )
+
+    async def _apply_mysql(self, db):
+        existing = await db.get(
+            "SELECT 1 AS found FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = ? AND index_name = ? LIMIT 1",
+            [self.table, self.name]
+        )
+        if existing:
+            return
+        await db.execute(
+            f"CREATE {self._unique_sql}INDEX {self.name} ON {self.table}({self._columns_sql}) "
+            f"ALGORITHM=INPLACE LOCK=NONE"
+        )
+
+    async def _apply_postgres(self, db):
+        existing = await db.get(
+            "SELECT i.indisvalid AS valid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+            "WHERE c.relname = ? AND c.relkind = 'i' AND pg_table_is_visible(c.oid)",
+            [self.name]
+        )
+        if existing:
+            if existing['valid']:
+                return
+            logger.warning(f'⚠️  索引 {self.name} 上次创建未完成，删除后重建')
+            await db.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {self.name}")
+        # CONCURRENTLY 不能在事务中执行，直接走连接池的自动提交
+        await db.execute(
+            f"CREATE {self._unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {self.name} "
+            f"ON {self.table}({self._columns_sql})"
+        )
+
+    def __repr__(self):
+        return f'CreateIndex({self.name})'
+
+
+class AddColumn:
+    """添加列步骤（已存在则跳过，中断后可安全重跑）"""
+
+    def __init__(self, table: str, column: str, definition: Union[str, Dict[str, str]]):
+        """
+        Args:
+            definition: 列类型及默认值，如 "INTEGER DEFAULT NULL"，或 {dialect: definition}
+        """
+        self.table = table
+        self.column = column
+        self.definition = definition
+
+    async def apply(self, db):
+        definition = self.definition if isinstance(self.definition, str) else self.definition[db.dialect]
+        if db.dialect == 'postgres':
+            await db.execute(f"ALTER TABLE {self.table} ADD COLUMN IF NOT EXISTS {self.column} {definition}")
+            return
+        if db.dialect == 'mysql':
+            existing = await db.get(
+                "SELECT 1 AS found FROM information_schema.columns "
+                "WHERE table_schema = DATABASE() AND table_name = ? AND column_name = ? LIMIT 1",
+                [self.table, self.column]
+            )
+        else:
+            columns = await db.query(f"PRAGMA table_info({self.table})")
+            existing = any(column['name'] == self.column for column in columns)
+        if not existing:
+            await db.execute(f"ALTER TABLE {self.table} ADD COLUMN {self.column} {definition}")
+
+    def __repr__(self):
+        return f'AddColumn({self.table}.{self.column})'
+
+
+class Migration:
+    """一个版本的迁移"""
+
+    def __init__(self, version: int, name: str, steps: List[Union[RunSQL, CreateIndex, AddColumn, Callable]]):
+        self.version = version
+        self.name = name
+        self.steps = steps
+
+    async def apply(self, db):
+        for step in self.steps:
+            if hasattr(step, 'apply'):
+                await step.apply(db)
+            else:
+                await step(db)
+
+
+# 迁移使用的数据库命名锁
+MIGRATION_LOCK = 'yprompt_migrations'
+
+# schema_version 建表语句
+_SCHEMA_VERSION_SQL = {
+    'sqlite': """
+        CREATE TABLE IF NOT EXISTS schema_version (
+          version INTEGER PRIMARY KEY,
+          name VARCHAR(200) NOT NULL,
+          applied_time DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    'mysql': """
+        CREATE TABLE IF NOT EXISTS `schema_version` (
+          `version` INT(11) NOT NULL,
+          `name` VARCHAR(200) NOT NULL,
+          `applied_time` DATETIME DEFAULT CURRENT_TIMESTAMP,
+          PRIMARY KEY (`version`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='数据库迁移版本'
+    """,
+    'postgres': """
+        CREATE TABLE IF NOT EXISTS schema_version (
+          version INTEGER PRIMARY KEY,
+          name VARCHAR(200) NOT NULL,
+          applied_time TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP(0)
+        )
+    """,
+}
+
+
+# ==========================================
+# 迁移列表（只追加，不修改已发布的迁移）
+# ==========================================
+MIGRATIONS: List[Migration] = [
+    Migration(1, 'mysql_missing_tables', [
+        # init_mysql.sql 缺少这两张表（SQLite/PostgreSQL 初始化脚本中已有）
+        RunSQL({'mysql': [
+            """
+            CREATE TABLE IF NOT EXISTS `user_prompt_rules` (
+              `id` INT(11) NOT NULL AUTO_INCREMENT,
+              `user_id` INT(11) NOT NULL,
+              `system_prompt_rules` TEXT DEFAULT NULL,
+              `user_guided_prompt_rules` TEXT DEFAULT NULL,
+              `requirement_report_rules` TEXT DEFAULT NULL,
+              `thinking_points_extraction_prompt` TEXT DEFAULT NULL,
+              `thinking_points_system_message` TEXT DEFAULT NULL,
+              `system_prompt_generation_prompt` TEXT DEFAULT NULL,
+              `system_prompt_system_message` TEXT DEFAULT NULL,
+              `optimization_advice_prompt` TEXT DEFAULT NULL,
+              `optimization_advice_system_message` TEXT DEFAULT NULL,
+              `optimization_application_prompt` TEXT DEFAULT NULL,
+              `optimization_application_system_message` TEXT DEFAULT NULL,
+              `quality_analysis_system_prompt` TEXT DEFAULT NULL,
+              `user_prompt_quality_analysis` TEXT DEFAULT NULL,
+              `user_prompt_quick_optimization` TEXT DEFAULT NULL,
+              `user_prompt_rules` TEXT DEFAULT NULL,
+              `create_time` DATETIME DEFAULT CURRENT_TIMESTAMP,
+              `update_time` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+              PRIMARY KEY (`id`),
+              UNIQUE KEY `uk_user_prompt_rules` (`user_id`),
+              CONSTRAINT `fk_rules_user` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='用户提示词规则表'
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS `global_ai_settings` (
+              `id` INT(11) NOT NULL AUTO_INCREMENT,
+              `providers` MEDIUMTEXT DEFAULT NULL,
+              `default_provider` VARCHAR(100) DEFAULT NULL,
+              `default_model` VARCHAR(100) DEFAULT NULL,
+              `stream_mode` TINYINT(1) DEFAULT 1,
+              `use_slim_rules` TINYINT(1) DEFAULT 0,
+              `updated_by` INT(11) DEFAULT NULL,
+              `create_time` DATETIME DEFAULT CURRENT_TIMESTAMP,
+              `update_time` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+              PRIMARY KEY (`id`),
+              CONSTRAINT `fk_settings_user` FOREIGN KEY (`updated_by`) REFERENCES `users` (`id`) ON DELETE SET NULL
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='全局AI设置表'
+            """,
+        ]}),
+    ]),
+    Migration(2, 'list_composite_indexes', [
+        # 列表按用户过滤 + 时间排序
+        CreateIndex('idx_prompts_user_create', 'prompts', ['user_id', 'create_time']),
+        CreateIndex('idx_prompts_user_update', 'prompts', ['user_id', 'update_time']),
+        # 版本历史按提示词过滤、排除已删除、按时间排序
+        CreateIndex('idx_versions_prompt_deleted_time', 'prompt_versions',
+                    ['prompt_id', 'is_deleted', 'create_time']),
+    ]),
+    Migration(3, 'list_sort_indexes', [
+        # 游标分页按 (排序字段, id) 定位，其余排序方式也需要 user_id 前缀的索引
+        CreateIndex('idx_prompts_user_views', 'prompts', ['user_id', 'view_count']),
+        CreateIndex('idx_prompts_user_uses', 'prompts', ['user_id', 'use_count']),
+    ]),
+    Migration(4, 'prompts_fulltext', [
+        # 全文检索覆盖 title/description/final_prompt（见 apps.utils.fulltext）
+        create_sqlite_fulltext,
+        create_mysql_fulltext,
+        RunSQL({'postgres': [
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_prompts_fulltext ON prompts USING GIN ({PG_SEARCH_VECTOR})",
+            # 旧索引只覆盖 title/description
+            "DROP INDEX CONCURRENTLY IF EXISTS idx_prompts_search",
+        ]}),
+    ]),
+    Migration(5, 'prompt_tag_map', [
+        # 提示词-标签映射表，替代 tags LIKE '%tag%' 的全表扫描（见 apps.utils.tag_utils）
+        RunSQL({
+            'sqlite': """
+                CREATE TABLE IF NOT EXISTS prompt_tag_map (
+                  prompt_id INTEGER NOT NULL,
+                  tag_id INTEGER NOT NULL,
+                  PRIMARY KEY (prompt_id, tag_id),
+                  FOREIGN KEY (prompt_id) REFERENCES prompts(id) ON DELETE CASCADE,
+                  FOREIGN KEY (tag_id) REFERENCES prompt_tags(id) ON DELETE CASCADE
+                )
+            """,
+            'mysql': """
+                CREATE TABLE IF NOT EXISTS `prompt_tag_map` (
+                  `prompt_id` INT(11) NOT NULL,
+                  `tag_id` INT(11) NOT NULL,
+                  PRIMARY KEY (`prompt_id`, `tag_id`),
+                  CONSTRAINT `fk_tag_map_prompt_id` FOREIGN KEY (`prompt_id`) REFERENCES `prompts` (`id`) ON DELETE CASCADE,
+                  CONSTRAINT `fk_tag_map_tag_id` FOREIGN KEY (`tag_id`) REFERENCES `prompt_tags` (`id`) ON DELETE CASCADE
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='提示词标签映射表'
+            """,
+            'postgres': """
+                CREATE TABLE IF NOT EXISTS prompt_tag_map (
+                  prompt_id INTEGER NOT NULL REFERENCES prompts(id) ON DELETE CASCADE,
+                  tag_id INTEGER NOT NULL REFERENCES prompt_tags(id) ON DELETE CASCADE,
+                  PRIMARY KEY (prompt_id, tag_id)
+                )
+            """,
+        }),
+        # 按标签查提示词、统计标签下的提示词数量
+        CreateIndex('idx_tag_map_tag', 'prompt_tag_map', ['tag_id', 'prompt_id']),
+        backfill_prompt_tag_map,
+    ]),
+    Migration(6, 'recount_tag_use_count', [
+        # use_count 改为"使用该标签的提示词数量"（此前每次保存都累加、移除标签不减少）
+        RunSQL(
+            "UPDATE prompt_tags SET use_count = "
+            "(SELECT COUNT(*) FROM prompt_tag_map m WHERE m.tag_id = prompt_tags.id)"
+        ),
+    ]),
+    Migration(7, 'version_delta_storage', [
+        # 版本内容增量存储（见 apps.utils.version_store），已有版本保持 full 格式
+        AddColumn('prompt_versions', 'storage_format', "VARCHAR(10) DEFAULT 'full'"),
+        AddColumn('prompt_versions', 'content_blob', {
+            'sqlite': 'BLOB DEFAULT NULL',
+            'mysql': 'MEDIUMBLOB DEFAULT NULL',
+            'postgres': 'BYTEA DEFAULT NULL',
+        }),
+        AddColumn('prompt_versions', 'base_version_id', 'INTEGER DEFAULT NULL'),
+    ]),
+    Migration(8, 'content_blobs', [
+        # 大文本内容寻址存储（见 apps.utils.blob_store）
+        RunSQL({
+            'sqlite': """
+                CREATE TABLE IF NOT EXISTS content_blobs (
+                  hash VARCHAR(64) PRIMARY KEY,
+                  size INTEGER NOT NULL DEFAULT 0,
+                  ref_count INTEGER NOT NULL DEFAULT 0,
+                  content BLOB DEFAULT NULL
+                )
+            """,
+            'mysql': """
+                CREATE TABLE IF NOT EXISTS `content_blobs` (
+                  `hash` CHAR(64) NOT NULL,
+                  `size` INT(11) NOT NULL DEFAULT 0,
+                  `ref_count` INT(11) NOT NULL DEFAULT 0,
+                  `content` LONGBLOB DEFAULT NULL,
+                  PRIMARY KEY (`hash`)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='内容寻址存储'
+            """,
+            'postgres': """
+                CREATE TABLE IF NOT EXISTS content_blobs (
+                  hash VARCHAR(64) PRIMARY KEY,
+                  size INTEGER NOT NULL DEFAULT 0,
+                  ref_count INTEGER NOT NULL DEFAULT 0,
+                  content BYTEA DEFAULT NULL
+                )
+            """,
+        }),
+        # 外置字段的引用 {字段: hash}
+        AddColumn('prompts', 'content_refs', 'TEXT DEFAULT NULL'),
+        externalize_prompt_fields,
+    ]),
+    Migration(9, 'version_change_stats', [
+        # 版本相对上一版本的变更统计，版本历史列表直接展示
+        AddColumn('prompt_versions', 'lines_added', 'INTEGER DEFAULT 0'),
+        AddColumn('prompt_versions', 'lines_removed', 'INTEGER DEFAULT 0'),
+        AddColumn('prompt_versions', 'changed_fields', 'VARCHAR(255) DEFAULT NULL'),
+        AddColumn('prompt_versions', 'diff_summary', 'VARCHAR(255) DEFAULT NULL'),
+        backfill_change_stats,
+    ]),
+    Migration(10, 'user_token_version', [
+        # 用户的令牌版本：登出/禁用时 +1，之前签发的Token全部失效（见 auth_middleware）
+        AddColumn('users', 'token_version', 'INTEGER NOT NULL DEFAULT 0'),
+    ]),
+    Migration(11, 'revoked_tokens', [
+        # 登出吊销的单个Token（按 jti 记录到过期时间 expires_at，Unix时间戳），见 AuthService.revoke_token
+        RunSQL({
+            'sqlite': """
+                CREATE TABLE IF NOT EXISTS revoked_tokens (
+                  jti VARCHAR(64) PRIMARY KEY,
+                  user_id INTEGER NOT NULL,
+                  expires_at INTEGER NOT NULL
+                )
+            """,
+            'mysql': """
+                CREATE TABLE IF NOT EXISTS `revoked_tokens` (
+                  `jti` VARCHAR(64) NOT NULL,
+                  `user_id` INT(11) NOT NULL,
+                  `expires_at` BIGINT NOT NULL,
+                  PRIMARY KEY (`jti`)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='已吊销的Token'
+            """,
+            'postgres': """
+                CREATE TABLE IF NOT EXISTS revoked_tokens (
+                  jti VARCHAR(64) PRIMARY KEY,
+                  user_id INTEGER NOT NULL,
+                  expires_at BIGINT NOT NULL
+                )
+            """,
+        }),
+        CreateIndex('idx_revoked_tokens_expires', 'revoked_tokens', ['expires_at']),
+    ]),
+]
+
+
+async def get_schema_version(db) -> int:
+    """当前数据库的迁移版本（schema_version 表不存在时返回0）"""
+    try:
+        row = await db.get("SELECT MAX(version) AS version FROM schema_version")
+    except Exception:
+        return 0
+    return (row or {}).get('version') or 0
+
+
+async def run_migrations(db, migrations: List[Migration] = None) -> int:
+    """
+    执行未完成的迁移
+
+    启动时调用：已是最新版本时只有一次 MAX(version) 查询；
+    需要迁移时持有数据库命名锁（db.lock）串行执行，多实例同时启动时后到者等待，
+    取得锁后重新读取版本，已由其他实例完成的迁移不再执行（数据回填等步骤并非并发安全）
+
+    Args:
+        db: 数据库适配器
+        migrations: 迁移列表（默认 MIGRATIONS）
+
+    Returns:
+        int: 迁移后的版本号
+    """
+    migrations = sorted(migrations or MIGRATIONS, key=lambda m: m.version)
+    latest = migrations[-1].version if migrations else 0
+
+    current = await get_schema_version(db)
+    if current >= latest:
+        logger.info(f'✅ 数据库结构已是最新版本: v{current}')
+        return current
+
+    async with db.lock(MIGRATION_LOCK):
+        await db.execute(_SCHEMA_VERSION_SQL[db.dialect])
+        current = await get_schema_version(db)
+
+        for migration in migrations:
+            if migration.version <= current:
+                continue
+
+            logger.info(f'🔧 执行数据库迁移 v{migration.version}: {migration.name}')
+            start = time.perf_counter()
+            try:
+                await migration.apply(db)
+            except Exception as e:
+                logger.error(f'❌ 数据库迁移 v{migration.version} 失败: {e}')
+                raise
+
+            await db.execute(
+                "INSERT INTO schema_version (version, name) VALUES (?, ?)",
+                [migration.version, migration.name]
+            )
+            current = migration.version
+            logger.info(f'✅ 数据库迁移 v{migration.version} 完成，耗时 {time.perf_counter() - start:.2f}s')
+
+    return current
@@ -1,9 +1,10 @@
 from sanic.log import logger
 from apps.utils.db_adapter import create_database_adapter
+from apps.utils.db_metrics import QueryMetrics, InstrumentedAdapter
 
 
 class DB:
-    """数据库工具类，支持SQLite和MySQL"""
+    """数据库工具类，支持SQLite、MySQL和PostgreSQL"""
     
     def __init__(self, app):
         self.app = app
@@ -16,7 +17,7 @@ class DB:
         async def setup_db(app, loop):
             """
             服务启动前创建数据库连接
-            根据配置自动选择SQLite或MySQL
+            根据配置自动选择SQLite、MySQL或PostgreSQL
             """
             db_type = app.config.get('DB_TYPE', 'sqlite')
             
@@ -43,18 +44,62 @@ class DB:
                 }
                 logger.info(f"🔗 MySQL数据库: {config['host']}/{config['database']}")
                 
+            elif db_type == 'postgres':
+                # PostgreSQL配置（PG_DSN优先）
+                config = {
+                    'dsn': app.config.get('PG_DSN'),
+                    'host': app.config.get('DB_HOST'),
+                    'database': app.config.get('DB_NAME'),
+                    'user': app.config.get('DB_USER'),
+                    'password': app.config.get('DB_PASS'),
+                    'port': app.config.get('PG_PORT', 5432),
+                    'minsize': app.config.get('PG_POOL_MIN', 2),
+                    'maxsize': app.config.get('PG_POOL_MAX', 10),
+                    'pool_recycle': 3600
+                }
+                logger.info(f"🐘 PostgreSQL数据库: {config['host']}/{config['database']}")
+                
             else:
                 raise ValueError(f"不支持的数据库类型: {db_type}")
             
             # 创建数据库适配器（传递应用配置）
             adapter = await create_database_adapter(db_type, config, dict(app.config))
             
+            # 查询监控：统计每个请求的SQL次数和耗时
+            if app.config.get('DB_METRICS_ENABLED', True):
+                metrics = QueryMetrics(
+                    slow_query_ms=app.config.get('DB_SLOW_QUERY_MS', 100),
+                    n_plus_one_threshold=app.config.get('DB_N_PLUS_ONE_THRESHOLD', 5),
+                    detect_n_plus_one=app.debug
+                )
+                adapter = InstrumentedAdapter(adapter, metrics)
+                app.ctx.db_metrics = metrics
+            
             # 保存到应用上下文
             app.ctx.db = adapter
             app.ctx.db_type = db_type
             
             logger.info(f"✅ 数据库初始化成功: {db_type}")
         
+        @app.on_request
+        async def begin_query_stats(request):
+            """请求开始：创建请求级查询统计"""
+            metrics = getattr(request.app.ctx, 'db_metrics', None)
+            if metrics:
+                route = request.route.name if request.route else request.path
+                request.ctx.db_stats = metrics.begin_request(route)
+        
+        @app.on_response
+        async def end_query_stats(request, response):
+            """请求结束：汇总到路由统计，开发模式下在响应头中返回查询次数和耗时"""
+            metrics = getattr(request.app.ctx, 'db_metrics', None)
+            if not metrics:
+                return
+            stats = metrics.end_request()
+            if stats and response is not None and request.app.debug:
+                response.headers['X-DB-Queries'] = str(stats.count)
+                response.headers['X-DB-Time-Ms'] = f'{stats.total_time * 1000:.2f}'
+        
         @app.listener('after_server_stop')
         async def close_db(app, loop):
             """
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+提示词全文检索
+索引字段: title, description, final_prompt
+
+- SQLite:     FTS5 外部内容表 prompts_fts（trigram 分词，支持中文子串），触发器自动同步
+- MySQL:      FULLTEXT 索引 + ngram 分词器（支持中文）
+- PostgreSQL: tsvector 表达式 GIN 索引（simple 配置，不切分中文，中文关键词回退 LIKE）
+
+关键词过短（低于分词粒度）或全文索引不可用时，由调用方回退到 LIKE 查询
+"""
+
+import html
+import re
+from typing import List, Optional
+
+from sanic.log import logger
+
+
+# PostgreSQL 全文检索向量表达式，须与迁移中GIN索引的表达式完全一致
+PG_SEARCH_VECTOR = (
+    "to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(description, '') "
+    "|| ' ' || coalesce(final_prompt, ''))"
+)
+
+# MySQL 全文索引
+MYSQL_FULLTEXT_INDEX = 'ft_prompts_content'
+MYSQL_MATCH = 'MATCH(title, description, final_prompt)'
+
+# 各方言可用全文索引的最短关键词长度（trigram=3，ngram_token_size 默认 2）
+MIN_KEYWORD_LENGTH = {'sqlite': 3, 'mysql': 2, 'postgres': 1}
+
+_CJK_RE = re.compile(r'[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]')
+
+
+def has_cjk(text):
+    """是否包含中日韩文字（这类文本没有空格分词，全文检索需特殊处理）"""
+    return bool(_CJK_RE.search(text or ''))
+
+
+class SearchPlan:
+    """
+    全文检索的SQL片段
+
+    - condition:  WHERE 过滤条件（按时间等字段排序时使用）
+    - rank:       相关度排序的 ORDER BY 表达式（含方向）
+    - rank_join:  相关度排序需要的JOIN（SQLite的bm25只能在FTS表上取得）；
+                  存在时JOIN本身已完成过滤，列表查询不再需要 condition
+    - 各片段的参数分开保存，按其在SQL中出现的顺序拼接
+    """
+
+    __slots__ = ('condition', 'condition_params', 'rank', 'rank_params', 'rank_join', 'rank_join_params')
+
+    def __init__(self, condition, condition_params, rank, rank_params=None,
+                 rank_join='', rank_join_params=None):
+        self.condition = condition
+        self.condition_params = condition_params
+        self.rank = rank
+        self.rank_params = rank_params or []
+        self.rank_join = rank_join
+        self.rank_join_params = rank_join_params or []
+
+
+def build_search(db, keyword: str) -> Optional[SearchPlan]:
+    """
+    根据数据库方言生成全文检索SQL片段
+
+    Returns:
+        SearchPlan；全文索引不可用或关键词不适用时返回 None（调用方回退到 LIKE）
+    """
+    keyword = (keyword or '').strip()
+    dialect = getattr(db, 'dialect', None)
+    if not keyword or not getattr(db, 'fulltext', False):
+        return None
+    if len(keyword) < MIN_KEYWORD_LENGTH.get(dialect, 1):
+        return None
+
+    if dialect == 'sqlite':
+        # 整个关键词作为短语，trigram 下即为不区分大小写的子串匹配
+        # 过滤用 IN 子查询：SQLite 先物化匹配的rowid，再走 (user_id, 排序字段) 索引；
+        # 写成JOIN时规划器会对每行重复探测FTS表，少见关键词反而更慢
+        phrase = '"' + keyword.replace('"', '""') + '"'
+        return SearchPlan(
+            condition="id IN (SELECT rowid FROM prompts_fts WHERE prompts_fts MATCH ?)",
+            condition_params=[phrase],
+            rank='fts.search_rank ASC',
+            rank_join=(
+                " JOIN (SELECT rowid AS fts_id, bm25(prompts_fts) AS search_rank "
+                "FROM prompts_fts WHERE prompts_fts MATCH ?) fts ON fts.fts_id = prompts.id"
+            ),
+            rank_join_params=[phrase]
+        )
+
+    if dialect == 'mysql':
+        phrase = '"' + keyword.replace('"', ' ') + '"'
+        return SearchPlan(
+            condition=f"{MYSQL_MATCH} AGAINST (? IN BOOLEAN MODE)",
+            condition_params=[phrase],
+            rank=f"{MYSQL_MATCH} AGAINST (? IN BOOLEAN MODE) DESC",
+            rank_params=[phrase]
+        )
+
+    if dialect == 'postgres':
+        if has_cjk(keyword):
+            return None
+        return SearchPlan(
+            condition=f"{PG_SEARCH_VECTOR} @@ plainto_tsquery('simple', ?)",
+            condition_params=[keyword],
+            rank=f"ts_rank({PG_SEARCH_VECTOR}, plainto_tsquery('simple', ?)) DESC",
+            rank_params=[keyword]
+        )
+
+    return None
+
+
+def make_snippet(texts: List[Optional[str]], keyword: str, width: int = 40) -> str:
+    """
+    生成高亮摘要：在第一个包含关键词的字段中截取关键词前后的文本，关键词用 <mark> 包裹
+
+    文本先做HTML转义，前端可直接作为HTML渲染；没有命中时返回第一个非空字段的开头
+    """
+    keyword = (keyword or '').strip()
+    words = [w for w in (keyword, *keyword.split()) if w]
+    pattern = re.compile('|'.join(re.escape(w) for w in dict.fromkeys(words)), re.IGNORECASE) if words else None
+
+    for text in texts:
+        if not text or pattern is None:
+            continue
+        match = pattern.search(text)
+        if not match:
+            continue
+        start = max(0, match.start() - width)
+        end = min(len(text), match.end() + width)
+        fragment = text[start:end]
+        highlighted = pattern.sub(lambda m: '\0' + m.group(0) + '\1', fragment)
+        highlighted = html.escape(highlighted).replace('\0', '<mark>').replace('\1', '</mark>')
+        return ('…' if start > 0 else '') + highlighted + ('…' if end < len(text) else '')
+
+    for text in texts:
+        if text:
+            return html.escape(text[:width * 2]) + ('…' if len(text) > width * 2 else '')
+    return ''
+
+
+async def detect_fulltext(db) -> bool:
+    """检测全文索引是否可用（启动时调用一次，结果保存在适配器的 fulltext 属性上）"""
+    dialect = getattr(db, 'dialect', None)
+    try:
+        if dialect == 'sqlite':
+            row = await db.get("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'prompts_fts'")
+        elif dialect == 'mysql':
+            row = await db.get(
+                "SELECT 1 AS found FROM information_schema.statistics "
+                "WHERE table_schema = DATABASE() AND table_name = 'prompts' AND index_name = ? LIMIT 1",
+                [MYSQL_FULLTEXT_INDEX]
+            )
+        elif dialect == 'postgres':
+            row = await db.get("SELECT to_regclass('idx_prompts_fulltext') AS name")
+            row = row if row and row['name'] else None
+        else:
+            row = None
+    except Exception as e:
+        logger.warning(f'⚠️  全文索引检测失败，关键词搜索使用LIKE: {e}')
+        return False
+    return bool(row)
+
+
+# ==========================================
+# 迁移步骤
+# ==========================================
+
+async def create_sqlite_fulltext(db):
+    """SQLite: 创建FTS5外部内容表、同步触发器，并从 prompts 重建索引"""
+    if db.dialect != 'sqlite':
+        return
+    try:
+        await db.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS prompts_fts USING fts5("
+            "title, description, final_prompt, "
+            "content='prompts', content_rowid='id', tokenize='trigram')"
+        )
+    except Exception as e:
+        # 部分SQLite编译版本不含FTS5或trigram分词器，跳过，关键词搜索继续使用LIKE
+        logger.warning(f'⚠️  SQLite不支持FTS5 trigram，跳过全文索引: {e}')
+        return
+
+    # 只在索引字段变化时同步（浏览/使用次数等更新不触发）
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS prompts_fts_insert AFTER INSERT ON prompts BEGIN
+          INSERT INTO prompts_fts(rowid, title, description, final_prompt)
+          VALUES (new.id, new.title, new.description, new.final_prompt);
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS prompts_fts_delete AFTER DELETE ON prompts BEGIN
+          INSERT INTO prompts_fts(prompts_fts, rowid, title, description, final_prompt)
+          VALUES ('delete', old.id, old.title, old.description, old.final_prompt);
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS prompts_fts_update
+        AFTER UPDATE OF title, description, final_prompt ON prompts BEGIN
+          INSERT INTO prompts_fts(prompts_fts, rowid, title, description, final_prompt)
+          VALUES ('delete', old.id, old.title, old.description, old.final_prompt);
+          INSERT INTO prompts_fts(rowid, title, description, final_prompt)
+          VALUES (new.id, new.title, new.description, new.final_prompt);
+        END
+    """)
+    await db.execute("INSERT INTO prompts_fts(prompts_fts) VALUES ('rebuild')")
+
+
+async def create_mysql_fulltext(db):
+    """MySQL: 创建 ngram FULLTEXT 索引（首个全文索引需要重建表，期间只读）"""
+    if db.dialect != 'mysql':
+        return
+    existing = await db.get(
+        "SELECT 1 AS found FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = 'prompts' AND index_name = ? LIMIT 1",
+        [MYSQL_FULLTEXT_INDEX]
+    )
+    if existing:
+        return
+    await db.execute(
+        f"CREATE FULLTEXT INDEX {MYSQL_FULLTEXT_INDEX} "
+        f"ON prompts(title, description, final_prompt) WITH PARSER ngram"
+    )
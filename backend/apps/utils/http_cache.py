@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+JSON 接口的协商缓存（ETag / If-None-Match）
+
+- ETag 为强校验值：对组成部分（ID、内容摘要等）做 blake2b 摘要，不依赖响应体序列化结果，
+  因此可以在读取、序列化数据之前判断是否命中
+- 命中时直接返回 304（只带 ETag / Cache-Control / Vary），不生成响应体
+- 响应被压缩（见 apps.utils.compression）时 ETag 改为弱校验值（W/ 前缀），
+  304 按客户端保存的形式返回
+- 各接口的 Cache-Control 策略见下方常量；都是 private（响应依赖登录用户）或只读的公开配置
+"""
+
+import hashlib
+from typing import Optional
+
+from sanic.response import HTTPResponse
+
+# 每次使用前都需要协商（提示词详情、版本详情、全局AI设置：随时可能被修改，版本标签可以修改、版本可以删除）
+CACHE_REVALIDATE = 'private, no-cache'
+# 公开的服务端配置（认证方式等），短时间内直接使用缓存，过期后协商
+CACHE_PUBLIC_SHORT = 'public, max-age=300'
+
+
+def make_etag(*parts) -> str:
+    """由若干组成部分生成强 ETag（带引号）"""
+    digest = hashlib.blake2b(digest_size=12)
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\x00')
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(request, etag: Optional[str]) -> bool:
+    """请求的 If-None-Match 是否包含 etag（弱比较，支持逗号分隔的多个值和 *）"""
+    if not etag:
+        return False
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*' or tag == etag or (tag.startswith('W/') and tag[2:] == etag):
+            return True
+    return False
+
+
+def cache_headers(etag: Optional[str], cache_control: str) -> dict:
+    headers = {'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'}
+    if etag:
+        headers['ETag'] = etag
+    return headers
+
+
+def not_modified(request, etag: str, cache_control: str) -> HTTPResponse:
+    """304 响应（客户端保存的是压缩后响应的弱 ETag 时按弱 ETag 返回）"""
+    if f'W/{etag}' in request.headers.get('if-none-match', ''):
+        etag = f'W/{etag}'
+    return HTTPResponse(status=304, headers=cache_headers(etag, cache_control))
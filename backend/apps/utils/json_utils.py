@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+JSON序列化工具（优先使用 ujson）
+"""
+
+from functools import partial
+
+try:
+    import ujson as _json
+
+    _dumps = partial(_json.dumps, escape_forward_slashes=False)
+except ImportError:  # pragma: no cover - ujson 为可选依赖
+    import json as _json
+
+    _dumps = partial(_json.dumps, separators=(',', ':'))
+
+
+def json_dumps(obj, **kwargs):
+    """序列化为JSON字符串"""
+    return _dumps(obj, **kwargs)
+
+
+def json_loads(text):
+    """解析JSON字符串"""
+    return _json.loads(text)
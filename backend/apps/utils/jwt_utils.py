@@ -1,9 +1,20 @@
 """
 JWT工具类
 用于生成和验证JWT Token
+
+Token 中携带角色(role)、激活状态(active)和令牌版本(tv)声明；鉴权读取声明，并按用户当前的令牌版本
+（AuthService.get_token_state，缓存）判断Token是否已被登出/禁用吊销；
+需要最新用户状态的接口使用 AuthService.get_principal（短TTL缓存）
+
+验证通过的Token按 SHA-256 摘要放入LRU（摘要 -> (payload, exp)），同一会话的后续请求
+不再重复 HMAC 验证和声明解析；命中时仍按 exp 判断过期，与 jwt.decode 的判断一致
 """
 import jwt
 import datetime
+import hashlib
+import time
+import uuid
+from collections import OrderedDict
 from sanic.log import logger
 
 
@@ -14,15 +25,24 @@ class JWTUtil:
     SECRET_KEY = None
     ALGORITHM = 'HS256'
     
+    ROLE_ADMIN = 'admin'
+    ROLE_USER = 'user'
+    
+    # 已验证Token缓存 {Token的SHA-256摘要: (payload, exp)}
+    VERIFIED_CACHE_SIZE = 4096
+    _verified = OrderedDict()
+    
     @classmethod
     def init_app(cls, app):
         """初始化JWT配置"""
         cls.SECRET_KEY = app.config.get('SECRET_KEY', 'your-secret-key-change-in-production')
+        cls.VERIFIED_CACHE_SIZE = app.config.get('JWT_VERIFIED_CACHE_SIZE', cls.VERIFIED_CACHE_SIZE)
+        cls._verified.clear()
         if cls.SECRET_KEY == 'your-secret-key-change-in-production':
             logger.warning('⚠️  警告: 使用默认SECRET_KEY,生产环境请务必修改配置!')
     
     @classmethod
-    def generate_token(cls, user_id, open_id, expire_hours=24):
+    def generate_token(cls, user_id, open_id, expire_hours=24, is_admin=False, is_active=True, token_version=0):
         """
         生成JWT Token
         
@@ -30,6 +50,9 @@ class JWTUtil:
             user_id: 用户ID
             open_id: 飞书用户open_id
             expire_hours: 过期时间(小时),默认24小时
+            is_admin: 是否管理员(写入 role 声明)
+            is_active: 是否激活(写入 active 声明)
+            token_version: 用户当前的令牌版本(写入 tv 声明)
             
         Returns:
             str: JWT Token字符串
@@ -43,7 +66,12 @@ class JWTUtil:
                 'open_id': open_id,
                 'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=expire_hours),
                 'iat': datetime.datetime.utcnow(),
-                'type': 'access_token'
+                'type': 'access_token',
+                'role': cls.ROLE_ADMIN if is_admin else cls.ROLE_USER,
+                'active': bool(is_active),
+                'tv': int(token_version or 0),
+                # Token唯一ID，登出时按它吊销单个Token
+                'jti': uuid.uuid4().hex
             }
             
             token = jwt.encode(payload, cls.SECRET_KEY, algorithm=cls.ALGORITHM)
@@ -52,7 +80,7 @@ class JWTUtil:
             if isinstance(token, bytes):
                 token = token.decode('utf-8')
             
-            logger.debug(f'✅ 为用户 {user_id} 生成Token成功, 有效期: {expire_hours}小时')
+            logger.debug('✅ 为用户 %s 生成Token成功, 有效期: %s小时', user_id, expire_hours)
             return token
             
         except Exception as e:
@@ -68,15 +96,32 @@ class JWTUtil:
             token: JWT Token字符串
             
         Returns:
-            dict: 解码后的payload,包含user_id和open_id
+            dict: 解码后的payload,包含user_id和open_id(缓存中的同一对象,调用方不要修改)
             None: Token无效或过期
         """
         if not cls.SECRET_KEY:
             raise ValueError('SECRET_KEY未配置,请先调用init_app初始化')
         
+        key = hashlib.sha256(token.encode('utf-8')).digest()
+        entry = cls._verified.get(key)
+        if entry is not None:
+            payload, exp = entry
+            if exp is not None and exp <= time.time():
+                del cls._verified[key]
+                logger.warning('⚠️  Token已过期')
+                return None
+            cls._verified.move_to_end(key)
+            return payload
+        
         try:
             payload = jwt.decode(token, cls.SECRET_KEY, algorithms=[cls.ALGORITHM])
-            logger.debug(f'✅ Token验证成功, user_id: {payload.get("user_id")}')
+            logger.debug('✅ Token验证成功, user_id: %s', payload.get('user_id'))
+            
+            if cls.VERIFIED_CACHE_SIZE > 0:
+                exp = payload.get('exp')
+                cls._verified[key] = (payload, exp)
+                while len(cls._verified) > cls.VERIFIED_CACHE_SIZE:
+                    cls._verified.popitem(last=False)
             return payload
             
         except jwt.ExpiredSignatureError:
@@ -92,13 +137,28 @@ class JWTUtil:
             return None
     
     @classmethod
-    def refresh_token(cls, old_token, expire_hours=24):
+    def is_admin(cls, payload):
+        """
+        Token声明中是否为管理员
+        
+        Returns:
+            bool: 是否管理员
+            None: 旧版Token没有 role 声明,需要查询用户
+        """
+        role = payload.get('role')
+        if role is None:
+            return None
+        return role == cls.ROLE_ADMIN
+    
+    @classmethod
+    def refresh_token(cls, old_token, expire_hours=24, user=None):
         """
         刷新Token
         
         Args:
             old_token: 旧的JWT Token
             expire_hours: 新Token的过期时间(小时)
+            user: 当前用户信息(传入时按最新的角色、激活状态和令牌版本签发)
             
         Returns:
             str: 新的JWT Token
@@ -109,11 +169,23 @@ class JWTUtil:
         if not payload:
             return None
         
+        if user is not None:
+            is_admin = user.get('is_admin', 0) == 1
+            is_active = bool(user.get('is_active', 1))
+            token_version = user.get('token_version', 0)
+        else:
+            is_admin = bool(cls.is_admin(payload))
+            is_active = payload.get('active', True)
+            token_version = payload.get('tv', 0)
+        
         # 使用旧Token中的用户信息生成新Token
         return cls.generate_token(
             payload['user_id'],
             payload['open_id'],
-            expire_hours
+            expire_hours,
+            is_admin=is_admin,
+            is_active=is_active,
+            token_version=token_version
         )
     
     @classmethod
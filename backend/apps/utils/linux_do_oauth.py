@@ -4,20 +4,92 @@
 Linux.do OAuth 认证工具类
 实现标准OAuth2.0授权码流程
 文档: https://wiki.linux.do/Community/LinuxDoConnect
+
+请求通过进程内共享的 httpx.AsyncClient 发出（连接池复用、超时、连接失败重试、并发上限），
+不阻塞事件循环；LINUX_DO_CONNECT_URL 可指向本地的模拟OAuth服务用于测试
 """
 
-import requests
+import asyncio
+
+import httpx
 from sanic.log import logger
 from config.settings import Config
 
 
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'application/json'
+}
+
+
 class LinuxDoOAuth:
     """Linux.do OAuth2.0 认证类"""
     
-    # OAuth2 端点
-    AUTH_URL = 'https://connect.linux.do/oauth2/authorize'
-    TOKEN_URL = 'https://connect.linux.do/oauth2/token'
-    USER_INFO_URL = 'https://connect.linux.do/api/user'
+    # OAuth2 端点（相对 LINUX_DO_CONNECT_URL）
+    AUTH_PATH = '/oauth2/authorize'
+    TOKEN_PATH = '/oauth2/token'
+    USER_INFO_PATH = '/api/user'
+    
+    # 用户信息接口（GET，幂等）遇到这些状态码时重试
+    RETRY_STATUS = (502, 503, 504)
+    
+    # 进程内共享的HTTP客户端及并发限制
+    _client = None
+    _semaphore = None
+    
+    @classmethod
+    def _create_client(cls):
+        return httpx.AsyncClient(
+            base_url=Config.LINUX_DO_CONNECT_URL,
+            headers=HEADERS,
+            timeout=httpx.Timeout(Config.LINUX_DO_TIMEOUT, connect=min(Config.LINUX_DO_TIMEOUT, 5)),
+            limits=httpx.Limits(
+                max_connections=Config.LINUX_DO_MAX_CONCURRENCY,
+                max_keepalive_connections=Config.LINUX_DO_MAX_CONCURRENCY
+            ),
+            # 连接失败时重试（请求未发出，POST 也可以安全重试）
+            transport=httpx.AsyncHTTPTransport(retries=Config.LINUX_DO_RETRIES)
+        )
+    
+    @classmethod
+    def client(cls):
+        """共享的HTTP客户端（未通过 init_app 创建时按需创建）"""
+        if cls._client is None or cls._client.is_closed:
+            cls._client = cls._create_client()
+            cls._semaphore = asyncio.Semaphore(Config.LINUX_DO_MAX_CONCURRENCY)
+        return cls._client
+    
+    @classmethod
+    async def close(cls):
+        if cls._client is not None:
+            await cls._client.aclose()
+            cls._client = None
+    
+    @classmethod
+    def init_app(cls, app):
+        """注册到应用：启动时创建共享客户端，停止时关闭连接池"""
+        
+        @app.listener('before_server_start')
+        async def setup_linux_do_client(app, loop):
+            cls.client()
+        
+        @app.listener('after_server_stop')
+        async def close_linux_do_client(app, loop):
+            await cls.close()
+    
+    async def _request(self, method, path, retry_status=(), **kwargs):
+        """发送请求（受并发上限约束），retry_status 中的状态码按 LINUX_DO_RETRIES 次数重试"""
+        client = self.client()
+        attempts = Config.LINUX_DO_RETRIES + 1 if retry_status else 1
+        async with self._semaphore:
+            for attempt in range(attempts):
+                response = await client.request(method, path, **kwargs)
+                if response.status_code not in retry_status or attempt == attempts - 1:
+                    break
+                logger.warning(f'⚠️  Linux.do 返回 {response.status_code}，重试 {attempt + 1}/{attempts - 1}')
+                await asyncio.sleep(0.2 * 2 ** attempt)
+        response.raise_for_status()
+        return response.json()
     
     def __init__(self):
         """
@@ -61,12 +133,12 @@ class LinuxDoOAuth:
             params['state'] = state
         
         query_string = '&'.join(f'{k}={v}' for k, v in params.items())
-        auth_url = f'{self.AUTH_URL}?{query_string}'
+        auth_url = f'{Config.LINUX_DO_CONNECT_URL}{self.AUTH_PATH}?{query_string}'
         
         logger.info(f'📍 生成授权URL: {auth_url}')
         return auth_url
     
-    def get_access_token(self, code):
+    async def get_access_token(self, code):
         """
         使用授权码获取访问令牌
         
@@ -95,20 +167,8 @@ class LinuxDoOAuth:
             
             logger.info(f'🔑 请求访问令牌，code={code[:10]}...')
             
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': 'application/json'
-            }
-            
-            response = requests.post(
-                self.TOKEN_URL,
-                data=data,
-                headers=headers,
-                timeout=10
-            )
-            
-            response.raise_for_status()
-            token_data = response.json()
+            # 授权码只能使用一次，服务端错误时不重试（连接失败由传输层重试）
+            token_data = await self._request('POST', self.TOKEN_PATH, data=data)
             
             if 'access_token' not in token_data:
                 logger.error(f'❌ Token响应缺少access_token: {token_data}')
@@ -117,14 +177,14 @@ class LinuxDoOAuth:
             logger.info(f'✅ 成功获取访问令牌')
             return token_data
             
-        except requests.RequestException as e:
-            logger.error(f'❌ 请求Token失败: {e}')
+        except httpx.HTTPError as e:
+            logger.error(f'❌ 请求Token失败: {e!r}')
             raise Exception(f'获取访问令牌失败: {str(e)}')
         except ValueError as e:
             logger.error(f'❌ 解析Token响应失败: {e}')
             raise
     
-    def get_user_info(self, access_token):
+    async def get_user_info(self, access_token):
         """
         使用访问令牌获取用户信息
         
@@ -149,21 +209,12 @@ class LinuxDoOAuth:
         """
         try:
             headers = {
-                'Authorization': f'Bearer {access_token}',
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': 'application/json'
+                'Authorization': f'Bearer {access_token}'
             }
             
             logger.info(f'👤 请求用户信息')
             
-            response = requests.get(
-                self.USER_INFO_URL,
-                headers=headers,
-                timeout=10
-            )
-            
-            response.raise_for_status()
-            user_info = response.json()
+            user_info = await self._request('GET', self.USER_INFO_PATH, retry_status=self.RETRY_STATUS, headers=headers)
             
             if 'id' not in user_info:
                 logger.error(f'❌ 用户信息响应缺少id字段: {user_info}')
@@ -172,14 +223,14 @@ class LinuxDoOAuth:
             logger.info(f'✅ 成功获取用户信息: id={user_info["id"]}, username={user_info.get("username")}')
             return user_info
             
-        except requests.RequestException as e:
-            logger.error(f'❌ 请求用户信息失败: {e}')
+        except httpx.HTTPError as e:
+            logger.error(f'❌ 请求用户信息失败: {e!r}')
             raise Exception(f'获取用户信息失败: {str(e)}')
         except ValueError as e:
             logger.error(f'❌ 解析用户信息响应失败: {e}')
             raise
     
-    def get_user_by_code(self, code):
+    async def get_user_by_code(self, code):
         """
         一步完成：通过授权码获取用户信息
         
@@ -196,11 +247,11 @@ class LinuxDoOAuth:
         """
         try:
             # 1. 获取访问令牌
-            token_data = self.get_access_token(code)
+            token_data = await self.get_access_token(code)
             access_token = token_data['access_token']
             
             # 2. 获取用户信息
-            user_info = self.get_user_info(access_token)
+            user_info = await self.get_user_info(access_token)
             
             return user_info
             
@@ -248,7 +299,7 @@ class LinuxDoOAuth:
 
 
 # 便捷函数
-def get_linux_do_user_by_code(code):
+async def get_linux_do_user_by_code(code):
     """
     便捷函数：通过授权码获取Linux.do用户信息
     
@@ -259,4 +310,4 @@ def get_linux_do_user_by_code(code):
         dict: 用户信息
     """
     oauth = LinuxDoOAuth()
-    return oauth.get_user_by_code(code)
+    return await oauth.get_user_by_code(code)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+登录失败限流（防暴力破解）
+
+- 按用户名、按IP分别统计滑动窗口（LOGIN_FAILURE_WINDOW 秒）内的失败次数
+- 失败超过 FREE_FAILURES 次后，每次重试需要等待递增的时间（1s、2s、4s…最多 DELAY_MAX 秒）；
+  达到上限（用户名 LOGIN_MAX_FAILURES_USER 次 / IP LOGIN_MAX_FAILURES_IP 次）后锁定 LOGIN_LOCKOUT_SECONDS 秒
+- 检查在 bcrypt 校验之前进行，被拒绝的请求只有几次字典查找的开销
+- check() 允许尝试时先预留一次失败（校验进行中的请求同样计数），登录成功或校验出错时释放，
+  失败时预留的记录即为这次失败：并发的一批请求不能在任何失败记录之前全部通过检查
+- 默认计数保存在进程内（多 worker 时各自计数）；LOGIN_THROTTLE_BACKEND=cache 且缓存连接了 Redis 时
+  （见 apps.utils.cache），计数保存在 Redis 有序集合中，多进程/多实例共享
+- 登录成功只清除该用户名的失败记录，IP 的记录保留（不能用自己的账号登录一次来清除撞库IP的记录）
+- 客户端IP见 client_ip：配置了信任的反向代理时取转发的地址，否则取连接地址；
+  请求头不会让IP限流失效（应用在未配置的代理之后时所有请求共用代理地址，启动后首次遇到时记录警告）
+"""
+
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+from sanic.log import logger
+
+from apps.utils.cache import cache
+from config.settings import Config
+
+
+# 反向代理添加的转发头
+_FORWARDED_HEADERS = ('x-forwarded-for', 'x-real-ip', 'forwarded')
+
+
+class LoginAttempt:
+    """check() 预留的一次尝试"""
+
+    __slots__ = ('keys', 'time', 'member', 'shared')
+
+    def __init__(self, keys: List[str], now: float):
+        self.keys = keys
+        self.time = now
+        # Redis 有序集合中的成员
+        self.member = uuid.uuid4().hex
+        self.shared = False
+
+
+class LoginThrottle:
+    """登录失败限流"""
+
+    # 不需要等待的失败次数
+    FREE_FAILURES = 3
+    # 递增等待的基数及上限（秒）
+    DELAY_BASE = 1.0
+    DELAY_MAX = 30.0
+    # 已提示过代理未配置
+    _proxy_warned = False
+
+    def __init__(self, max_failures_user: int = 5, max_failures_ip: int = 20, window: float = 900,
+                 lockout: float = 900, backend: str = 'local', max_keys: int = 100000):
+        """
+        Args:
+            max_failures_user: 同一用户名在窗口内的失败上限，达到后锁定
+            max_failures_ip: 同一IP在窗口内的失败上限，达到后锁定
+            window: 统计窗口（秒）
+            lockout: 锁定时长（秒，从最后一次失败算起，不超过统计窗口）
+            backend: local（进程内）/ cache（缓存连接了 Redis 时共享计数，否则同 local）
+            max_keys: 进程内最多记录的用户名+IP数（超出时淘汰最久未失败的）
+        """
+        self.limits = {'user': max_failures_user, 'ip': max_failures_ip}
+        self.window = window
+        self.lockout = min(lockout, window)
+        self.backend = backend
+        self.max_keys = max_keys
+        # {键: deque[失败时间]}，按最近失败时间排序
+        self._failures: OrderedDict = OrderedDict()
+
+    @staticmethod
+    def client_ip(request) -> Optional[str]:
+        """
+        用于限流的客户端IP
+        
+        - 配置了信任的代理（PROXIES_COUNT / REAL_IP_HEADER / FORWARDED_SECRET）且解析出转发地址时取转发地址
+        - 否则取连接地址（request.ip）。客户端可以随意添加转发头，转发头只用于提示代理未配置，不影响限流
+        """
+        if request.remote_addr:
+            return request.remote_addr
+        config = request.app.config
+        trusted = config.PROXIES_COUNT or config.REAL_IP_HEADER or config.FORWARDED_SECRET
+        if not trusted and not LoginThrottle._proxy_warned \
+                and any(header in request.headers for header in _FORWARDED_HEADERS):
+            LoginThrottle._proxy_warned = True
+            logger.warning('⚠️  请求带有转发头但未配置 PROXIES_COUNT/REAL_IP_HEADER，'
+                           '如在反向代理之后，所有请求按代理地址共用IP限流')
+        return request.ip or None
+
+    @staticmethod
+    def _keys(username: Optional[str], ip: Optional[str]) -> List[str]:
+        keys = []
+        if username:
+            keys.append(f'user:{username.lower()}')
+        if ip:
+            keys.append(f'ip:{ip}')
+        return keys
+
+    def _retry_after(self, key: str, times, now: float) -> float:
+        """根据窗口内的失败时间计算还需等待的秒数"""
+        count = len(times)
+        if count >= self.limits[key.split(':', 1)[0]]:
+            wait = self.lockout
+        elif count >= self.FREE_FAILURES:
+            wait = min(self.DELAY_BASE * 2 ** (count - self.FREE_FAILURES), self.DELAY_MAX)
+        else:
+            return 0
+        return max(times[-1] + wait - now, 0)
+
+    def _shared(self):
+        return cache.redis if self.backend == 'cache' else None
+
+    def _redis_key(self, key: str) -> str:
+        return f'{cache.prefix}login:{key}'
+
+    # ============ 进程内计数 ============
+
+    def _local_times(self, key: str, now: float):
+        times = self._failures.get(key)
+        if times is None:
+            return ()
+        while times and times[0] <= now - self.window:
+            times.popleft()
+        if not times:
+            del self._failures[key]
+        return times
+
+    def _local_add(self, keys: List[str], now: float):
+        for key in keys:
+            times = self._failures.get(key)
+            if times is None:
+                times = self._failures[key] = deque()
+            times.append(now)
+            self._failures.move_to_end(key)
+        while len(self._failures) > self.max_keys:
+            self._failures.popitem(last=False)
+
+    def _local_remove(self, keys: List[str], now: float):
+        for key in keys:
+            times = self._failures.get(key)
+            if times is None:
+                continue
+            try:
+                times.remove(now)
+            except ValueError:
+                pass
+            if not times:
+                del self._failures[key]
+
+    # ============ 共享计数（Redis 有序集合，成员为唯一ID，分数为失败时间）============
+
+    async def _shared_reserve(self, redis, attempt: LoginAttempt) -> Dict[str, list]:
+        """
+        预留一次尝试，返回预留之前窗口内的失败时间
+        （MULTI/EXEC 中读取并写入，并发请求依次看到之前的预留）
+        """
+        async with redis.pipeline(transaction=True) as pipe:
+            for key in attempt.keys:
+                redis_key = self._redis_key(key)
+                pipe.zremrangebyscore(redis_key, 0, attempt.time - self.window)
+                pipe.zrange(redis_key, 0, -1, withscores=True)
+                pipe.zadd(redis_key, {attempt.member: attempt.time})
+                pipe.expire(redis_key, int(self.window) + 1)
+            results = await pipe.execute()
+        return {key: sorted(score for _, score in results[i * 4 + 1]) for i, key in enumerate(attempt.keys)}
+
+    async def _shared_remove(self, redis, attempt: LoginAttempt):
+        async with redis.pipeline(transaction=False) as pipe:
+            for key in attempt.keys:
+                pipe.zrem(self._redis_key(key), attempt.member)
+            await pipe.execute()
+
+    # ============ 接口 ============
+
+    async def check(self, username: Optional[str], ip: Optional[str]) -> Tuple[float, Optional[LoginAttempt]]:
+        """
+        登录前检查（在校验密码之前调用），允许尝试时预留一次失败
+
+        校验失败时预留的记录即为这次失败；登录成功或校验出错时须调用 release() 释放
+
+        Returns:
+            tuple: (需要等待的秒数, 预留的尝试)，等待秒数大于 0 时不允许尝试，预留为 None
+        """
+        attempt = LoginAttempt(self._keys(username, ip), time.time())
+        now = attempt.time
+        redis = self._shared()
+        if redis is not None:
+            try:
+                times = await self._shared_reserve(redis, attempt)
+                retry_after = max((self._retry_after(key, times[key], now) for key in attempt.keys), default=0)
+                if retry_after > 0:
+                    await self._shared_remove(redis, attempt)
+                    return retry_after, None
+                attempt.shared = True
+                self._local_add(attempt.keys, now)
+                return 0, attempt
+            except Exception as e:
+                logger.warning(f'⚠️  登录限流读取Redis失败，使用进程内计数: {e}')
+        # 进程内计数：检查与预留之间没有 await，并发请求依次看到之前的预留
+        retry_after = max((self._retry_after(key, self._local_times(key, now), now) for key in attempt.keys), default=0)
+        if retry_after > 0:
+            return retry_after, None
+        self._local_add(attempt.keys, now)
+        return 0, attempt
+
+    async def release(self, attempt: Optional[LoginAttempt]):
+        """释放 check() 预留的尝试（登录成功、或校验出错未得出结果时调用）"""
+        if attempt is None:
+            return
+        self._local_remove(attempt.keys, attempt.time)
+        redis = self._shared()
+        if attempt.shared and redis is not None:
+            try:
+                await self._shared_remove(redis, attempt)
+            except Exception as e:
+                logger.warning(f'⚠️  登录限流清除Redis记录失败: {e}')
+
+    async def reset(self, username: str):
+        """登录成功后清除该用户名的失败记录"""
+        keys = self._keys(username, None)
+        for key in keys:
+            self._failures.pop(key, None)
+        redis = self._shared()
+        if redis is not None:
+            try:
+                await redis.delete(*[self._redis_key(key) for key in keys])
+            except Exception as e:
+                logger.warning(f'⚠️  登录限流清除Redis记录失败: {e}')
+
+
+login_throttle = LoginThrottle(
+    max_failures_user=Config.LOGIN_MAX_FAILURES_USER,
+    max_failures_ip=Config.LOGIN_MAX_FAILURES_IP,
+    window=Config.LOGIN_FAILURE_WINDOW,
+    lockout=Config.LOGIN_LOCKOUT_SECONDS,
+    backend=Config.LOGIN_THROTTLE_BACKEND
+)
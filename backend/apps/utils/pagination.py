@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+游标（keyset）分页
+按 (排序字段, id) 定位下一页，深翻页与首页同样快，不需要 OFFSET 扫描和 COUNT(*)
+
+游标为 base64url 编码的 JSON: {"s": 排序方式, "v": 最后一行的排序值, "id": 最后一行的id}
+排序值为时间时统一保存为 'YYYY-MM-DD HH:MM:SS' 字符串（MySQL 的 DATETIME 列返回 datetime 对象，
+SQLite/PostgreSQL 返回字符串），解析后的字符串可直接作为参数与时间列比较
+"""
+
+import base64
+import json
+from typing import Any, List, Optional, Tuple
+
+
+class InvalidCursor(ValueError):
+    """游标格式错误或与当前排序方式不匹配"""
+
+
+def encode_cursor(sort: str, value: Any, row_id: int) -> str:
+    """生成游标（datetime/Decimal 等排序值按 str() 保存）"""
+    raw = json.dumps({'s': sort, 'v': value, 'id': row_id}, ensure_ascii=False, separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, int]:
+    """
+    解析游标
+
+    Returns:
+        tuple: (排序值, id)
+
+    Raises:
+        InvalidCursor: 游标无效或排序方式不一致
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        value, row_id = data['v'], int(data['id'])
+    except Exception:
+        raise InvalidCursor('无效的分页游标')
+    if data.get('s') != sort:
+        raise InvalidCursor('分页游标与排序方式不一致')
+    return value, row_id
+
+
+def keyset_condition(column: str, id_column: str, value: Any, row_id: int) -> Tuple[str, List]:
+    """
+    降序排列时"下一页"的WHERE条件
+
+    写成 col <= ? AND (col < ? OR id < ?)：前半部分给出索引范围的上界，
+    单纯的 col < ? OR (col = ? AND id < ?) 在 SQLite/MySQL 上会退化为从头扫描；
+    行值比较 (col, id) < (?, ?) 在 MySQL 上同样无法有效利用索引
+
+    Returns:
+        tuple: (条件SQL, 参数列表)
+    """
+    if value is None:
+        # 排序值为NULL的行在降序的最后（SQLite/MySQL），只按id继续
+        return f"({column} IS NULL AND {id_column} < ?)", [row_id]
+    return (
+        f"({column} <= ? AND ({column} < ? OR {id_column} < ?))",
+        [value, value, row_id]
+    )
+
+
+def next_cursor(rows: list, limit: int, sort: str, column: str) -> Tuple[list, Optional[str]]:
+    """
+    根据多取的一行判断是否还有下一页（查询时 LIMIT limit + 1）
+
+    Returns:
+        tuple: (当前页数据, 下一页游标或None)
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(sort, last[column], last['id'])
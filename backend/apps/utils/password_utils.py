@@ -3,15 +3,72 @@
 """
 密码工具类
 用于本地用户名密码认证
+
+bcrypt（12轮约250ms）在专用的有界线程池中执行（bcrypt 计算期间释放GIL），不阻塞事件循环；
+排队的任务超过 PASSWORD_HASH_QUEUE 时直接拒绝（PasswordHashBusy），避免登录洪峰堆积
 """
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
 import bcrypt
 from sanic.log import logger
 
+from config.settings import Config
+
+
+class PasswordHashBusy(RuntimeError):
+    """密码哈希线程池排队已满"""
+
 
 class PasswordUtil:
     """密码哈希和验证工具"""
     
+    # bcrypt 线程池大小及排队上限（等待中的任务数，不含执行中的）
+    WORKERS = Config.PASSWORD_HASH_WORKERS
+    QUEUE_LIMIT = Config.PASSWORD_HASH_QUEUE
+    _executor = None
+    _pending = 0
+    
+    @classmethod
+    def init_app(cls, app):
+        """注册到应用：读取线程池配置，服务停止后关闭线程池"""
+        cls.WORKERS = app.config.get('PASSWORD_HASH_WORKERS', cls.WORKERS)
+        cls.QUEUE_LIMIT = app.config.get('PASSWORD_HASH_QUEUE', cls.QUEUE_LIMIT)
+        
+        @app.listener('after_server_stop')
+        async def stop_password_executor(app, loop):
+            if cls._executor is not None:
+                cls._executor.shutdown(wait=False, cancel_futures=True)
+                cls._executor = None
+    
+    @classmethod
+    async def _run(cls, func, *args):
+        """在 bcrypt 线程池中执行"""
+        if cls._pending >= cls.WORKERS + cls.QUEUE_LIMIT:
+            raise PasswordHashBusy('密码校验请求过多，请稍后再试')
+        if cls._executor is None:
+            cls._executor = ThreadPoolExecutor(cls.WORKERS, thread_name_prefix='bcrypt')
+        cls._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(cls._executor, func, *args)
+        finally:
+            cls._pending -= 1
+    
+    @classmethod
+    async def hash_password_async(cls, password):
+        """hash_password 的异步版本（在 bcrypt 线程池中执行）"""
+        if not password:
+            raise ValueError('密码不能为空')
+        return await cls._run(cls.hash_password, password)
+    
+    @classmethod
+    async def verify_password_async(cls, password, password_hash):
+        """verify_password 的异步版本（在 bcrypt 线程池中执行）"""
+        if not password or not password_hash:
+            return False
+        return await cls._run(cls.verify_password, password, password_hash)
+    
     @staticmethod
     def hash_password(password):
         """
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+进程内只读快照（全局AI设置等极少修改、每次页面加载都读取的数据）
+
+- 读取直接返回内存中的快照，不访问数据库和 Redis
+- 快照记录加载时缓存标签的版本（见 apps.utils.cache），写路径 invalidate 标签后下次读取重新加载；
+  Redis 模式下其他进程的失效经 pub/sub 更新本地标签版本
+- 超过 max_age（默认 CACHE_LOCAL_TTL）也重新加载，兜底 local 模式多进程部署及失效通知丢失
+- 快照冻结为只读结构（dict -> FrozenDict，list -> tuple），调用方需要修改时先复制
+- etag 为快照内容的摘要（每次加载后首次读取时计算），供接口做协商缓存
+"""
+
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable, Optional
+
+from apps.utils.cache import cache
+from apps.utils.http_cache import make_etag
+
+
+class FrozenDict(dict):
+    """只读 dict（仍是 dict 子类，可直接JSON序列化）"""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('快照为只读数据，请先复制: dict(snapshot)')
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _readonly
+
+    def __hash__(self):
+        return id(self)
+
+
+def freeze(value):
+    """递归冻结 dict/list"""
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class Snapshot:
+    """按缓存标签失效的进程内快照"""
+
+    def __init__(self, tag: str, max_age: Optional[float] = None):
+        """
+        Args:
+            tag: 失效标签（写路径调用 cache.invalidate(tag)）
+            max_age: 快照最长使用时间（秒），默认 cache.local_ttl
+        """
+        self.tag = tag
+        self.max_age = max_age
+        self._value = None
+        self._version = None
+        self._expires_at = 0.0
+        self._etag = None
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> bool:
+        return (
+            self._version is not None
+            and self._version == cache.tag_version(self.tag)
+            and self._expires_at > time.monotonic()
+        )
+
+    async def get(self, loader: Callable[[], Awaitable]):
+        """
+        读取快照（过期时重新加载，并发读取只加载一次）
+
+        Args:
+            loader: 无参协程函数，返回快照数据
+        """
+        if self._fresh():
+            return self._value
+        async with self._lock:
+            if self._fresh():
+                return self._value
+            # 先取版本再加载：加载期间的失效会让这次结果立即过期
+            version = cache.tag_version(self.tag)
+            value = freeze(await loader())
+            max_age = cache.local_ttl if self.max_age is None else self.max_age
+            self._value, self._version, self._expires_at = value, version, time.monotonic() + max_age
+            self._etag = None
+            return value
+
+    @property
+    def etag(self) -> Optional[str]:
+        """当前快照内容的 ETag（未加载时为 None）"""
+        if self._etag is None and self._version is not None:
+            content = json.dumps(self._value, sort_keys=True, ensure_ascii=False, default=str)
+            self._etag = make_etag(self.tag, content)
+        return self._etag
+
+    def clear(self):
+        self._value = None
+        self._version = None
+        self._etag = None
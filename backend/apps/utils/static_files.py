@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+前端静态文件服务（Docker 单容器部署，前面没有 CDN）
+
+- 启动时扫描 STATIC_PATH 生成内存清单：文件内容、ETag、Content-Type，以及预先压缩好的 gzip / br 版本
+  （安装了 brotli 时生成 br；构建产物中已有 .gz / .br 文件时直接使用），请求时只做字典查找
+- 文件名带内容哈希的资源（Vite 构建的 assets/name-[hash].js）返回 Cache-Control: immutable，
+  其余文件（index.html 等）返回 no-cache，由浏览器用 ETag 协商（命中返回 304）
+- 超过 STATIC_MAX_MEMORY_SIZE 的文件不读入内存，仍从磁盘发送
+- 构建产物在容器内不会变化，清单只在启动时生成
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from typing import Dict, Optional
+
+from sanic.response import HTTPResponse, file as file_response, raw
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli 为可选依赖
+    brotli = None
+
+
+# 内容哈希文件名：name-[hash].ext / name.[hash].ext（Vite 默认 8 位 base64url 哈希）
+_HASHED_NAME_RE = re.compile(r'[-.][A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$')
+
+# 值得压缩的类型
+_COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'application/xml',
+                       'image/svg+xml', 'application/wasm', 'application/manifest+json')
+
+CACHE_IMMUTABLE = 'public, max-age=31536000, immutable'
+CACHE_REVALIDATE = 'no-cache'
+
+
+class StaticAsset:
+    """清单中的单个文件"""
+
+    __slots__ = ('path', 'content_type', 'etag', 'cache_control', 'body', 'variants')
+
+    def __init__(self, path: str, content_type: str, etag: str, cache_control: str,
+                 body: Optional[bytes] = None, variants: Optional[Dict[str, bytes]] = None):
+        self.path = path
+        self.content_type = content_type
+        self.etag = etag
+        self.cache_control = cache_control
+        # 内容（None 表示文件过大，从磁盘发送）
+        self.body = body
+        # {编码: 压缩后的内容}
+        self.variants = variants or {}
+
+
+class StaticManifest:
+    """静态文件内存清单"""
+
+    # 小于该大小的文件不压缩
+    MIN_COMPRESS_SIZE = 1024
+    # 按优先顺序尝试的编码
+    ENCODINGS = ('br', 'gzip')
+
+    def __init__(self, root: str, max_memory_size: int = 4 * 1024 * 1024):
+        self.root = os.path.abspath(root)
+        self.max_memory_size = max_memory_size
+        # {URL路径（不含开头的 /）: StaticAsset}
+        self.assets: Dict[str, StaticAsset] = {}
+
+    @staticmethod
+    def is_hashed(name: str) -> bool:
+        return bool(_HASHED_NAME_RE.search(name))
+
+    @staticmethod
+    def _compressible(content_type: str) -> bool:
+        return content_type.startswith(_COMPRESSIBLE_TYPES)
+
+    def _compress(self, full_path: str, body: bytes) -> Dict[str, bytes]:
+        variants = {}
+        # 构建产物中已有的预压缩文件
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if os.path.isfile(full_path + suffix):
+                with open(full_path + suffix, 'rb') as fp:
+                    variants[encoding] = fp.read()
+        if 'br' not in variants and brotli is not None:
+            variants['br'] = brotli.compress(body, quality=11)
+        if 'gzip' not in variants:
+            variants['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+        # 压缩后没有变小的不保留
+        return {encoding: data for encoding, data in variants.items() if len(data) < len(body)}
+
+    def _load(self, full_path: str, name: str) -> StaticAsset:
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type == 'application/javascript':
+            content_type += '; charset=utf-8'
+        cache_control = CACHE_IMMUTABLE if self.is_hashed(name) else CACHE_REVALIDATE
+
+        size = os.path.getsize(full_path)
+        if size > self.max_memory_size:
+            stat = os.stat(full_path)
+            etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+            return StaticAsset(full_path, content_type, etag, cache_control)
+
+        with open(full_path, 'rb') as fp:
+            body = fp.read()
+        etag = f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+        variants = {}
+        if size >= self.MIN_COMPRESS_SIZE and self._compressible(content_type):
+            variants = self._compress(full_path, body)
+        return StaticAsset(full_path, content_type, etag, cache_control, body, variants)
+
+    def scan(self) -> 'StaticManifest':
+        """扫描目录生成清单"""
+        assets = {}
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                full_path = os.path.join(dirpath, filename)
+                # 预压缩文件作为原文件的编码版本，不单独提供
+                if filename.endswith(('.gz', '.br')) and os.path.isfile(full_path[:-3]):
+                    continue
+                name = os.path.relpath(full_path, self.root).replace(os.sep, '/')
+                assets[name] = self._load(full_path, name)
+        self.assets = assets
+        return self
+
+    def get(self, path: str) -> Optional[StaticAsset]:
+        return self.assets.get(path.lstrip('/'))
+
+    @property
+    def size(self) -> int:
+        """清单占用的内存（字节）"""
+        return sum(len(asset.body or b'') + sum(map(len, asset.variants.values()))
+                   for asset in self.assets.values())
+
+    async def response(self, request, asset: StaticAsset) -> HTTPResponse:
+        """返回文件（协商缓存 + 按 Accept-Encoding 选择预压缩版本）"""
+        headers = {'ETag': asset.etag, 'Cache-Control': asset.cache_control}
+        if asset.variants:
+            headers['Vary'] = 'Accept-Encoding'
+
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match and asset.etag in (tag.strip().replace('W/', '', 1) for tag in if_none_match.split(',')):
+            return HTTPResponse(status=304, headers=headers)
+
+        if asset.body is None:
+            return await file_response(asset.path, mime_type=asset.content_type, headers=headers)
+
+        accept_encoding = request.headers.get('accept-encoding', '')
+        for encoding in self.ENCODINGS:
+            if encoding in asset.variants and encoding in accept_encoding:
+                headers['Content-Encoding'] = encoding
+                return raw(asset.variants[encoding], content_type=asset.content_type, headers=headers)
+        return raw(asset.body, content_type=asset.content_type, headers=headers)
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+提示词标签工具
+- prompts.tags 仍保存逗号分隔的标签字符串（列表展示、版本快照直接使用）
+- prompt_tag_map(prompt_id, tag_id) 为规范化的映射表，按标签筛选、统计标签下的提示词数量都走索引
+- 创建/更新/回滚提示词时调用 sync_prompt_tags 保持两者一致，并维护 prompt_tags.use_count
+  （使用该标签的提示词数量）：新增标签 +1，移除标签 -1，删除提示词前调用 release_prompt_tags
+- 写入均为集合操作（IN 列表 / 多行插入），与标签数量无关，只需固定的几条SQL
+- 映射和计数按解析出的标签ID去重：MySQL（utf8mb4_unicode_ci）下大小写不同的标签名是同一标签
+"""
+
+import ast
+import json
+from typing import Iterable, List, Tuple, Union
+
+from sanic.log import logger
+
+
+# 与 prompt_tags.tag_name 列宽一致
+MAX_TAG_LENGTH = 50
+
+# 回填时每批处理的提示词数量
+BACKFILL_BATCH_SIZE = 500
+
+
+def split_tags(value: Union[str, Iterable[str], None]) -> List[str]:
+    """
+    解析标签，返回去重后的标签列表（保持原顺序）
+
+    兼容历史数据中的几种格式：
+    - 逗号分隔: "ai,mail"
+    - JSON列表: '["ai", "mail"]'
+    - Python列表字符串: "['ai', 'mail']"
+    """
+    if not value:
+        return []
+
+    if isinstance(value, str):
+        text = value.strip()
+        items = None
+        if text.startswith('[') and text.endswith(']'):
+            for parse in (json.loads, ast.literal_eval):
+                try:
+                    parsed = parse(text)
+                except (ValueError, SyntaxError):
+                    continue
+                if isinstance(parsed, (list, tuple)):
+                    items = parsed
+                    break
+            if items is None:
+                items = text[1:-1].split(',')
+        else:
+            items = text.split(',')
+    else:
+        items = value
+
+    tags = []
+    for item in items:
+        if item is None:
+            continue
+        tag = str(item).strip().strip('\'"').strip()
+        if tag:
+            tags.append(tag[:MAX_TAG_LENGTH])
+    return list(dict.fromkeys(tags))
+
+
+def join_tags(tags: Union[str, Iterable[str], None]) -> str:
+    """标签列表转为 prompts.tags 中保存的逗号分隔字符串"""
+    return ','.join(split_tags(tags))
+
+
+def tag_filter_condition(user_id: int, tag: str) -> Tuple[str, list]:
+    """
+    按标签筛选提示词的WHERE条件（精确匹配标签名，走 uk_user_tag 与 idx_tag_map_tag 索引）
+
+    Returns:
+        tuple: (条件SQL, 参数列表)
+    """
+    return (
+        "id IN (SELECT m.prompt_id FROM prompt_tag_map m "
+        "JOIN prompt_tags t ON t.id = m.tag_id WHERE t.user_id = ? AND t.tag_name = ?)",
+        [user_id, tag.strip()[:MAX_TAG_LENGTH]]
+    )
+
+
+def _placeholders(count: int) -> str:
+    return ', '.join(['?'] * count)
+
+
+def _insert_ignore_sql(db, table: str, columns: Tuple[str, ...]) -> str:
+    """插入单行，唯一键冲突时忽略"""
+    values = _placeholders(len(columns))
+    column_sql = ', '.join(columns)
+    if db.dialect == 'mysql':
+        return f"INSERT IGNORE INTO {table} ({column_sql}) VALUES ({values})"
+    if db.dialect == 'postgres':
+        return f"INSERT INTO {table} ({column_sql}) VALUES ({values}) ON CONFLICT DO NOTHING"
+    return f"INSERT OR IGNORE INTO {table} ({column_sql}) VALUES ({values})"
+
+
+async def ensure_tag_ids(db, user_id: int, tags: List[str]) -> dict:
+    """
+    获取标签ID，不存在的标签以 use_count=0 创建
+
+    Returns:
+        dict: {标签名: 标签ID}
+    """
+    if not tags:
+        return {}
+
+    sql = (
+        "SELECT id, tag_name FROM prompt_tags WHERE user_id = ? AND tag_name IN (" +
+        _placeholders(len(tags)) + ")"
+    )
+    rows = await db.query(sql, [user_id, *tags])
+    tag_ids = {row['tag_name']: row['id'] for row in rows}
+
+    missing = [tag for tag in tags if tag not in tag_ids]
+    if missing:
+        insert_sql = _insert_ignore_sql(db, 'prompt_tags', ('tag_name', 'user_id', 'use_count'))
+        for tag in missing:
+            await db.execute(insert_sql, [tag, user_id, 0])
+        rows = await db.query(
+            "SELECT id, tag_name FROM prompt_tags WHERE user_id = ? AND tag_name IN (" +
+            _placeholders(len(missing)) + ")",
+            [user_id, *missing]
+        )
+        tag_ids.update({row['tag_name']: row['id'] for row in rows})
+
+    # MySQL 的 utf8mb4_unicode_ci 排序规则下标签名不区分大小写，按小写补齐
+    if len(tag_ids) < len(tags):
+        lowered = {name.lower(): tag_id for name, tag_id in tag_ids.items()}
+        for tag in tags:
+            if tag not in tag_ids and tag.lower() in lowered:
+                tag_ids[tag] = lowered[tag.lower()]
+
+    return tag_ids
+
+
+async def increment_tag_counts(db, tag_ids: List[int]):
+    """批量增加标签计数"""
+    if not tag_ids:
+        return
+    await db.execute(
+        "UPDATE prompt_tags SET use_count = use_count + 1 WHERE id IN (" + _placeholders(len(tag_ids)) + ")",
+        list(tag_ids)
+    )
+
+
+async def decrement_tag_counts(db, tag_ids: List[int]):
+    """批量减少标签计数（不低于0）"""
+    if not tag_ids:
+        return
+    await db.execute(
+        "UPDATE prompt_tags SET use_count = CASE WHEN use_count > 0 THEN use_count - 1 ELSE 0 END "
+        "WHERE id IN (" + _placeholders(len(tag_ids)) + ")",
+        list(tag_ids)
+    )
+
+
+async def sync_prompt_tags(db, user_id: int, prompt_id: int, tags) -> Tuple[List[str], List[str]]:
+    """
+    将提示词的标签映射同步为给定的标签集合，并更新标签计数
+
+    标签不变时只有一次查询；有变化时最多再执行7条SQL（与标签数量无关），
+    调用方应放在保存提示词的事务中
+
+    Args:
+        db: 数据库适配器
+        user_id: 提示词所属用户
+        prompt_id: 提示词ID
+        tags: 标签列表或标签字符串
+
+    Returns:
+        tuple: (新增的标签, 移除的标签)
+    """
+    tags = split_tags(tags)
+
+    current_rows = await db.query(
+        "SELECT m.tag_id, t.tag_name FROM prompt_tag_map m "
+        "JOIN prompt_tags t ON t.id = m.tag_id WHERE m.prompt_id = ?",
+        [prompt_id]
+    )
+    current = {row['tag_name']: row['tag_id'] for row in current_rows}
+    if set(tags) == set(current):
+        return [], []
+
+    # 按标签ID去重（MySQL 下 "AI" 与 "ai" 解析为同一ID，只计数一次、只有一条映射）
+    tag_ids = await ensure_tag_ids(db, user_id, tags)
+    wanted = {}
+    for tag in tags:
+        wanted.setdefault(tag_ids[tag], tag)
+    current_ids = set(current.values())
+
+    added_ids = [tag_id for tag_id in wanted if tag_id not in current_ids]
+    added = [wanted[tag_id] for tag_id in added_ids]
+    removed = [tag for tag, tag_id in current.items() if tag_id not in wanted]
+
+    if removed:
+        removed_ids = [current[tag] for tag in removed]
+        await db.execute(
+            "DELETE FROM prompt_tag_map WHERE prompt_id = ? AND tag_id IN (" +
+            _placeholders(len(removed_ids)) + ")",
+            [prompt_id, *removed_ids]
+        )
+        await decrement_tag_counts(db, removed_ids)
+
+    if added_ids:
+        await increment_tag_counts(db, added_ids)
+        await db.execute(
+            "INSERT INTO prompt_tag_map (prompt_id, tag_id) VALUES " + ', '.join(['(?, ?)'] * len(added_ids)),
+            [value for tag_id in added_ids for value in (prompt_id, tag_id)]
+        )
+
+    if added or removed:
+        logger.debug(f'✅ 同步标签: prompt_id={prompt_id}, added={added}, removed={removed}')
+
+    return added, removed
+
+
+async def release_prompt_tags(db, prompt_id: int):
+    """删除提示词前调用：减少其标签的计数（映射行随提示词级联删除）"""
+    rows = await db.query("SELECT tag_id FROM prompt_tag_map WHERE prompt_id = ?", [prompt_id])
+    await decrement_tag_counts(db, [row['tag_id'] for row in rows])
+
+
+# ==========================================
+# 迁移步骤
+# ==========================================
+
+async def backfill_prompt_tag_map(db):
+    """从 prompts.tags 回填 prompt_tag_map（按id分批，可重复执行）"""
+    last_id = 0
+    total = 0
+    while True:
+        rows = await db.query(
+            "SELECT id, user_id, tags FROM prompts WHERE id > ? AND tags IS NOT NULL AND tags <> '' "
+            "ORDER BY id LIMIT " + str(BACKFILL_BATCH_SIZE),
+            [last_id]
+        )
+        if not rows:
+            break
+
+        for row in rows:
+            tags = split_tags(row['tags'])
+            if not tags:
+                continue
+            tag_ids = await ensure_tag_ids(db, row['user_id'], tags)
+            insert_sql = _insert_ignore_sql(db, 'prompt_tag_map', ('prompt_id', 'tag_id'))
+            for tag in tags:
+                await db.execute(insert_sql, [row['id'], tag_ids[tag]])
+            total += 1
+
+        last_id = rows[-1]['id']
+
+    logger.info(f'✅ 标签映射回填完成: {total} 个提示词')
+
@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+服务端文本差异计算（版本对比）
+
+- 先按行比较，再对改动的行块按词/字符细化（granularity=word/char），
+  中日韩文字没有空格分词，按单字作为词处理
+- 结果为紧凑的 hunk 列表（只含改动及其前后 context 行）和增删统计，不再返回两份完整文本
+- 输入较大时交给进程池计算（difflib 为纯Python实现，会长时间占用事件循环）
+- 版本内容不可变，同一对版本的结果放入LRU缓存
+"""
+
+import asyncio
+import difflib
+import json
+import multiprocessing
+import re
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+from sanic.log import logger
+
+from apps.utils.tag_utils import split_tags
+
+
+GRANULARITIES = ('line', 'word', 'char')
+
+# 细化的行块超过该字符数时不再细化（只给出整行的删除/新增）
+MAX_REFINE_CHARS = 20000
+
+# 列表字段：对比时每项一行（数据库中 thinking_points/advice 为JSON，tags 为逗号分隔）
+LIST_FIELDS = ('thinking_points', 'advice', 'tags')
+
+# 版本变更摘要的最大长度（prompt_versions.diff_summary 列宽）
+SUMMARY_LENGTH = 255
+
+# 中日韩单字 / 其他连续字母数字 / 连续空白 / 其他单个字符
+_CJK = r'\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af\uf900-\ufaff'
+_WORD_RE = re.compile(rf'[{_CJK}]|(?:(?![{_CJK}])\w)+|\s+|.', re.DOTALL)
+
+
+def _tokenize(text: str, granularity: str) -> List[str]:
+    if granularity == 'char':
+        return list(text)
+    return _WORD_RE.findall(text)
+
+
+def _append(ops: List[list], op: str, text: str):
+    """追加操作，与前一个同类操作合并"""
+    if not text:
+        return
+    if ops and ops[-1][0] == op:
+        ops[-1][1] += text
+    else:
+        ops.append([op, text])
+
+
+def _refine(ops: List[list], old: str, new: str, granularity: str):
+    """对替换的行块按词/字符细化"""
+    if granularity == 'line' or len(old) + len(new) > MAX_REFINE_CHARS:
+        _append(ops, '-', old)
+        _append(ops, '+', new)
+        return
+    a = _tokenize(old, granularity)
+    b = _tokenize(new, granularity)
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            _append(ops, '=', ''.join(a[i1:i2]))
+        else:
+            _append(ops, '-', ''.join(a[i1:i2]))
+            _append(ops, '+', ''.join(b[j1:j2]))
+
+
+def _line_count(text: str) -> int:
+    return len(text.splitlines())
+
+
+def diff_text(old: Optional[str], new: Optional[str], granularity: str = 'line', context: int = 3) -> dict:
+    """
+    计算两段文本的差异
+
+    Args:
+        granularity: line / word / char（word、char 只细化改动的行块）
+        context: 每个 hunk 保留的上下文行数
+
+    Returns:
+        dict: {
+            'hunks': [{'from_line', 'to_line', 'ops': [[op, text], ...]}],  # 行号从0开始，op 为 = / - / +
+            'stats': {'lines_added', 'lines_removed', 'chars_added', 'chars_removed'}
+        }
+    """
+    old = old or ''
+    new = new or ''
+    a = old.splitlines(keepends=True)
+    b = new.splitlines(keepends=True)
+    stats = {'lines_added': 0, 'lines_removed': 0, 'chars_added': 0, 'chars_removed': 0}
+
+    # 行级比较，equal 块按 context 截取，块之间距离较远时拆分为多个 hunk
+    hunks = []
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    for group in matcher.get_grouped_opcodes(context):
+        ops = []
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                _append(ops, '=', ''.join(a[i1:i2]))
+                continue
+            stats['lines_removed'] += i2 - i1
+            stats['lines_added'] += j2 - j1
+            if tag == 'replace':
+                _refine(ops, ''.join(a[i1:i2]), ''.join(b[j1:j2]), granularity)
+            else:
+                _append(ops, '-', ''.join(a[i1:i2]))
+                _append(ops, '+', ''.join(b[j1:j2]))
+        hunks.append({'from_line': group[0][1], 'to_line': group[0][3], 'ops': ops})
+
+    for hunk in hunks:
+        for op, text in hunk['ops']:
+            if op == '+':
+                stats['chars_added'] += len(text)
+            elif op == '-':
+                stats['chars_removed'] += len(text)
+
+    return {'hunks': hunks, 'stats': stats}
+
+
+def diff_fields(pairs: Dict[str, Tuple[Optional[str], Optional[str]]], granularity: str = 'line',
+                context: int = 3) -> Dict[str, dict]:
+    """批量计算多个字段的差异（内容相同的字段跳过），可在进程池中执行"""
+    return {
+        field: diff_text(old, new, granularity, context)
+        for field, (old, new) in pairs.items()
+        if (old or '') != (new or '')
+    }
+
+
+def field_text(field: str, value) -> str:
+    """字段的对比文本（列表字段每项一行）"""
+    if field in LIST_FIELDS and isinstance(value, str):
+        if field == 'tags':
+            value = split_tags(value)
+        else:
+            try:
+                value = json.loads(value) if value else []
+            except ValueError:
+                pass
+    if isinstance(value, list):
+        return ''.join(f'{item}\n' for item in value)
+    return value or ''
+
+
+def change_stats(old: Optional[dict], new: dict, fields) -> dict:
+    """
+    版本相对上一版本的变更统计（写入 prompt_versions，版本历史直接展示）
+
+    Args:
+        old: 上一版本的字段内容，None 表示首个版本
+        new: 本版本的字段内容
+        fields: 参与统计的字段
+
+    Returns:
+        dict: {lines_added, lines_removed, changed_fields(逗号分隔), diff_summary}
+    """
+    old = old or {}
+    diff = diff_fields(
+        {field: (field_text(field, old.get(field)), field_text(field, new.get(field))) for field in fields},
+        granularity='word',
+        context=0
+    )
+    return {
+        'lines_added': sum(item['stats']['lines_added'] for item in diff.values()),
+        'lines_removed': sum(item['stats']['lines_removed'] for item in diff.values()),
+        'changed_fields': ','.join(diff) or None,
+        'diff_summary': summarize(diff) or None,
+    }
+
+
+def summarize(diff: Dict[str, dict]) -> str:
+    """
+    一行变更摘要：各字段的增删行数，加上第一处改动的文本片段
+    例: "final_prompt +3/-1, title +1/-1 | + 你是一位资深的..."
+    """
+    if not diff:
+        return ''
+    parts = [f"{field} +{item['stats']['lines_added']}/-{item['stats']['lines_removed']}" for field, item in diff.items()]
+    summary = ', '.join(parts)
+
+    # 优先取 final_prompt 的改动，新增文本优先于删除文本
+    for field in sorted(diff, key=lambda name: name != 'final_prompt'):
+        ops = [op for hunk in diff[field]['hunks'] for op in hunk['ops'] if op[0] != '=' and op[1].strip()]
+        ops.sort(key=lambda op: op[0] != '+')
+        if ops:
+            op, text = ops[0]
+            snippet = ' '.join(text.split())
+            summary += f' | {op} {snippet}'
+            break
+
+    if len(summary) > SUMMARY_LENGTH:
+        summary = summary[:SUMMARY_LENGTH - 1] + '…'
+    return summary
+
+
+class DiffEngine:
+    """差异计算：大输入交给进程池，版本对的结果缓存"""
+
+    def __init__(self, workers: int = 2, executor_threshold: int = 20000, cache_size: int = 256):
+        """
+        Args:
+            workers: 进程池大小，0 表示始终在当前进程计算
+            executor_threshold: 输入总字符数达到该值时交给进程池
+            cache_size: 缓存的对比结果数
+        """
+        self.workers = workers
+        self.executor_threshold = executor_threshold
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn：子进程不继承父进程的数据库连接、事件循环等状态
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+            logger.info(f'✅ 差异计算进程池已启动: {self.workers} 个进程')
+        return self._pool
+
+    async def diff(self, pairs: Dict[str, Tuple[Optional[str], Optional[str]]], granularity: str = 'line',
+                   context: int = 3, cache_key=None) -> Dict[str, dict]:
+        """
+        计算多个字段的差异
+
+        Args:
+            pairs: {字段: (旧内容, 新内容)}
+            cache_key: 缓存键（内容不可变时传入，如版本ID对），None 表示不缓存
+        """
+        key = None if cache_key is None else (cache_key, granularity, context)
+        if key is not None and key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        size = sum(len(old or '') + len(new or '') for old, new in pairs.values())
+        if self.workers > 0 and size >= self.executor_threshold:
+            loop = asyncio.get_running_loop()
+            try:
+                result = await loop.run_in_executor(self._get_pool(), diff_fields, pairs, granularity, context)
+            except BrokenProcessPool as e:
+                logger.warning(f'⚠️  差异计算进程池异常，改为在当前进程计算: {e}')
+                self._pool = None
+                result = diff_fields(pairs, granularity, context)
+        else:
+            result = diff_fields(pairs, granularity, context)
+
+        if key is not None and self.cache_size > 0:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    @classmethod
+    def init_app(cls, app):
+        """注册到应用：启动时创建（进程池按需启动），停止时关闭进程池"""
+
+        @app.listener('before_server_start')
+        async def setup_diff_engine(app, loop):
+            app.ctx.diff_engine = cls(
+                workers=app.config.get('DIFF_WORKERS', 2),
+                executor_threshold=app.config.get('DIFF_EXECUTOR_THRESHOLD', 20000),
+                cache_size=app.config.get('DIFF_CACHE_SIZE', 256)
+            )
+
+        @app.listener('before_server_stop')
+        async def stop_diff_engine(app, loop):
+            engine = getattr(app.ctx, 'diff_engine', None)
+            if engine:
+                engine.close()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+版本内容的增量存储
+prompt_versions 的大文本字段不再每个版本保存完整副本，而是：
+
+- keyframe: 完整内容（JSON + zlib 压缩），每隔 VERSION_KEYFRAME_INTERVAL 个版本一个
+- delta:    相对上一个版本（base_version_id）的按行差异（JSON + zlib 压缩）
+- full:     旧数据 / VERSION_STORAGE=full 时，内容直接保存在各文本列中
+
+读取时从最近的关键帧开始依次应用差异重建内容；重建结果放入进程内LRU缓存，
+版本内容不可变，缓存无需失效。创建新版本时上一版本通常已在缓存中，不需要再读库
+
+关键帧中超过 BLOB_MIN_SIZE 的字段只保存 hash，内容放在 content_blobs（见 apps.utils.blob_store），
+未改动的字段在各关键帧之间、与 prompts 表之间只存一份
+"""
+
+import difflib
+import json
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from sanic.log import logger
+
+from apps.utils.blob_store import blob_store
+from apps.utils.text_diff import change_stats
+from config.settings import Config
+
+
+# 增量存储的文本字段（title/language/format/tags 较短，仍直接保存在列中）
+CONTENT_FIELDS = (
+    'description', 'requirement_report', 'thinking_points', 'initial_prompt',
+    'advice', 'final_prompt', 'system_prompt', 'conversation_history',
+)
+
+# 版本对比、变更统计的字段
+DIFF_FIELDS = ('title', *CONTENT_FIELDS, 'tags')
+
+FORMAT_FULL = 'full'
+FORMAT_KEYFRAME = 'keyframe'
+FORMAT_DELTA = 'delta'
+
+_COMPRESS_LEVEL = 6
+
+
+def _pack(data: dict) -> bytes:
+    return zlib.compress(json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), _COMPRESS_LEVEL)
+
+
+def _unpack(blob) -> dict:
+    return json.loads(zlib.decompress(bytes(blob)).decode('utf-8'))
+
+
+def diff_text(base: Optional[str], text: str) -> List:
+    """
+    按行计算差异
+
+    Returns:
+        list: 操作序列，[start, end] 表示复制 base 的第 start~end 行，字符串表示新增的文本
+    """
+    if not base:
+        return [text]
+    base_lines = base.splitlines(keepends=True)
+    lines = text.splitlines(keepends=True)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, base_lines, lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif tag in ('replace', 'insert'):
+            chunk = ''.join(lines[j1:j2])
+            if ops and isinstance(ops[-1], str):
+                ops[-1] += chunk
+            else:
+                ops.append(chunk)
+    return ops
+
+
+def patch_text(base: Optional[str], ops: List) -> str:
+    """按 diff_text 的操作序列重建文本"""
+    base_lines = base.splitlines(keepends=True) if base else []
+    parts = []
+    for op in ops:
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            parts.extend(base_lines[op[0]:op[1]])
+    return ''.join(parts)
+
+
+class _LRUCache:
+    """版本内容缓存 {version_id: (内容, 距关键帧的差异层数)}"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key):
+        value = self._data.get(key)
+        if value is not None:
+            self._data.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+
+class VersionContentStore:
+    """版本内容编码、重建与缓存"""
+
+    _ROW_COLUMNS = 'id, storage_format, content_blob, base_version_id, ' + ', '.join(CONTENT_FIELDS)
+
+    def __init__(self, mode: str = 'delta', keyframe_interval: int = 20, cache_size: int = 256):
+        """
+        Args:
+            mode: delta(增量存储) / full(每个版本保存完整内容)
+            keyframe_interval: 每隔多少个版本保存一个关键帧（限制重建时需要应用的差异数）
+            cache_size: 重建内容缓存的版本数
+        """
+        self.mode = mode
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.cache = _LRUCache(cache_size)
+
+    # ============ 写入 ============
+
+    async def encode(self, db, prompt_id: int, content: Dict[str, Optional[str]]) -> Tuple[dict, int]:
+        """
+        为新版本生成存储列
+
+        Args:
+            db: 数据库适配器
+            prompt_id: 提示词ID
+            content: CONTENT_FIELDS 对应的内容
+
+        Returns:
+            tuple: (要写入 prompt_versions 的列, 距关键帧的差异层数)
+        """
+        previous = await db.get(
+            f"SELECT {self._ROW_COLUMNS} FROM prompt_versions WHERE prompt_id = ? ORDER BY id DESC LIMIT 1",
+            [prompt_id]
+        )
+        columns = {'parent_version_id': previous['id'] if previous else None}
+
+        if self.mode != 'delta':
+            columns.update({'storage_format': FORMAT_FULL, 'content_blob': None, 'base_version_id': None})
+            columns.update(content)
+            return columns, 0
+
+        # 内容列清空（final_prompt 为 NOT NULL）
+        columns.update({field: None for field in CONTENT_FIELDS})
+        columns['final_prompt'] = ''
+
+        keyframe = _pack({'c': content})
+        if previous:
+            base, depth = await self._load(db, prompt_id, previous)
+            if depth + 1 < self.keyframe_interval:
+                delta = {
+                    field: (None if content.get(field) is None else diff_text(base.get(field), content[field]))
+                    for field in CONTENT_FIELDS
+                    if content.get(field) != base.get(field)
+                }
+                delta_blob = _pack({'d': delta})
+                # 大幅改写时差异可能比完整内容还大，直接存关键帧
+                if len(delta_blob) < len(keyframe):
+                    columns.update({
+                        'storage_format': FORMAT_DELTA,
+                        'content_blob': delta_blob,
+                        'base_version_id': previous['id'],
+                    })
+                    return columns, depth + 1
+
+        columns.update({
+            'storage_format': FORMAT_KEYFRAME,
+            'content_blob': await self._encode_keyframe(db, content),
+            'base_version_id': None,
+        })
+        return columns, 0
+
+    @staticmethod
+    async def _encode_keyframe(db, content: Dict[str, Optional[str]]) -> bytes:
+        """关键帧：较大的字段外置到 content_blobs，只保存 hash"""
+        inline = dict(content)
+        refs = await blob_store.externalize(db, inline, CONTENT_FIELDS)
+        for field in refs:
+            del inline[field]
+        return _pack({'c': inline, 'h': refs} if refs else {'c': inline})
+
+    def remember(self, version_id: int, content: Dict[str, Optional[str]], depth: int):
+        """新版本写入后放入缓存（下一个版本以它为基准）"""
+        self.cache.put(version_id, (dict(content), depth))
+
+    # ============ 读取 ============
+
+    async def load(self, db, row) -> Dict[str, Optional[str]]:
+        """
+        取得版本的完整内容
+
+        Args:
+            row: prompt_versions 行（需包含 id、prompt_id、storage_format、content_blob、base_version_id 及内容列）
+        """
+        content, _ = await self._load(db, row['prompt_id'], row)
+        return dict(content)
+
+    async def load_snapshot(self, db, prompt_id: int, version_id: int) -> Optional[dict]:
+        """版本的 DIFF_FIELDS 内容（title、tags 与内容字段），版本不存在时返回 None"""
+        row = await db.get(
+            f"SELECT title, tags, {self._ROW_COLUMNS} FROM prompt_versions WHERE id = ?",
+            [version_id]
+        )
+        if not row:
+            return None
+        content, _ = await self._load(db, prompt_id, row)
+        return dict(content, title=row['title'], tags=row['tags'])
+
+    async def _load(self, db, prompt_id: int, row) -> Tuple[dict, int]:
+        cached = self.cache.get(row['id'])
+        if cached is not None:
+            return cached
+
+        storage_format = row.get('storage_format') or FORMAT_FULL
+        if storage_format == FORMAT_FULL:
+            return {field: row.get(field) for field in CONTENT_FIELDS}, 0
+        if storage_format == FORMAT_KEYFRAME:
+            data = _unpack(row['content_blob'])
+            content = data['c']
+            if data.get('h'):
+                blobs = await blob_store.get_many(db, data['h'].values())
+                content.update({field: blobs[digest] for field, digest in data['h'].items()})
+            result = (content, 0)
+            self.cache.put(row['id'], result)
+            return result
+
+        # 差异链：向前找到关键帧（或已缓存的版本），再依次应用差异
+        chain = [row]
+        rows = None
+        base_id = row['base_version_id']
+        while True:
+            cached = self.cache.get(base_id)
+            if cached is not None:
+                content, depth = cached
+                break
+            if rows is None or base_id not in rows:
+                # 一次取出差异链可能涉及的行（同一提示词，id 不大于 base_id）
+                fetched = await db.query(
+                    f"SELECT {self._ROW_COLUMNS} FROM prompt_versions "
+                    f"WHERE prompt_id = ? AND id <= ? ORDER BY id DESC LIMIT {self.keyframe_interval + 1}",
+                    [prompt_id, base_id]
+                )
+                rows = {item['id']: item for item in fetched}
+                if base_id not in rows:
+                    raise ValueError(f'版本内容缺失: version_id={base_id}')
+            base_row = rows[base_id]
+            base_format = base_row.get('storage_format') or FORMAT_FULL
+            if base_format != FORMAT_DELTA:
+                content, depth = await self._load(db, prompt_id, base_row)
+                break
+            chain.append(base_row)
+            base_id = base_row['base_version_id']
+
+        for delta_row in reversed(chain):
+            delta = _unpack(delta_row['content_blob'])['d']
+            content = dict(content)
+            for field, ops in delta.items():
+                content[field] = None if ops is None else patch_text(content.get(field), ops)
+            depth += 1
+            self.cache.put(delta_row['id'], (content, depth))
+
+        return content, depth
+
+    # ============ 删除 ============
+
+    async def delete_versions(self, db, prompt_id: int):
+        """删除提示词的全部版本，并释放关键帧引用的外置内容（调用方放在删除提示词的事务中）"""
+        rows = await db.query(
+            "SELECT content_blob FROM prompt_versions WHERE prompt_id = ? AND storage_format = ?",
+            [prompt_id, FORMAT_KEYFRAME]
+        )
+        digests = []
+        for row in rows:
+            digests.extend(_unpack(row['content_blob']).get('h', {}).values())
+        # SQLite 的 prompt_versions 未声明外键级联，这里显式删除
+        await db.execute("DELETE FROM prompt_versions WHERE prompt_id = ?", [prompt_id])
+        await blob_store.release(db, digests)
+
+
+version_store = VersionContentStore(
+    mode=Config.VERSION_STORAGE,
+    keyframe_interval=Config.VERSION_KEYFRAME_INTERVAL,
+    cache_size=Config.VERSION_CACHE_SIZE
+)
+
+if version_store.mode not in ('delta', 'full'):
+    logger.warning(f'⚠️  未知的 VERSION_STORAGE: {version_store.mode}，按 full 处理')
+
+
+# ==========================================
+# 迁移步骤
+# ==========================================
+
+async def backfill_change_stats(db):
+    """计算已有版本相对上一版本的变更统计（按提示词、版本id顺序分批）"""
+    last_prompt_id, last_id = 0, 0
+    previous = None  # (prompt_id, version_id, 内容)
+    total = 0
+    while True:
+        rows = await db.query(
+            f"SELECT prompt_id, parent_version_id, title, tags, {version_store._ROW_COLUMNS} FROM prompt_versions "
+            f"WHERE prompt_id > ? OR (prompt_id = ? AND id > ?) ORDER BY prompt_id, id LIMIT 200",
+            [last_prompt_id, last_prompt_id, last_id]
+        )
+        if not rows:
+            break
+        for row in rows:
+            content, _ = await version_store._load(db, row['prompt_id'], row)
+            snapshot = dict(content, title=row['title'], tags=row['tags'])
+
+            # 上一版本：parent_version_id（旧数据可能为空时取同一提示词的前一个版本）
+            parent_id = row['parent_version_id']
+            if previous and previous[0] == row['prompt_id'] and parent_id in (None, previous[1]):
+                parent = previous[2]
+            elif parent_id:
+                parent = await version_store.load_snapshot(db, row['prompt_id'], parent_id)
+            else:
+                parent = None
+
+            stats = change_stats(parent, snapshot, DIFF_FIELDS)
+            await db.execute(
+                "UPDATE prompt_versions SET lines_added = ?, lines_removed = ?, changed_fields = ?, diff_summary = ? "
+                "WHERE id = ?",
+                [stats['lines_added'], stats['lines_removed'], stats['changed_fields'], stats['diff_summary'], row['id']]
+            )
+            previous = (row['prompt_id'], row['id'], snapshot)
+            total += 1
+        last_prompt_id, last_id = rows[-1]['prompt_id'], rows[-1]['id']
+    logger.info(f'✅ 版本变更统计回填完成: {total} 个版本')
@@ -15,13 +15,103 @@ class Config(BaseConfig):
     DB_NAME = os.getenv('DB_NAME') or cf.DB_NAME
     DB_PORT = int(os.getenv('DB_PORT', '3306')) if os.getenv('DB_PORT') else cf.DB_PORT
 
+    # PostgreSQL（DB_TYPE=postgres 时使用；未设置 PG_DSN 时复用上面的 DB_HOST/DB_USER/DB_PASS/DB_NAME）
+    PG_DSN = os.getenv('PG_DSN') or (cf.PG_DSN if hasattr(cf, 'PG_DSN') else '')
+    PG_PORT = int(os.getenv('PG_PORT', '5432')) if os.getenv('PG_PORT') else (cf.PG_PORT if hasattr(cf, 'PG_PORT') else 5432)
+    PG_POOL_MIN = int(os.getenv('PG_POOL_MIN', '2'))
+    PG_POOL_MAX = int(os.getenv('PG_POOL_MAX', '10'))
+
+    # 查询监控（慢查询阈值单位: 毫秒；开发模式下同一请求内同一SQL超过阈值次数时告警N+1）
+    DB_METRICS_ENABLED = os.getenv('DB_METRICS_ENABLED', 'true').lower() == 'true'
+    DB_SLOW_QUERY_MS = int(os.getenv('DB_SLOW_QUERY_MS', '100'))
+    DB_N_PLUS_ONE_THRESHOLD = int(os.getenv('DB_N_PLUS_ONE_THRESHOLD', '5'))
+
+    # 浏览/使用次数写缓冲：每隔多少秒批量写入（0 表示不缓冲，每次直接更新），缓冲行数达到上限时立即写入
+    COUNTER_FLUSH_INTERVAL = float(os.getenv('COUNTER_FLUSH_INTERVAL', '5'))
+    COUNTER_MAX_PENDING = int(os.getenv('COUNTER_MAX_PENDING', '1000'))
+
+    # 版本内容存储: delta（关键帧 + 相对上一版本的压缩差异）/ full（每个版本保存完整内容）
+    VERSION_STORAGE = os.getenv('VERSION_STORAGE', 'delta')
+    VERSION_KEYFRAME_INTERVAL = int(os.getenv('VERSION_KEYFRAME_INTERVAL', '20'))
+    VERSION_CACHE_SIZE = int(os.getenv('VERSION_CACHE_SIZE', '256'))
+
+    # 大文本内容寻址存储（按SHA-256去重）: db（content_blobs 表）/ dir（BLOB_DIR 目录下的文件，mmap 读取）
+    # 超过 BLOB_MIN_SIZE 个字符的字段外置存储（0 表示不外置）
+    BLOB_BACKEND = os.getenv('BLOB_BACKEND', 'db')
+    BLOB_DIR = os.getenv('BLOB_DIR', '../data/blobs')
+    BLOB_MIN_SIZE = int(os.getenv('BLOB_MIN_SIZE', '1024'))
+    BLOB_CACHE_SIZE = int(os.getenv('BLOB_CACHE_SIZE', '256'))
+
+    # 提示词列表默认只返回 final_prompt 的前 N 个字符（preview）
+    PROMPT_PREVIEW_LENGTH = int(os.getenv('PROMPT_PREVIEW_LENGTH', '200'))
+
+    # 版本对比: 输入总字符数达到 DIFF_EXECUTOR_THRESHOLD 时交给 DIFF_WORKERS 个进程计算（0 表示不使用进程池）
+    DIFF_WORKERS = int(os.getenv('DIFF_WORKERS', '2'))
+    DIFF_EXECUTOR_THRESHOLD = int(os.getenv('DIFF_EXECUTOR_THRESHOLD', '20000'))
+    DIFF_CACHE_SIZE = int(os.getenv('DIFF_CACHE_SIZE', '256'))
+
+    # 缓存（提示词详情、全局AI设置、提示词规则）: local（仅进程内）/ redis（REDIS_CON）/ memory（进程内Redis替身，测试用）
+    # 多 worker 部署时应使用 redis，否则其他进程的本地缓存最长 CACHE_LOCAL_TTL 秒后才失效
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'local')
+    REDIS_CON = os.getenv('REDIS_CON') or BaseConfig.REDIS_CON
+    CACHE_LOCAL_SIZE = int(os.getenv('CACHE_LOCAL_SIZE', '1024'))
+    CACHE_LOCAL_TTL = float(os.getenv('CACHE_LOCAL_TTL', '30'))
+    CACHE_REDIS_TTL = int(os.getenv('CACHE_REDIS_TTL', '300'))
+
+    # 前端静态文件（STATIC_PATH）启动时读入内存并预压缩，超过该大小(字节)的文件仍从磁盘发送
+    STATIC_MAX_MEMORY_SIZE = int(os.getenv('STATIC_MAX_MEMORY_SIZE', str(4 * 1024 * 1024)))
+    # JSON响应压缩：不小于 COMPRESS_MIN_SIZE 字节才压缩，不小于 COMPRESS_EXECUTOR_THRESHOLD 字节时交给 COMPRESS_WORKERS 个线程压缩
+    COMPRESS_ENABLED = os.getenv('COMPRESS_ENABLED', 'true').lower() == 'true'
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+    COMPRESS_EXECUTOR_THRESHOLD = int(os.getenv('COMPRESS_EXECUTOR_THRESHOLD', str(64 * 1024)))
+    COMPRESS_WORKERS = int(os.getenv('COMPRESS_WORKERS', '2'))
+
+    # 反向代理（Sanic 按这些配置从转发头取得客户端地址 request.remote_addr）
+    # PROXIES_COUNT: 应用前面的代理层数（docker-compose.yml 中的 Traefik 为 1），0 表示不信任 X-Forwarded-For
+    # REAL_IP_HEADER: 代理设置的真实IP头（如 X-Real-IP）；FORWARDED_SECRET: 代理 Forwarded 头中的 secret
+    PROXIES_COUNT = int(os.getenv('PROXIES_COUNT', '0'))
+    REAL_IP_HEADER = os.getenv('REAL_IP_HEADER') or None
+    FORWARDED_SECRET = os.getenv('FORWARDED_SECRET') or None
+
     # JWT配置（优先使用环境变量）
     SECRET_KEY = os.getenv('SECRET_KEY') or cf.SECRET_KEY
+    # 已验证Token的LRU缓存条目数（0 表示每次请求都完整验证）
+    JWT_VERIFIED_CACHE_SIZE = int(os.getenv('JWT_VERIFIED_CACHE_SIZE', '4096'))
+    # bcrypt 线程池大小及排队上限（排队已满时登录/注册直接返回繁忙）
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+    PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', '32'))
+    # 登录失败限流：窗口(秒)内用户名/IP 的失败上限，达到后锁定 LOGIN_LOCKOUT_SECONDS 秒
+    # LOGIN_THROTTLE_BACKEND: local（进程内）/ cache（缓存连接了Redis时多进程共享计数）
+    LOGIN_THROTTLE_BACKEND = os.getenv('LOGIN_THROTTLE_BACKEND', 'local')
+    LOGIN_MAX_FAILURES_USER = int(os.getenv('LOGIN_MAX_FAILURES_USER', '5'))
+    LOGIN_MAX_FAILURES_IP = int(os.getenv('LOGIN_MAX_FAILURES_IP', '20'))
+    LOGIN_FAILURE_WINDOW = int(os.getenv('LOGIN_FAILURE_WINDOW', '900'))
+    LOGIN_LOCKOUT_SECONDS = int(os.getenv('LOGIN_LOCKOUT_SECONDS', '900'))
+    # 用户信息缓存（需要最新用户状态的接口使用）在Redis层的过期时间(秒)，本地层为 CACHE_LOCAL_TTL
+    PRINCIPAL_CACHE_TTL = int(os.getenv('PRINCIPAL_CACHE_TTL', '60'))
     
     # Linux.do OAuth配置（优先使用环境变量）
     LINUX_DO_CLIENT_ID = os.getenv('LINUX_DO_CLIENT_ID') or (cf.LINUX_DO_CLIENT_ID if hasattr(cf, 'LINUX_DO_CLIENT_ID') else '')
     LINUX_DO_CLIENT_SECRET = os.getenv('LINUX_DO_CLIENT_SECRET') or (cf.LINUX_DO_CLIENT_SECRET if hasattr(cf, 'LINUX_DO_CLIENT_SECRET') else '')
     LINUX_DO_REDIRECT_URI = os.getenv('LINUX_DO_REDIRECT_URI') or (cf.LINUX_DO_REDIRECT_URI if hasattr(cf, 'LINUX_DO_REDIRECT_URI') else '')
+    # OAuth服务地址（测试时可指向本地模拟服务）、请求超时(秒)、失败重试次数、最大并发请求数
+    LINUX_DO_CONNECT_URL = os.getenv('LINUX_DO_CONNECT_URL', 'https://connect.linux.do').rstrip('/')
+    LINUX_DO_TIMEOUT = float(os.getenv('LINUX_DO_TIMEOUT', '10'))
+    LINUX_DO_RETRIES = int(os.getenv('LINUX_DO_RETRIES', '2'))
+    LINUX_DO_MAX_CONCURRENCY = int(os.getenv('LINUX_DO_MAX_CONCURRENCY', '20'))
+    
+    # 飞书开放平台配置（优先使用环境变量）
+    FEISHU_APP_ID = os.getenv('FEISHU_APP_ID') or (cf.FEISHU_APP_ID if hasattr(cf, 'FEISHU_APP_ID') else '')
+    FEISHU_APP_SECRET = os.getenv('FEISHU_APP_SECRET') or (cf.FEISHU_APP_SECRET if hasattr(cf, 'FEISHU_APP_SECRET') else '')
+    FEISHU_HOST = os.getenv('FEISHU_HOST', 'https://open.feishu.cn')
+    # 群机器人"加签"密钥（未开启加签时留空）
+    FEISHU_WEBHOOK_SECRET = os.getenv('FEISHU_WEBHOOK_SECRET') or (cf.FEISHU_WEBHOOK_SECRET if hasattr(cf, 'FEISHU_WEBHOOK_SECRET') else '')
+    # 开放接口频率限制、通知发送队列长度、并发发送数、请求超时(秒)
+    FEISHU_RATE_PER_SECOND = int(os.getenv('FEISHU_RATE_PER_SECOND', '50'))
+    FEISHU_RATE_PER_MINUTE = int(os.getenv('FEISHU_RATE_PER_MINUTE', '1000'))
+    FEISHU_QUEUE_SIZE = int(os.getenv('FEISHU_QUEUE_SIZE', '1000'))
+    FEISHU_SEND_CONCURRENCY = int(os.getenv('FEISHU_SEND_CONCURRENCY', '5'))
+    FEISHU_TIMEOUT = float(os.getenv('FEISHU_TIMEOUT', '10'))
     
     # 默认管理员账号配置（优先使用环境变量）
     DEFAULT_ADMIN_USERNAME = os.getenv('ADMIN_USERNAME') or (cf.DEFAULT_ADMIN_USERNAME if hasattr(cf, 'DEFAULT_ADMIN_USERNAME') else 'admin')
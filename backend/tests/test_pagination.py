@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""游标分页：MySQL 返回的 datetime/Decimal 排序值"""
+
+import datetime
+from decimal import Decimal
+
+import pytest
+
+from apps.utils.pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_condition, next_cursor
+
+
+def test_datetime_value_encodes_as_string():
+    # MySQL 的 DATETIME 列以 datetime 对象返回
+    created = datetime.datetime(2026, 10, 19, 12, 30, 5)
+    cursor = encode_cursor('create_time', created, 42)
+    value, row_id = decode_cursor(cursor, 'create_time')
+    assert value == '2026-10-19 12:30:05'
+    assert row_id == 42
+    # 与 SQLite/PostgreSQL 返回的文本值生成同样的游标
+    assert cursor == encode_cursor('create_time', '2026-10-19 12:30:05', 42)
+
+
+def test_decimal_value_encodes_as_string():
+    value, _ = decode_cursor(encode_cursor('relevance', Decimal('1.50'), 1), 'relevance')
+    assert value == '1.50'
+
+
+def test_next_cursor_with_mysql_rows():
+    rows = [{'id': i, 'update_time': datetime.datetime(2026, 1, 1, 0, 0, 10 - i)} for i in range(1, 4)]
+    page, cursor = next_cursor(rows, 2, 'update_time', 'update_time')
+    assert [row['id'] for row in page] == [1, 2]
+    value, row_id = decode_cursor(cursor, 'update_time')
+    sql, params = keyset_condition('update_time', 'id', value, row_id)
+    assert params == ['2026-01-01 00:00:08', '2026-01-01 00:00:08', 2]
+
+
+def test_sort_mismatch_rejected():
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encode_cursor('create_time', datetime.datetime(2026, 1, 1), 1), 'update_time')
@@ -110,6 +110,7 @@ export interface Prompt {
   initial_prompt?: string
   advice?: string
   final_prompt: string
+  preview?: string  // 列表接口默认只返回截断后的预览（fields=summary）
   language: string
   format: string
   prompt_type: string
@@ -142,6 +143,7 @@ export async function getPrompts(params?: {
   tags?: string[]
   language?: string
   format?: string
+  fields?: string  // summary（默认）/ full / 逗号分隔的字段名
 }) {
   const query = new URLSearchParams()
   if (params) {
@@ -168,6 +170,13 @@ export async function getPrompts(params?: {
   }>(`/api/prompts${queryString ? '?' + queryString : ''}`)
 }
 
+/**
+ * 批量获取提示词详情（不增加查看次数）
+ */
+export async function getPromptsByIds(ids: number[]) {
+  return get<{ code: number; data: { items: Prompt[]; missing: number[] } }>(`/api/prompts/batch?ids=${ids.join(',')}`)
+}
+
 /**
  * 获取提示词详情
  */